@@ -1,124 +1,86 @@
-import pyvisa
 import time
+from Keithley_6514 import Keithley6514
+from Keithley_Transport import open_transport
+from Keithley_Supervisor import TRANSIENT_ERRORS, MAX_RETRIES
 
-# Crear ResourceManager
-rm = pyvisa.ResourceManager()
-lib = rm.visalib
+# Con simulate = True se usa el 6514 simulado (Keithley_Sim) en lugar del instrumento real
+simulate = False
 
-# Abrir conexión con el Keithley (ajusta la dirección GPIB)
-keithley = rm.open_resource("GPIB0::14::INSTR")
-keithley.timeout = 10000
-
-# Treure el mode remot
-# keithley.control_ren(6)
-
-# Configurar terminadores
-#keithley.read_termination = '\n'
-#keithley.write_termination = '\n'
-
-
-def wait_for_srq(inst):
-    """Espera a que bit 6 del status byte esté activo (SRQ)"""
-    while True:
-        try:
-            stb = inst.stb  # Status Byte
-            if stb & 64:
-                return
-        except Exception:
-            continue
-        
-        
-
-# Reseteo y configuración inicial
-keithley.write("*RST")
-keithley.write("STAT:PRES;*CLS")
-keithley.write("STAT:MEAS:ENAB 512")
-keithley.write("*SRE 1")
+# Dirección GPIB del Keithley
+GPIB_ADDRESS = "GPIB0::14::INSTR"
 
+# Origen del trigger: "BUS" (GET desde el PC) o "EXT" (línea de trigger externa)
+TRIGGER_SOURCE = "BUS"
 
-# ### Configurar medicion de corriente
+# Lecturas por trigger: 1 = una lectura con SRQ en RAV; más = ráfaga al buffer con SRQ en BFL
+BURST = 1
 
+# Pausa entre triggers, 0 = tan rápido como lo permita el instrumento
+TRIGGER_INTERVAL = 0
 
-# Seleccionamos la funcion corriente
-keithley.write('SENS:FUNC "CURR"')   # Medir corriente (puedes usar 'VOLT', 'RES', etc.)
-keithley.write("CONF:CURR")
+# Abrir conexión con el Keithley
+keithley = Keithley6514(open_transport(GPIB_ADDRESS, simulate, timeout=10000))
 
-# Desactivamos el zero check and zero correction para mas velocidad pero menos precision
-keithley.write("SYST:ZCH OFF")
-keithley.write("SYST:ZCOR OFF")
-
-# Desactivamos el auto zero para augmentar la velocidad pero menos precision
-keithley.write("SYST:AZER OFF")
+# Treure el mode remot
+# keithley.transport.inst.control_ren(6)
 
-# Ponemos el rango fijo (si no esta fijo hay trompicones por el cambio de rango entre mediciones)
-keithley.write("CURR:RANG:AUTO OFF")
-keithley.write("CURR:RANG 200E-6")
 
-# Establecemos el tiempo de integracion
-keithley.write("CURR:NPLC 0.01")  # 1 ciclo de red = equilibrio entre precisión y velocidad, minimo 0.01
+# Reseteo y configuración de la medida de corriente: función, zero check y
+# zero correction desactivados, auto zero desactivado, rango fijo (si no esta
+# fijo hay trompicones por el cambio de rango entre mediciones), NPLC 0.01 y
+# media y mediana desactivadas
+setup = ["*RST"]
+setup += keithley.measure_commands("current", "200E-6", 0.01, display=True)
 
-# Desactivamos media y desviacion estandard
-keithley.write("MED OFF")
-keithley.write("AVER OFF")
 
 # --- Configuración del Trigger ---
-keithley.write(":ARM:SOUR BUS")        # Trigger ARM proviene del bus GPIB
-keithley.write(":ARM:COUN 1")        # Adquisición infinita
-keithley.write(":TRIG:COUN 1")         # Una medida por trigger
-
-
-# Ajustamos los digitos de la pantalla y la desactivamos para augmentar el sampling rate
-keithley.write("DISP:DIG 4.5")
-keithley.write("DISP:ENAB ON")
-
-
-# Iniciar adquisición
-keithley.write("INIT")                 # Armar el sistema de trigger (queda esperando triggers)
-
-# Configuramos el Buffer
-# keithley.write("TRIG:COUN INF")
-# keithley.write("TRAC:POIN 2500")
-# keithley.write("TRAC:FEED SENS;FEED:CONT NEXT")
+# La capa ARM espera el trigger (GET o línea externa) con ARM:COUN INF, así
+# después de cada medida la maquina vuelve a la capa ARM y no a IDLE (trigger model)
+# y no hace falta volver a enviar INIT. El final de la medida lo avisa un SRQ.
+keithley.start_triggered(TRIGGER_SOURCE, BURST, setup)
 
 
 # En mode TALK no respon, s'ha de enviar això:
 # keithley.write(":SYST:LOC")  # vuelve a LOCAL y luego podrás poner REMOTE
 # keithley.write(":SYST:REM")  # vuelve a REMOTE, listo para recibir comandos
 
-# No es pot enviar un READ? dos vegades, ja que sino interrumpeix el query
-
 
 print("Keithley armado y esperando triggers por bus GPIB...")
 
+lost = 0
+failures = 0
 try:
     while True:
-        # Enviar trigger hardware (GET) por el bus GPIB
-        # Recordem que perque ens respongui al trigger
-        # la maquina ha d'estar en la capa ARM, no en IDLE (trigger model)
-        code = keithley.assert_trigger()
-        
-        # Leer el valor medido (el 6514 lo devuelve tras cada trigger)
-        # Recordem que la màquina ha d'estar en IDLE state per enviar les dades
-        value = keithley.write(":FETCh?")
-        
-        # El GPIB proporciona un status byte en el bus de control que podem llegir
-        # per saber quan ha acabat l'instrument la mesura.
-        wait_for_srq(keithley)
-        
-        # Leer el valor medido (el 6514 lo devuelve tras cada trigger)
-        # Recordem que la màquina ha d'estar en IDLE state per enviar les dades
-        value = keithley.read()
-        print("Medida:", value)
-        
+        # Trigger (GET), espera al SRQ de medida completa, FETC? para leer el
+        # valor y STAT:MEAS? para borrar el evento de medida
+        try:
+            value, timestamp, latency = keithley.read_triggered()
+        except TRANSIENT_ERRORS as e:
+            # Medida perdida: device clear, se reenvía la configuración, se vuelve
+            # a armar y se sigue; solo se abandona tras MAX_RETRIES fallos seguidos
+            lost += 1
+            failures += 1
+            if failures > MAX_RETRIES:
+                raise
+            print(f"Fallo ({e}), recuperando ({failures}/{MAX_RETRIES})...")
+            keithley.transport.clear()
+            keithley.start_triggered(TRIGGER_SOURCE, BURST, setup)
+            continue
+        failures = 0
+        print(f"Medida: {value}  t = {timestamp}  latencia: {latency * 1000:.2f} ms")
+
         # Ajusta el intervalo entre triggers según tu aplicación
-        time.sleep(2)
+        if TRIGGER_INTERVAL:
+            time.sleep(TRIGGER_INTERVAL)
 
 except KeyboardInterrupt:
     print("Parando adquisición...")
-    keithley.write("ABOR")  # Detener la adquisición
-    keithley.close()
-    
+
 except Exception as e:
     print("Error:", e)
-    keithley.write("ABOR")  # Detener la adquisición
+
+finally:
+    if lost:
+        print("Medidas perdidas por fallos:", lost)
+    keithley.stop_triggered()  # Detener la adquisición
     keithley.close()
@@ -1,61 +1,71 @@
-import pyvisa
 import time
-import csv
+from Keithley_Data import format_commands, decode_readings
+from Keithley_6514 import Keithley6514
+from Keithley_Transport import open_transport
+from Keithley_Pipeline import Pipeline
+from Keithley_Storage import open_writer
 
 # Configura aquí la dirección de tu instrumento
 GPIB_ADDRESS = "GPIB0::14::INSTR"  # Cambia si usas USB o es otro número
 
-# Configura el tamaño del buffer y el tiempo de espera entre lecturas
+# Con simulate = True se usa el 6514 simulado (Keithley_Sim) en lugar del instrumento real
+simulate = False
+
+# Configura el tamaño del buffer y cada cuánto se muestra el estado por pantalla
 BUFFER_SIZE = 2500
-READ_INTERVAL = 0.5  # segundos
-OUTPUT_CSV = "mediciones_keithley.csv"
+PRINT_INTERVAL = 0.5  # segundos
+OUTPUT_FILE = "mediciones_keithley.npy"  # .npy, .h5 o .parquet
+
+# Formato de transferencia del buffer: "sreal" (binario 32 bits), "dreal" (binario 64 bits) o "ascii"
+data_format = "sreal"
 
 # Inicializa conexión
-rm = pyvisa.ResourceManager()
-keithley = rm.open_resource(GPIB_ADDRESS)
-keithley.read_termination = '\n'
-keithley.timeout = 5000  # ms
-
-# Inicializa archivo CSV
-with open(OUTPUT_CSV, mode='w', newline='') as file:
-    writer = csv.writer(file)
-    writer.writerow(['Índice', 'Medición (valor)'])  # Encabezado
-
-    # Configuración del Keithley 6514
-    keithley.write("*RST")
-    keithley.write(":TRAC:CLE")
-    keithley.write(f":TRAC:POIN {BUFFER_SIZE}")
-    keithley.write(":TRAC:FEED SENSE")           # Guardar valor medido
-    keithley.write(":TRAC:FEED:CONT NEXT")       # Añadir al buffer en orden
-    keithley.write(":TRIG:COUN INF")             # Medir indefinidamente
-    keithley.write(":TRIG:SOUR IMM")             # Trigger inmediato
-    keithley.write(":ARM:SOUR IMM")              # Armado inmediato
-    keithley.write(":INIT")                      # Iniciar adquisición
+keithley = Keithley6514(open_transport(GPIB_ADDRESS, simulate, timeout=5000), fmt=data_format)
 
-    print("Adquisición iniciada. Pulsa Ctrl+C para detenerla.")
+# El streamer descarga el buffer por mitades mientras el instrumento llena la otra
+streamer = keithley.streamer(BUFFER_SIZE)
 
-    last_index = 0
+# Configuración del Keithley 6514
+config = ["*RST"]
+config += streamer.commands()                   # Buffer circular, SRQ en BHF/BFL
+config.append(":TRIG:SOUR IMM")                 # Trigger inmediato
+config.append(":ARM:SOUR IMM")                  # Armado inmediato
+config += format_commands(data_format)
+keithley.configure(config)
 
-    try:
-        while True:
-            # Consultar cuántos datos hay disponibles en el buffer
-            points = int(keithley.query(":TRAC:POIN?"))
+# Un hilo dedicado hace la E/S y llena el buffer circular; escribir a disco o
+# imprimir por pantalla ya no retrasa la siguiente descarga
+pipeline = Pipeline(streamer.blocks(), width=len(streamer.elements), stop=streamer.stop)
 
-            if points > last_index:
-                # Leer solo los datos nuevos
-                new_data = keithley.query(f":TRAC:DATA? {last_index + 1},{points}")
-                values = [float(x) for x in new_data.strip().split(",")]
+# Inicializa el fichero de salida, se escribe bloque a bloque en binario por columnas
+elements = ",".join(streamer.elements)
+metadata = {"function": "current", "address": GPIB_ADDRESS, "buffer_size": BUFFER_SIZE, "elements": elements}
+with open_writer(OUTPUT_FILE, decode_readings([], elements).dtype, metadata) as writer:
 
-                # Guardar en el CSV y mostrar por pantalla
-                for i, val in enumerate(values, start=last_index + 1):
-                    writer.writerow([i, val])
-                    print(f"Medición {i}: {val}")
+    def write_block(block):
+        """Guarda en el fichero las lecturas del bloque"""
+        writer.write(decode_readings(block, elements))
 
-                file.flush()
-                last_index = points
+    # El fichero no puede perder datos (frena al productor si se queda atrás),
+    # la pantalla sí: solo muestra la última lectura disponible
+    pipeline.add_consumer(write_block, lossless=True, name="fichero")
+    screen = pipeline.reader(lossless=False, name="pantalla")
 
-            time.sleep(READ_INTERVAL)
+    pipeline.start()
+    print("Adquisición iniciada. Pulsa Ctrl+C para detenerla.")
+
+    try:
+        while pipeline.thread.is_alive():
+            block = screen.read(timeout=PRINT_INTERVAL)
+            if len(block):
+                print(f"Medición {screen.position}: {block[-1, 0]}  (descartadas en pantalla: {screen.overflows})")
+            time.sleep(PRINT_INTERVAL)
 
     except KeyboardInterrupt:
         print("Adquisición detenida por el usuario.")
-        keithley.write(":ABOR")  # Detiene la adquisición
+        pipeline.stop()  # Detiene la adquisición al acabar el bloque en curso
+
+    pipeline.ring.remove(screen)
+    pipeline.join()
+    print("Estadísticas:", pipeline.stats())
+    print("Huecos detectados:", len(streamer.gaps))
@@ -1,209 +1,131 @@
-import pyvisa
-import time
-import csv
 import matplotlib.pyplot as plt
 import numpy as np
+from Keithley_Data import decode_readings
+from Keithley_Profiles import PROFILES
+from Keithley_Session import SessionPool
+from Keithley_AutoRange import autorange_profile
+from Keithley_Trace import trace
+from Keithley_Storage import save, load, open_writer, export_csv
 
 # Cambia la dirección GPIB según tu configuración
 GPIB_ADDRESS = 'GPIB0::14::INSTR'  # GPIB0 es el bus, 14 es la dirección del Keithley
 number_of_samples = 2500
 
-verbose = False
+# Con simulate = True se usa el 6514 simulado (Keithley_Sim) en lugar del instrumento real
+simulate = False
 
-def send_cmd(inst, cmd, wait=0.1):
-    """Envía comando SCPI"""
-    inst.write(cmd)
-    time.sleep(wait)
-
-def query_cmd(inst, cmd, wait=0.1):
-    """Envía comando SCPI y devuelve respuesta"""
-    time.sleep(wait)
-    return inst.query(cmd).strip()
-
-def wait_for_srq(inst):
-    """Espera a que bit 6 del status byte esté activo (SRQ)"""
-    while True:
-        try:
-            stb = inst.stb  # Status Byte
-            if stb & 64:
-                return
-        except Exception:
-            continue
-        time.sleep(0.2)
+# Rango fijo de cada función y tiempo de integración (1 ciclo de red = equilibrio entre
+# precisión y velocidad, minimo 0.01): perfiles de Keithley_Profiles, se pueden cambiar
+# aquí o cargar de un fichero con load_profiles()
+profiles = PROFILES
 
-def main(measure):
-    rm = pyvisa.ResourceManager()
-    inst = rm.open_resource(GPIB_ADDRESS)
+# Con auto_range = True el rango fijo del perfil se elige con un pre-escaneo corto
+# en autorango (pico + margen) antes de la adquisición rápida
+auto_range = False
 
-    # Establecer timeout en milisegundos
-    inst.timeout = 5000  # 5 segundos
+# Fichero de salida en binario por columnas (.npy, .h5 o .parquet) y exportación opcional a CSV
+OUTPUT_FILE = "capture.npy"
+export_to_csv = True
 
-    print("Inicializando Keithley 6514...")
+# Descarga por trozos de chunk_size lecturas mientras se llena el buffer (cada trozo se
+# guarda al llegar); 0 = una sola descarga TRAC:DATA? con el buffer lleno
+chunk_size = 0
 
-    # Reseteo y configuración inicial
-    send_cmd(inst, "*RST")
-    send_cmd(inst, "STAT:PRES;*CLS")
-    send_cmd(inst, "STAT:MEAS:ENAB 512")
-    send_cmd(inst, "*SRE 1")
+# Formato de transferencia del buffer: "sreal" (binario 32 bits), "dreal" (binario 64 bits) o "ascii"
+data_format = "sreal"
 
-    
-    ### ---------------------------------------------------------------------------------------------------- ###
-    
-    
-    ### Configurar medicion de corriente
-    
-    if measure == "current":
-        # Seleccionamos la funcion corriente
-        send_cmd(inst, 'SENS:FUNC "CURR"')
-        send_cmd(inst, "CONF:CURR")
-        
-        # Desactivamos el zero check and zero correction para mas velocidad pero menos precision
-        send_cmd(inst, "SYST:ZCH OFF")
-        send_cmd(inst, "SYST:ZCOR OFF")
-        
-        # Desactivamos el auto zero para augmentar la velocidad pero menos precision
-        send_cmd(inst, "SYST:AZER OFF")
-        
-        # Ponemos el rango fijo (si no esta fijo hay trompicones por el cambio de rango entre mediciones)
-        send_cmd(inst, "CURR:RANG:AUTO OFF")
-        send_cmd(inst, "CURR:RANG 200E-6")
-        
-        # Establecemos el tiempo de integracion
-        send_cmd(inst, "CURR:NPLC 0.01")  # 1 ciclo de red = equilibrio entre precisión y velocidad, minimo 0.01
-        
-        
-        send_cmd(inst, "MED OFF")
-        send_cmd(inst, "AVER OFF")
-    
-    
-    
-    ### ---------------------------------------------------------------------------------------------------- ###
-    
-    
-    # ### Configurar medicion de voltaje
-    
-    elif measure == "voltage":
-        # Seleccionamos la funcion corriente
-        send_cmd(inst, 'SENS:FUNC "VOLT"')
-        send_cmd(inst, "CONF:VOLT")
-        
-        # Desactivamos el zero check and zero correction para mas velocidad pero menos precision
-        send_cmd(inst, "SYST:ZCH OFF")
-        send_cmd(inst, "SYST:ZCOR OFF")
-        
-        # Desactivamos el auto zero para augmentar la velocidad pero menos precision
-        send_cmd(inst, "SYST:AZER OFF")
-        
-        # Ponemos el rango fijo (si no esta fijo hay trompicones por el cambio de rango entre mediciones)
-        send_cmd(inst, "VOLT:RANG:AUTO OFF")
-        send_cmd(inst, "VOLT:RANG 200")
-        
-        # Establecemos el tiempo de integracion
-        send_cmd(inst, "VOLT:NPLC 0.01")  # 1 ciclo de red = equilibrio entre precisión y velocidad, minimo 0.01
-        
-        
-        send_cmd(inst, "MED OFF")
-        send_cmd(inst, "AVER OFF")
-
-
-    ### ---------------------------------------------------------------------------------------------------- ###
-
-
-    ### ---------------------------------------------------------------------------------------------------- ###
-    # Mirar lo del zero correction previ a les mesures !!!
-    ### ---------------------------------------------------------------------------------------------------- ###
-    
-    
-    ### Configurar medicion de carga
-    
-    elif measure == "charge":
-        # Seleccionamos la funcion corriente
-        send_cmd(inst, 'SENS:FUNC "CHAR"')
-        send_cmd(inst, "CONF:CHAR")
-        
-        # Desactivamos el zero check and zero correction para mas velocidad pero menos precision
-        send_cmd(inst, "SYST:ZCH OFF")
-        send_cmd(inst, "SYST:ZCOR OFF")
-        
-        # Desactivamos el auto zero para augmentar la velocidad pero menos precision
-        send_cmd(inst, "SYST:AZER OFF")
-        
-        # Ponemos el rango fijo (si no esta fijo hay trompicones por el cambio de rango entre mediciones)
-        send_cmd(inst, "CHAR:RANG:AUTO OFF")
-        send_cmd(inst, "CHAR:RANG 200E-9")
-        
-        # Establecemos el tiempo de integracion
-        send_cmd(inst, "CHAR:NPLC 0.01")  # 1 ciclo de red = equilibrio entre precisión y velocidad, minimo 0.01
-
-
-
-    ### ---------------------------------------------------------------------------------------------------- ###
-    
-    else:
-        raise Exception("Error invalid measure parameter")
+# Elementos guardados por lectura: lectura, timestamp y estado
+elements = "READ,TIME,STAT"
 
-    # Ajustamos los digitos de la pantalla y la desactivamos para augmentar el sampling rate
-    send_cmd(inst, "DISP:DIG 4.5")
-    send_cmd(inst, "DISP:ENAB OFF")
+verbose = False
 
-    # Configuramos el Buffer
-    send_cmd(inst, f"TRIG:COUN {number_of_samples}")
-    send_cmd(inst, f"TRAC:POIN {number_of_samples}")
-    send_cmd(inst, "TRAC:FEED SENS;FEED:CONT NEXT")
+# Registro de tiempos de cada comando (resumen al acabar y traza para chrome://tracing
+# o ui.perfetto.dev); None para desactivarlo
+trace_file = None  # por ejemplo "trace.json"
 
-    # Iniciar adquisición
-    send_cmd(inst, "INIT")  
+# La conexión queda abierta entre llamadas a main(): el *RST se hace solo al abrir
+# y las capturas siguientes solo rearman el buffer (se cierra al salir del programa)
+pool = SessionPool(simulate, elements=elements, fmt=data_format)
 
-    print("Esperando a que se llene el buffer (SRQ)...")
-    wait_for_srq(inst)
-    print("SRQ recibido, leyendo estado...")
+def main(measure):
+    print("Inicializando Keithley 6514...")
+    session = pool.get(GPIB_ADDRESS)
+    keithley = session.keithley
+    tracer = trace(keithley) if trace_file else None
+
+    # Función, rango, integración y pantalla del perfil; solo se envía lo que
+    # cambia respecto a la captura anterior, con una sola comprobación
+    profile = profiles[measure]
 
-    meas_status = query_cmd(inst, "STAT:MEAS?")
-    print("STAT:MEAS? =", meas_status)
+    if auto_range:
+        print("Pre-escaneo en autorango...")
+        profile, scan = autorange_profile(keithley, profile)
+        print(f"Pico {scan['peak']:.3e}, autorango en {scan['selected_range']:g}, rango fijo elegido {profile['measure_range']}")
+        session.invalidate()  # el pre-escaneo ha cambiado el buffer y el rango
 
-    print("Leyendo TRAC:DATA...")
-    reading_data = query_cmd(inst, "TRAC:DATA?")
+    # Guardamos todas las columnas, con la configuración en la cabecera
+    metadata = {"function": measure, "range": profile["measure_range"], "nplc": profile["nplc"],
+                "address": GPIB_ADDRESS, "samples": number_of_samples, "elements": elements}
 
     try:
-        values = [float(x) for x in reading_data.split(',')]
+        if chunk_size:
+            # Cada trozo se decodifica y se escribe en disco en cuanto llega
+            print("Descargando el buffer por trozos mientras se llena...")
+            writer = None
+            try:
+                for block in session.capture_chunks(number_of_samples, profile, chunk_size):
+                    block = decode_readings(block, elements)
+                    if writer is None:
+                        writer = open_writer(OUTPUT_FILE, block.dtype, metadata)
+                    writer.write(block)
+                    if verbose:
+                        print(f"Trozo de {len(block)} lecturas")
+            finally:
+                # Si se corta a medias, lo recibido queda en disco con la cabecera cerrada
+                if writer is not None:
+                    writer.close()
+            if writer is None:
+                raise Exception("Error no ha llegado ningún trozo del buffer")
+            data = load(OUTPUT_FILE)[0]
+        else:
+            print("Esperando a que se llene el buffer (SRQ)...")
+            values = session.capture(number_of_samples, profile)
+            data = decode_readings(values, elements)
+            save(OUTPUT_FILE, data, metadata)
+        print("STAT:MEAS? =", keithley.meas_status)
 
         if verbose:
             print("Mediciones:")
-            for i, v in enumerate(values, 1):
+            for i, v in enumerate(data["reading"], 1):
                 print(f"{i}: {v:.3e} A")
 
-    except ValueError:
-        print("Error al procesar los datos:", reading_data)
-        values = []
+    except ValueError as e:
+        print("Error al procesar los datos:", e)
+        data = None
 
-    # print("\nPara repetir, reactiva el buffer con: FEED:CONT NEXT")
-    # send_cmd(inst, "FEED:CONT NEXT")
+    if tracer is not None:
+        tracer.print_summary()
+        tracer.write_chrome_trace(trace_file)
 
-    inst.close()
-    return values
+    return data
 
 if __name__ == "__main__":
     
     measure = "current" # It can be current, voltage, charge
     param_name = {"voltage":"Voltage (V)", "current":"Current (A)", "charge":"Coulombs (uC)"}
     
-    values = main(measure)
-
-    # Separar los datos en lecturas, timestamps y estados si están intercalados
-    read, timestamp, status = values[0::3], values[1::3], values[2::3]
-    
-    diff_time = timestamp[1] - timestamp[0]
-    timestamp_aux = np.linspace(0, diff_time * 2499, 2500)
+    # Lecturas, timestamps y estados (bits de la palabra de estado incluidos), ya guardados en OUTPUT_FILE
+    data = main(measure)
+    read = data["reading"]
 
-    with open('CSV_File.csv', mode='w', newline='') as file:
-        writer = csv.writer(file)
+    # Usamos los timestamps reales del instrumento, relativos a la primera lectura
+    timestamp_aux = data["timestamp"] - data["timestamp"][0]
 
-        # Escribir encabezados
-        writer.writerow(['Time (s)', param_name[measure]])
+    if data["overflow"].any():
+        print("Atención: lecturas fuera de rango:", np.count_nonzero(data["overflow"]))
 
-        # Escribir filas
-        for timestamp_val, current_val in zip(timestamp_aux, read):
-            writer.writerow([timestamp_val, current_val])
+    if export_to_csv:
+        export_csv('CSV_File.csv', [timestamp_aux, read], ['Time (s)', param_name[measure]])
 
 # %%
 
@@ -1,53 +1,75 @@
-import pyvisa
-import time
-import csv
 import matplotlib.pyplot as plt
+from Keithley_Data import format_commands, decode_readings
+from Keithley_6514 import Keithley6514
+from Keithley_Transport import open_transport
+from Keithley_Storage import export_csv_blocks
+from Keithley_Capture import CaptureWriter, CaptureReader
+from Keithley_Pipeline import Pipeline
+from Keithley_LivePlot import LivePlot, EnvelopeHistory
+from Keithley_Stats import StreamStats
+from Keithley_Supervisor import Supervisor
 
 # Cambia la dirección GPIB según tu configuración
 GPIB_ADDRESS = 'GPIB0::14::INSTR'  # GPIB0 es el bus, 14 es la dirección del Keithley
 number_of_samples = 2500
 
-# Configura el tamaño del buffer y el tiempo de espera entre lecturas
+# Con simulate = True se usa el 6514 simulado (Keithley_Sim) en lugar del instrumento real
+simulate = False
+
+# Configura el tamaño del buffer: se descarga por mitades mientras se llena la otra
 BUFFER_SIZE = 2500
-READ_INTERVAL = 0.5  # segundos
 
-verbose = False
+# Formato de transferencia del buffer: "sreal" (binario 32 bits), "dreal" (binario 64 bits) o "ascii"
+data_format = "sreal"
 
-def send_cmd(inst, cmd, wait=0.1):
-    """Envía comando SCPI"""
-    inst.write(cmd)
-    time.sleep(wait)
+# Fichero de captura de solo-añadir: la memoria no crece con la duración y si se
+# corta la adquisición lo confirmado en disco se conserva. Se puede abrir con
+# CaptureReader mientras se sigue midiendo. Exportación opcional a CSV al acabar.
+OUTPUT_FILE = "capture.cap"
+export_to_csv = True
 
-def query_cmd(inst, cmd, wait=0.1):
-    """Envía comando SCPI y devuelve respuesta"""
-    time.sleep(wait)
-    return inst.query(cmd).strip()
+# Gráfica en vivo durante la adquisición (se para al cerrar la ventana)
+live_plot = True
 
-def wait_for_srq(inst):
-    """Espera a que bit 6 del status byte esté activo (SRQ)"""
-    while True:
-        try:
-            stb = inst.stb  # Status Byte
-            if stb & 64:
-                return
-        except Exception:
-            continue
-        time.sleep(0.2)
+# Estadísticas en línea (media, desviación, mediana móvil, min/max) cada
+# STATS_INTERVAL segundos y avisos al cruzar los umbrales (en amperios)
+STATS_INTERVAL = 1.0
+MEDIAN_WINDOW = 5
+THRESHOLDS = []
 
-def main():
-    rm = pyvisa.ResourceManager()
-    inst = rm.open_resource(GPIB_ADDRESS)
+# Adquisición vigilada: ante un fallo del bus o un timeout se hace device clear, se
+# descarga lo que quedaba en el buffer, se vuelve a armar sin *RST ni TRAC:CLE y se
+# sigue midiendo; los cortes quedan anotados como huecos
+supervised = True
+
+verbose = False
+
+def print_summary(summary):
+    """Resumen de cada intervalo: estadísticas de las lecturas y último valor filtrado (mediana móvil)"""
+    print(f"[{summary['start']:.1f} s] {summary['count']} lecturas, media {summary['mean']:.4e} A, "
+          f"desviación {summary['std']:.2e} A, mediana {summary['median']:.4e} A, "
+          f"filtrada {float('nan') if summary['filtered'] is None else summary['filtered']:.4e} A, "
+          f"min {summary['min']:.4e} A, max {summary['max']:.4e} A")
+    for event in summary["events"]:
+        print(f"  Umbral {event['threshold']} cruzado ({event['direction']}) en t = {event['time']:.6f} s")
 
-    # Establecer timeout en milisegundos
-    inst.timeout = 5000  # 5 segundos
+def print_fault(error, retries):
+    print(f"Fallo de la adquisición ({error}), intento de recuperación {retries}...")
+
+def main():
+    transport = open_transport(GPIB_ADDRESS, simulate)  # timeout de 5 segundos
+    keithley = Keithley6514(transport, fmt=data_format)
 
     print("Inicializando Keithley 6514...")
 
+    streamer = keithley.streamer(BUFFER_SIZE)
+
+    # La configuración se acumula y se envía en bloque, sin esperas fijas entre comandos
+    config = []
+
     # Reseteo y configuración inicial
-    send_cmd(inst, "*RST")
-    send_cmd(inst, "STAT:PRES;*CLS")
-    send_cmd(inst, "STAT:MEAS:ENAB 512")
-    send_cmd(inst, "*SRE 1")
+    config.append("*RST")
+    config.append("STAT:PRES;*CLS")
     
     
     
@@ -58,26 +80,26 @@ def main():
     
     
     # Seleccionamos la funcion corriente
-    send_cmd(inst, 'SENS:FUNC "CURR"')
-    send_cmd(inst, "CONF:CURR")
+    config.append('SENS:FUNC "CURR"')
+    config.append("CONF:CURR")
     
     # Desactivamos el zero check and zero correction para mas velocidad pero menos precision
-    send_cmd(inst, "SYST:ZCH OFF")
-    send_cmd(inst, "SYST:ZCOR OFF")
+    config.append("SYST:ZCH OFF")
+    config.append("SYST:ZCOR OFF")
     
     # Desactivamos el auto zero para augmentar la velocidad pero menos precision
-    send_cmd(inst, "SYST:AZER OFF")
+    config.append("SYST:AZER OFF")
     
     # Ponemos el rango fijo (si no esta fijo hay trompicones por el cambio de rango entre mediciones)
-    send_cmd(inst, "CURR:RANG:AUTO OFF")
-    send_cmd(inst, "CURR:RANG 200E-6")
+    config.append("CURR:RANG:AUTO OFF")
+    config.append("CURR:RANG 200E-6")
     
     # Establecemos el tiempo de integracion
-    send_cmd(inst, "CURR:NPLC 0.01")  # 1 ciclo de red = equilibrio entre precisión y velocidad, minimo 0.01
+    config.append("CURR:NPLC 0.01")  # 1 ciclo de red = equilibrio entre precisión y velocidad, minimo 0.01
     
     
-    send_cmd(inst, "MED OFF")
-    send_cmd(inst, "AVER OFF")
+    config.append("MED OFF")
+    config.append("AVER OFF")
     
     
     
@@ -88,26 +110,26 @@ def main():
     
     
     # # Seleccionamos la funcion corriente
-    # send_cmd(inst, 'SENS:FUNC "VOLT"')
-    # send_cmd(inst, "CONF:VOLT")
+    # config.append('SENS:FUNC "VOLT"')
+    # config.append("CONF:VOLT")
     
     # # Desactivamos el zero check and zero correction para mas velocidad pero menos precision
-    # send_cmd(inst, "SYST:ZCH OFF")
-    # send_cmd(inst, "SYST:ZCOR OFF")
+    # config.append("SYST:ZCH OFF")
+    # config.append("SYST:ZCOR OFF")
     
     # # Desactivamos el auto zero para augmentar la velocidad pero menos precision
-    # send_cmd(inst, "SYST:AZER ON")
+    # config.append("SYST:AZER ON")
     
     # # Ponemos el rango fijo (si no esta fijo hay trompicones por el cambio de rango entre mediciones)
-    # send_cmd(inst, "VOLT:RANG:AUTO OFF")
-    # send_cmd(inst, "VOLT:RANG 200")
+    # config.append("VOLT:RANG:AUTO OFF")
+    # config.append("VOLT:RANG 200")
     
     # # Establecemos el tiempo de integracion
-    # send_cmd(inst, "VOLT:NPLC 0.01")  # 1 ciclo de red = equilibrio entre precisión y velocidad, minimo 0.01
+    # config.append("VOLT:NPLC 0.01")  # 1 ciclo de red = equilibrio entre precisión y velocidad, minimo 0.01
     
     
-    # send_cmd(inst, "MED OFF")
-    # send_cmd(inst, "AVER OFF")
+    # config.append("MED OFF")
+    # config.append("AVER OFF")
 
 
     ### ---------------------------------------------------------------------------------------------------- ###
@@ -122,22 +144,22 @@ def main():
     
     
     # # Seleccionamos la funcion corriente
-    # send_cmd(inst, 'SENS:FUNC "CHAR"')
-    # send_cmd(inst, "CONF:CHAR")
+    # config.append('SENS:FUNC "CHAR"')
+    # config.append("CONF:CHAR")
     
     # # Desactivamos el zero check and zero correction para mas velocidad pero menos precision
-    # send_cmd(inst, "SYST:ZCH OFF")
-    # send_cmd(inst, "SYST:ZCOR OFF")
+    # config.append("SYST:ZCH OFF")
+    # config.append("SYST:ZCOR OFF")
     
     # # Desactivamos el auto zero para augmentar la velocidad pero menos precision
-    # send_cmd(inst, "SYST:AZER OFF")
+    # config.append("SYST:AZER OFF")
     
     # # Ponemos el rango fijo (si no esta fijo hay trompicones por el cambio de rango entre mediciones)
-    # send_cmd(inst, "CHAR:RANG:AUTO OFF")
-    # send_cmd(inst, "CHAR:RANG 200E-9")
+    # config.append("CHAR:RANG:AUTO OFF")
+    # config.append("CHAR:RANG 200E-9")
     
     # # Establecemos el tiempo de integracion
-    # send_cmd(inst, "CHAR:NPLC 0.01")  # 1 ciclo de red = equilibrio entre precisión y velocidad, minimo 0.01
+    # config.append("CHAR:NPLC 0.01")  # 1 ciclo de red = equilibrio entre precisión y velocidad, minimo 0.01
 
 
 
@@ -146,71 +168,96 @@ def main():
     
 
     # Ajustamos los digitos de la pantalla y la desactivamos para augmentar el sampling rate
-    send_cmd(inst, "DISP:DIG 4.5")
-    send_cmd(inst, "DISP:ENAB ON")
+    config.append("DISP:DIG 4.5")
+    config.append("DISP:ENAB ON")
 
-    # Configuramos el Buffer
-    send_cmd(inst, "TRIG:COUN INF")
-    send_cmd(inst, f"TRAC:POIN {BUFFER_SIZE}")
-    send_cmd(inst, "TRAC:FEED SENS;FEED:CONT NEXT")
-    
-    # input("Waiting to start press enter")
+    # Configuramos el Buffer circular, el formato y el SRQ en BHF/BFL
+    config += streamer.commands()
+    config += format_commands(data_format)
 
-    # Iniciar adquisición
-    send_cmd(inst, "INIT")
+    # Una sola comprobación de *OPC? y SYST:ERR? al final (en modo vigilado la envía
+    # el Supervisor al empezar; tras un fallo solo reenvía la parte de rearme del Streamer)
+    if supervised:
+        supervisor = Supervisor(keithley, config, BUFFER_SIZE, on_fault=print_fault)
+    else:
+        keithley.configure(config)
     
-    time.sleep(0.5)
-    
-    # input("After init, press key to continue")
+    # input("Waiting to start press enter")
 
     print("Adquisición iniciada. Pulsa Ctrl+C para detenerla.")
 
-    last_index = 0
-    inst.timeout = 10000
-
-    try:
-        while True:
-            # Consultar cuántos datos hay disponibles en el buffer
-            print("Query how much points are in the buffer...")
-            points = int(query_cmd(inst, ":TRAC:POIN?"))
-            print("Points:", points[0])
-
-            if points > last_index:
-                # Leer solo los datos nuevos
-                new_data = query_cmd(inst, f":TRAC:DATA? {last_index + 1},{points}")
-                values = [float(x) for x in new_data.strip().split(",")]
+    transport.inst.timeout = 10000
+
+    metadata = {"function": "current", "range": "200E-6", "nplc": 0.01,
+                "address": GPIB_ADDRESS, "buffer_size": BUFFER_SIZE}
+    capture = CaptureWriter(OUTPUT_FILE, metadata=metadata)
+
+    # Streamer envía INIT y va entregando una mitad del buffer cada vez que se llena
+    if supervised:
+        stream, stop, gaps = supervisor.blocks(), supervisor.stop, supervisor.gaps
+    else:
+        stream, stop, gaps = streamer.blocks(), streamer.stop, streamer.gaps
+    stats = StreamStats(streamer.elements, STATS_INTERVAL, MEDIAN_WINDOW, THRESHOLDS, on_summary=print_summary)
+    if live_plot:
+        # La E/S pasa a su propio hilo y la gráfica se dibuja en este (el de la GUI);
+        # la captura no pierde datos, la gráfica sí puede saltarse bloques si va lenta
+        pipeline = Pipeline(stream, width=len(streamer.elements), stop=stop)
+        pipeline.add_consumer(lambda block: capture.append(decode_readings(block)), lossless=True, name="captura")
+        pipeline.add_consumer(stats.add, lossless=True, name="estadisticas")
+        plot = LivePlot(pipeline.reader(lossless=False, name="grafica"))
+        pipeline.start()
+        try:
+            plot.run()
+        except KeyboardInterrupt:
+            print("Adquisición detenida por el usuario.")
+        finally:
+            pipeline.stop()  # Detiene la adquisición (ABOR) al acabar el bloque en curso
+            pipeline.ring.remove(plot.reader)
+            try:
+                pipeline.join()  # Lanza el error si ha fallado la captura o las estadísticas
+            finally:
+                capture.close()
+    else:
+        try:
+            for i, block in enumerate(stream, 1):
+                capture.append(decode_readings(block))
+                stats.add(block)
+                print(f"Bloque {i}: {len(block)} lecturas, huecos: {len(gaps)}")
 
-                # Guardar en el CSV y mostrar por pantalla
-                for i, val in enumerate(values, start=last_index + 1):
-                    writer.writerow([i, val])
-                    print(f"Medición {i}: {val}")
+        except KeyboardInterrupt:
+            print("Adquisición detenida por el usuario.")
+        finally:
+            stream.close()  # Detiene la adquisición (ABOR)
+            capture.close()
 
-                file.flush()
-                last_index = points
+    stats.flush()
+    total = stats.total
+    print(f"Total: {total.count} lecturas, media {total.mean:.4e} A, desviación {total.std:.2e} A, "
+          f"min {total.min:.4e} A, max {total.max:.4e} A, eventos: {len(stats.events)}")
 
-            time.sleep(READ_INTERVAL)
+    for gap in gaps:
+        print(f"Hueco en la lectura {gap['index']}: {gap['start']:.6f} s -> {gap['end']:.6f} s, perdidas: {gap['missing']}"
+              + (f" ({gap['error']})" if "error" in gap else ""))
 
-    except KeyboardInterrupt:
-        print("Adquisición detenida por el usuario.")
-        send_cmd(inst, ":ABOR")  # Detiene la adquisición
+    keithley.close()
+    return OUTPUT_FILE
 
 if __name__ == "__main__":
-    values = main()
+    path = main()
 
-    # Separar los datos en lecturas, timestamps y estados si están intercalados
-    read, timestamp, status = values[0::3], values[1::3], values[2::3]
+    # Los datos se leen del fichero de captura mapeado por trozos, sin tenerlos
+    # enteros en memoria
+    capture = CaptureReader(path)
 
-    with open('CSV_File.csv', mode='w', newline='') as file:
-        writer = csv.writer(file)
+    if export_to_csv:
+        export_csv_blocks('CSV_File.csv', ([block["timestamp"], block["reading"]] for block in capture.blocks()),
+                          ['Time (s)', 'Current (A)'])
 
-        # Escribir encabezados
-        writer.writerow(['Time (s)', 'Current (A)'])
+    # Con horas de datos se dibuja la envolvente min/max en lugar de millones de puntos
+    history = EnvelopeHistory()
+    for block in capture.blocks():
+        history.add(block["timestamp"], block["reading"])
 
-        # Escribir filas
-        for timestamp_val, current_val in zip(timestamp, read):
-            writer.writerow([timestamp_val, current_val])
-            
-            
     plt.figure(0)
-    plt.plot(timestamp, read)
+    plt.plot(*history.xy())
 
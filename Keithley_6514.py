@@ -0,0 +1,244 @@
+import time
+from Keithley_Data import DATA_FORMATS, format_commands, read_block, decode_readings
+from Keithley_Config import Configurator
+from Keithley_Stream import Streamer, fetch_chunks, CHUNK_SIZE
+
+# Nombre SCPI de cada función de medida
+FUNCTIONS = {"current": "CURR", "voltage": "VOLT", "charge": "CHAR"}
+
+# Rangos del 6514 por función (fondo de escala); los usan el autorango y el simulador
+RANGES = {
+    "CURR": [20e-12, 200e-12, 2e-9, 20e-9, 200e-9, 2e-6, 20e-6, 200e-6, 2e-3, 20e-3],
+    "VOLT": [2.0, 20.0, 200.0],
+    "CHAR": [20e-9, 200e-9, 2e-6, 20e-6],
+}
+
+# Origen del trigger en modo disparado: bus (GET o *TRG) o línea de trigger externa
+TRIGGER_SOURCES = {"BUS": "BUS", "EXT": "TLIN"}
+
+
+class Keithley6514:
+    """Driver del 6514 sobre cualquier transporte de Keithley_Transport
+
+    Toda la lógica (configuración, buffer, SRQ, descarga) está aquí una sola
+    vez; el transporte solo aporta la E/S, así cualquier mejora llega a GPIB
+    y RS-232 a la vez.
+    """
+
+    def __init__(self, transport, elements="READ,TIME,STAT", fmt="sreal"):
+        self.transport = transport
+        self.elements = elements
+        self.fmt = fmt
+        self.configurator = Configurator(transport.write, transport.query)
+
+    # ------------------------------------------------------------ E/S básica
+
+    def write(self, cmd):
+        self.transport.write(cmd)
+
+    def query(self, cmd):
+        return self.transport.query(cmd)
+
+    def wait_for_srq(self, timeout=None):
+        return self.transport.wait_for_srq(timeout)
+
+    def configure(self, commands):
+        """Envía la configuración en bloque con una sola comprobación de *OPC? y SYST:ERR?
+
+        Se envía entera, pero queda anotada en la caché del configurador para
+        que apply_profile() sepa qué ajustes ya tiene el instrumento.
+        """
+        self.configurator.apply(commands, diff=False)
+
+    def fetch(self, count, cmd="TRAC:DATA?", fmt=None):
+        """Pide datos (TRAC:DATA?, FETC?...) y devuelve 'count' valores como array"""
+        fmt = fmt or self.fmt
+        self.transport.write(cmd)
+        if DATA_FORMATS[fmt][1] is None:
+            return self.transport.read_ascii(count)
+        return read_block(self.transport.read_bytes, self.transport.read_line, count, fmt)
+
+    def close(self):
+        self.transport.close()
+
+    # -------------------------------------------------------- configuración
+
+    def measure_commands(self, measure="current", measure_range=None, nplc=0.01, autozero=False,
+                         display=False, digits=4.5, conf=True):
+        """Comandos de función, rango, integración y pantalla (measure_range None = autorango)
+
+        Con conf=False no se envía CONF:<función>, que además devuelve el
+        modelo de trigger a una sola medida (lo que usan los perfiles).
+        """
+        if measure not in FUNCTIONS:
+            raise Exception("Error invalid measure parameter")
+        f = FUNCTIONS[measure]
+
+        config = []
+        config.append(f'SENS:FUNC "{f}"')
+        if conf:
+            config.append(f"CONF:{f}")
+
+        # Desactivamos el zero check and zero correction para mas velocidad pero menos precision
+        config.append("SYST:ZCH OFF")
+        config.append("SYST:ZCOR OFF")
+
+        # El auto zero dobla el tiempo por lectura
+        config.append("SYST:AZER " + ("ON" if autozero else "OFF"))
+
+        # Rango fijo (si no esta fijo hay trompicones por el cambio de rango entre mediciones)
+        if measure_range is None:
+            config.append(f"{f}:RANG:AUTO ON")
+        else:
+            config.append(f"{f}:RANG:AUTO OFF")
+            config.append(f"{f}:RANG {measure_range}")
+
+        # 1 ciclo de red = equilibrio entre precisión y velocidad, minimo 0.01
+        config.append(f"{f}:NPLC {nplc}")
+
+        if measure != "charge":
+            config.append("MED OFF")
+            config.append("AVER OFF")
+
+        # Digitos de la pantalla; apagarla aumenta el sampling rate
+        config.append(f"DISP:DIG {digits}")
+        config.append("DISP:ENAB " + ("ON" if display else "OFF"))
+        return config
+
+    def profile_commands(self, profile):
+        """Comandos de un perfil de Keithley_Profiles (sin CONF, para poder aplicarlo en diferencia)"""
+        profile = dict(profile)
+        extra = profile.pop("commands", [])
+        return self.measure_commands(conf=False, **profile) + list(extra)
+
+    def apply_profile(self, profile):
+        """Cambia al perfil enviando solo los ajustes que difieren del estado actual
+
+        Devuelve los comandos enviados (ninguno si ya estaba aplicado).
+        """
+        return self.configurator.apply(self.profile_commands(profile))
+
+    def buffer_commands(self, samples):
+        """Buffer lleno una vez (FEED:CONT NEXT) con SRQ en BFL"""
+        config = [
+            "STAT:PRES;*CLS",
+            "STAT:MEAS:ENAB 512",      # Habilitar BFL (bit 9 del registro de medida)
+            "*SRE 1",                  # SRQ cuando el bit 0 del status byte se activa
+            f"TRIG:COUN {samples}",
+            f"TRAC:POIN {samples}",
+            "TRAC:FEED SENS;FEED:CONT NEXT",
+            f"FORM:ELEM {self.elements}",
+        ]
+        return config + format_commands(self.fmt)
+
+    # ----------------------------------------------------------- adquisición
+
+    def acquire(self, samples, timeout=60.0, setup=()):
+        """Llena el buffer una vez y devuelve los valores intercalados (sin decodificar)
+
+        setup son comandos previos (reset, measure_commands...) que se envían
+        en el mismo bloque que la configuración del buffer.
+        """
+        self.configure(list(setup) + self.buffer_commands(samples))
+        self.write("INIT")
+        return self.collect(samples, timeout)
+
+    def rearm(self):
+        """Vuelve a llenar el buffer con la configuración que ya tiene: solo FEED:CONT NEXT e INIT"""
+        self.write("TRAC:FEED:CONT NEXT;:INIT")
+
+    def collect(self, samples, timeout=60.0):
+        """Espera el SRQ de buffer lleno y descarga 'samples' lecturas"""
+        self.wait_for_srq(timeout)
+
+        # Leer STAT:MEAS? borra el registro y libera el SRQ
+        self.meas_status = int(self.query("STAT:MEAS?"))
+        return self.fetch(samples * len(self.elements.split(',')))
+
+    def collect_chunks(self, samples, chunk=CHUNK_SIZE, timeout=60.0):
+        """Como collect() pero por trozos mientras el buffer se llena (generador de arrays lecturas x elementos)"""
+        yield from fetch_chunks(self, samples, self.elements, chunk, timeout)
+
+        # El SRQ de BFL ya habrá llegado: leer STAT:MEAS? lo libera para la próxima captura
+        self.wait_for_srq(timeout)
+        self.meas_status = int(self.query("STAT:MEAS?"))
+
+    def read_buffer(self, samples, timeout=60.0, setup=()):
+        """acquire() decodificado como array estructurado"""
+        return decode_readings(self.acquire(samples, timeout, setup), self.elements)
+
+    # -------------------------------------------------------- modo disparado
+
+    def trigger_commands(self, source="BUS", burst=1):
+        """La capa ARM espera cada trigger y hace 'burst' lecturas; SRQ al acabar"""
+        if source not in TRIGGER_SOURCES:
+            raise Exception("Error invalid trigger source: " + str(source))
+        config = [
+            "STAT:PRES;*CLS",
+            "*SRE 1",
+            f"ARM:SOUR {TRIGGER_SOURCES[source]}",
+            "ARM:COUN INF",                # vuelve a la capa ARM tras cada trigger
+            "TRIG:SOUR IMM",
+            f"TRIG:COUN {burst}",
+            f"FORM:ELEM {self.elements}",
+        ]
+        if burst == 1:
+            # SRQ en RAV (lectura disponible); el dato se pide con FETC?
+            config += ["STAT:MEAS:ENAB 32", "TRAC:FEED:CONT NEV"]
+        else:
+            # La ráfaga va al buffer y el SRQ llega con BFL
+            config += ["STAT:MEAS:ENAB 512", "TRAC:CLE", f"TRAC:POIN {burst}", "TRAC:FEED SENS;FEED:CONT NEXT"]
+        return config + format_commands(self.fmt)
+
+    def start_triggered(self, source="BUS", burst=1, setup=()):
+        """Configura el modo disparado (setup se envía en el mismo bloque) y arma el instrumento"""
+        self.configure(list(setup) + self.trigger_commands(source, burst))
+        self.trigger_source = source
+        self.burst = burst
+        self.write("INIT")
+
+    def read_triggered(self, timeout=10.0):
+        """Una medida disparada: devuelve (value, timestamp, latency)
+
+        Con trigger de bus se dispara aquí y latency es el tiempo en el PC desde
+        el trigger hasta tener el dato; con trigger externo se cuenta desde el
+        SRQ. timestamp es el del instrumento (None sin TIME en FORM:ELEM). Con
+        burst > 1 value y timestamp son arrays. Con trigger de bus queda además
+        en self.srq_latency el tiempo desde el trigger hasta el SRQ.
+        """
+        if self.trigger_source == "BUS":
+            t0 = time.perf_counter()
+            self.transport.assert_trigger()
+            self.wait_for_srq(timeout)
+            self.srq_latency = time.perf_counter() - t0
+        else:
+            self.wait_for_srq(timeout)
+            t0 = time.perf_counter()
+
+        n = len(self.elements.split(','))
+        if self.burst == 1:
+            values = self.fetch(n, "FETC?")
+        else:
+            values = self.fetch(n * self.burst, "TRAC:DATA?")
+        latency = time.perf_counter() - t0
+
+        # Leer STAT:MEAS? borra solo el registro de medida (sin flanco nuevo no
+        # habría SRQ en el siguiente trigger); la cola de errores se conserva.
+        # Va después de tener el dato para no sumarlo a la latencia.
+        if self.burst == 1:
+            self.meas_status = int(self.query("STAT:MEAS?"))
+        else:
+            self.meas_status = int(self.query("STAT:MEAS?;:TRAC:CLE;:TRAC:FEED:CONT NEXT"))
+
+        data = decode_readings(values, self.elements)
+        timestamp = data["timestamp"] if "timestamp" in data.dtype.names else None
+        if self.burst == 1:
+            return data["reading"][0], None if timestamp is None else timestamp[0], latency
+        return data["reading"], timestamp, latency
+
+    def stop_triggered(self):
+        self.write("ABOR")
+
+    def streamer(self, buffer_size=2500, timeout=60.0):
+        """Streamer de doble buffer sobre este instrumento"""
+        return Streamer(self, buffer_size, self.elements, self.fmt, timeout)
@@ -0,0 +1,168 @@
+import asyncio
+import time
+from functools import partial
+from Keithley_Data import format_commands, decode_readings
+from Keithley_Status import SRQ_BIT, POLL_MIN, POLL_MAX
+from Keithley_6514 import Keithley6514
+from Keithley_Transport import open_transport
+
+# Direcciones para la demo de __main__
+ADDRESSES = ["GPIB0::14::INSTR", "GPIB0::15::INSTR"]
+
+# Con simulate = True se usan 6514 simulados (Keithley_Sim) en lugar de los instrumentos reales
+simulate = False
+
+
+class AsyncKeithley6514:
+    """Versión asíncrona de Keithley_6514.Keithley6514 (GPIB, RS-232 o simulador)
+
+    Cada llamada bloqueante del driver (write, query, descarga) se ejecuta en
+    el executor del bucle (por defecto el compartido del propio bucle), y un asyncio.Lock
+    por instrumento evita mezclar mensajes. Las esperas de SRQ no ocupan
+    ningún hilo: se sondea el status byte con asyncio.sleep entre lecturas,
+    así muchos instrumentos y consumidores comparten un único bucle.
+    """
+
+    def __init__(self, device, executor=None):
+        self.device = device
+        self.elements = device.elements
+        self.fmt = device.fmt
+        self.executor = executor
+        self.samples = None      # lecturas del último arm()
+        self.lock = asyncio.Lock()
+
+    async def _call(self, fn, *args):
+        """Ejecuta fn(*args) en el executor con el instrumento en exclusiva"""
+        loop = asyncio.get_running_loop()
+        async with self.lock:
+            return await loop.run_in_executor(self.executor, partial(fn, *args))
+
+    # ------------------------------------------------------------ básicos
+
+    async def write(self, cmd):
+        await self._call(self.device.write, cmd)
+
+    async def query(self, cmd):
+        return await self._call(self.device.query, cmd)
+
+    async def read_stb(self):
+        return await self._call(self.device.transport.read_stb)
+
+    async def configure(self, commands):
+        """Configuración en bloque con una sola comprobación de *OPC? y SYST:ERR?"""
+        await self._call(self.device.configure, commands)
+
+    async def apply_profile(self, profile):
+        """Cambia de perfil enviando solo los ajustes que difieren (ver Keithley6514.apply_profile)"""
+        return await self._call(self.device.apply_profile, profile)
+
+    async def wait_for_srq(self, timeout=60.0):
+        """Espera el SRQ sondeando el status byte con espera creciente, sin bloquear el bucle"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        delay = POLL_MIN
+        while True:
+            stb = await self.read_stb()
+            if stb & SRQ_BIT:
+                return stb
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise TimeoutError("SRQ no recibido en %.1f s" % timeout)
+            await asyncio.sleep(min(delay, remaining))
+            delay = min(delay * 2, POLL_MAX)
+
+    # ----------------------------------------------------------- adquisición
+
+    async def arm(self, samples):
+        """Prepara el buffer para 'samples' lecturas con SRQ en BFL e inicia la medida"""
+        await self.configure(self.device.buffer_commands(samples))
+        self.samples = samples
+        await self.write("INIT")
+
+    async def wait_for_buffer(self, timeout=60.0):
+        """Espera a que el buffer esté lleno y devuelve STAT:MEAS? (lo que libera el SRQ)"""
+        await self.wait_for_srq(timeout)
+        return int(await self.query("STAT:MEAS?"))
+
+    async def fetch(self, samples=None):
+        """Descarga el buffer como array estructurado"""
+        samples = self.samples if samples is None else samples
+        if samples is None:
+            raise ValueError("fetch() sin número de lecturas: hay que indicar samples o llamar antes a arm()")
+        count = samples * len(self.elements.split(','))
+        values = await self._call(self.device.fetch, count)
+        return decode_readings(values, self.elements)
+
+    async def acquire(self, samples, timeout=60.0):
+        """arm + wait_for_buffer + fetch"""
+        await self.arm(samples)
+        await self.wait_for_buffer(timeout)
+        return await self.fetch(samples)
+
+    async def stream(self, buffer_size=2500, timeout=60.0):
+        """Generador asíncrono de bloques de medio buffer, como Keithley_Stream.Streamer
+
+        Usa la máquina de estados del Streamer (qué mitad descargar, orden y
+        detector de huecos); la E/S y la espera del SRQ van por este driver.
+        """
+        streamer = self.device.streamer(buffer_size, timeout)
+        await self.configure(streamer.commands() + ["TRIG:SOUR IMM", "ARM:SOUR IMM"] + format_commands(self.fmt))
+        self.streamer = streamer
+
+        streamer.reset()
+        await self.write("INIT")
+        try:
+            while True:
+                window = streamer.next_window()
+                if window is None:
+                    await self.wait_for_srq(timeout)
+                    streamer.on_status(int(await self.query("STAT:MEAS?")))
+                    continue
+
+                block = streamer.accept(await self._call(self.device.fetch, *streamer.fetch_args(window)))
+                if len(block):
+                    yield decode_readings(block, self.elements)
+        finally:
+            await self.write("ABOR")
+
+    async def close(self):
+        await self._call(self.device.close)
+
+
+async def main():
+    devices = [AsyncKeithley6514(Keithley6514(open_transport(address, simulate))) for address in ADDRESSES]
+
+    setup = ["*RST", 'SENS:FUNC "CURR"', "SYST:ZCH OFF", "SYST:AZER OFF", "CURR:RANG:AUTO OFF",
+             "CURR:RANG 200E-6", "CURR:NPLC 0.01", "DISP:ENAB OFF"]
+    await asyncio.gather(*(d.configure(setup) for d in devices))
+
+    async def heartbeat():
+        # Demuestra que el bucle sigue libre mientras los instrumentos miden
+        t0 = time.perf_counter()
+        while True:
+            await asyncio.sleep(0.5)
+            print(f"  bucle activo, t = {time.perf_counter() - t0:.1f} s")
+
+    ticker = asyncio.create_task(heartbeat())
+    t0 = time.perf_counter()
+    results = await asyncio.gather(*(d.acquire(2500) for d in devices))
+    print(f"{len(devices)} instrumentos en {time.perf_counter() - t0:.2f} s")
+    for address, data in zip(ADDRESSES, results):
+        print(f"{address}: {len(data)} lecturas, media {data['reading'].mean():.4e}")
+
+    # Streaming del primero durante unos bloques
+    blocks = devices[0].stream(2500)
+    async for block in blocks:
+        print(f"Bloque: {len(block)} lecturas, último t = {block['timestamp'][-1]:.3f} s")
+        if block["timestamp"][-1] > 5:
+            break
+    await blocks.aclose()
+    print("Huecos detectados:", len(devices[0].streamer.gaps))
+
+    ticker.cancel()
+    for d in devices:
+        await d.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,64 @@
+import numpy as np
+from Keithley_6514 import FUNCTIONS, RANGES
+
+# Margen sobre el pico del pre-escaneo al elegir el rango fijo (0.25 = 25 %)
+HEADROOM = 0.25
+
+# Lecturas del pre-escaneo con autorango y su integración: pocas y algo más
+# lentas que las de la adquisición para que el autorango tenga tiempo de asentarse
+PRESCAN_SAMPLES = 50
+PRESCAN_NPLC = 0.1
+
+# Las lecturas en overflow las devuelve el 6514 como +9.9E37
+OVERFLOW_VALUE = 9.9e37
+
+
+def choose_range(peak, measure="current", headroom=HEADROOM):
+    """Rango fijo más ajustado que contiene peak * (1 + headroom)"""
+    ranges = RANGES[FUNCTIONS[measure]]
+    needed = abs(peak) * (1 + headroom)
+    for r in ranges:
+        if needed <= r:
+            return r
+    raise Exception("Error la señal (pico %g) no cabe en el rango máximo %g con el margen pedido" % (peak, ranges[-1]))
+
+
+def prescan(keithley, measure="current", samples=PRESCAN_SAMPLES, nplc=PRESCAN_NPLC, timeout=60.0):
+    """Ráfaga corta con autorango: devuelve el rango que ha elegido el 6514 y el pico medido"""
+    f = FUNCTIONS[measure]
+    setup = keithley.measure_commands(measure, None, nplc, conf=False)
+    data = keithley.read_buffer(samples, timeout, setup)
+
+    reading = data["reading"]
+    over = np.abs(reading) >= OVERFLOW_VALUE / 10
+    if "overflow" in data.dtype.names:
+        over |= data["overflow"].astype(bool)
+    if over.all():
+        raise Exception("Error todas las lecturas del pre-escaneo están en overflow")
+
+    return {"measure": measure, "samples": len(reading), "overflows": int(np.count_nonzero(over)),
+            "selected_range": float(keithley.query(f"{f}:RANG?")),
+            "peak": float(np.max(np.abs(reading[~over])))}
+
+
+def plan_range(keithley, measure="current", headroom=HEADROOM, **prescan_args):
+    """Pre-escaneo + elección del rango fijo; devuelve el resumen con la clave "range"
+
+    Si el autorango acabó en un rango mayor que el del pico (por ejemplo por
+    un transitorio al empezar) se usa el pico; las lecturas en overflow del
+    pre-escaneo se cuentan en "overflows" pero no se usan.
+    """
+    scan = prescan(keithley, measure, **prescan_args)
+    scan["range"] = choose_range(scan["peak"], measure, headroom)
+    return scan
+
+
+def autorange_profile(keithley, profile, headroom=HEADROOM, **prescan_args):
+    """Perfil de Keithley_Profiles con el measure_range elegido por un pre-escaneo
+
+    Devuelve (perfil para la adquisición rápida a rango fijo, resumen del
+    pre-escaneo). El pre-escaneo deja el buffer configurado para sus
+    lecturas: una Session tiene que hacer invalidate() antes de capturar.
+    """
+    scan = plan_range(keithley, profile["measure"], headroom, **prescan_args)
+    return dict(profile, measure_range="%g" % scan["range"]), scan
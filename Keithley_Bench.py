@@ -0,0 +1,313 @@
+import json
+import os
+import platform
+import subprocess
+import time
+from datetime import datetime
+import numpy as np
+import pyvisa
+import serial
+from Keithley_Data import format_commands, decode_readings
+from Keithley_6514 import Keithley6514
+from Keithley_Transport import VisaTransport, SerialTransport
+from Keithley_Trace import Tracer
+from Keithley_Sim import SimulatedResourceManager, SerialSimulator
+
+# Banco de pruebas de adquisición: mide el efecto real de NPLC, pantalla, autozero,
+# rango y formato en cada modo, y guarda los resultados en JSON para compararlos
+# entre cambios. Cada ejecución añade una línea a RESULTS_FILE.
+
+GPIB_ADDRESS = "GPIB0::14::INSTR"
+SERIAL_PORT = "COM9"
+BAUDRATE = 9600
+
+# Con simulate = True se usa el 6514 simulado (Keithley_Sim) en lugar del instrumento real
+simulate = False
+
+RESULTS_FILE = "benchmark.jsonl"
+
+# Modos a medir: "block" (buffer entero y SRQ), "stream" (doble buffer continuo),
+# "trigger" (una lectura por assert_trigger, como GPIB_BusTEST) y "serial" (block por RS-232)
+MODES = ["block", "stream", "trigger", "serial"]
+
+SAMPLES = 2500           # lecturas por medida en modo block
+SERIAL_SAMPLES = 500     # a 9600 baudios 2500 lecturas tardan más de medio minuto en bajar
+STREAM_SECONDS = 10.0    # duración de cada medida en modo stream
+STREAM_BUFFER = 2500
+TRIGGERS = 200           # triggers por medida en modo trigger
+ACQ_TIMEOUT = 600.0      # segundos, con NPLC altos el buffer tarda en llenarse
+
+# Configuración de partida; cada caso cambia solo lo que indique
+BASE_SETTINGS = {
+    "function": "current",   # current, voltage o charge (Keithley_6514.FUNCTIONS)
+    "range": "200E-6",       # None = autorango
+    "nplc": 0.01,
+    "autozero": False,
+    "display": False,
+    "digits": 4.5,
+    "format": "sreal",
+    "elements": "READ,TIME,STAT",
+}
+
+CASES = [
+    {"name": "base"},
+    {"name": "pantalla", "display": True},
+    {"name": "autozero", "autozero": True},
+    {"name": "autorango", "range": None},
+    {"name": "nplc 1", "nplc": 1},
+    {"name": "ascii", "format": "ascii"},
+]
+
+
+class TimedIO:
+    """Envuelve un recurso (pyvisa o pyserial) y acumula tiempo y bytes de las descargas
+
+    Solo cuenta las lecturas por las que llegan los datos del buffer; las
+    respuestas cortas (query de pyvisa, read_until de las query por RS-232)
+    no entran en el tiempo de descarga.
+    """
+
+    READS = ("read", "read_raw", "read_bytes")
+
+    def __init__(self, inst):
+        self.inst = inst
+        self.io_time = 0.0
+        self.bytes = 0
+
+    def __getattr__(self, name):
+        attr = getattr(self.inst, name)
+        if name not in self.READS:
+            return attr
+
+        def timed(*args, **kwargs):
+            t0 = time.perf_counter()
+            result = attr(*args, **kwargs)
+            self.io_time += time.perf_counter() - t0
+            self.bytes += len(result)
+            return result
+        return timed
+
+
+def percentiles(seconds):
+    """Resumen de latencias en milisegundos"""
+    ms = np.asarray(seconds, dtype=float) * 1000
+    if len(ms) == 0:
+        return {}
+    return {"p50": float(np.percentile(ms, 50)), "p90": float(np.percentile(ms, 90)),
+            "p99": float(np.percentile(ms, 99)), "max": float(ms.max()), "mean": float(ms.mean())}
+
+
+def timed(fn, *args):
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - t0
+
+
+def setup_commands(device, s):
+    """Reseteo y medida de un caso con los comandos del driver"""
+    return ["*RST"] + device.measure_commands(s["function"], s["range"], s["nplc"], s["autozero"],
+                                              s["display"], s["digits"])
+
+
+def _bench_acquire(device, io, s, samples):
+    """Métricas comunes de block y serial: Keithley6514.acquire() con sus fases medidas
+
+    configure y fetch se registran como tramos; la adquisición es el resto de
+    acquire() (INIT, espera del SRQ y STAT:MEAS?).
+    """
+    tracer = Tracer()
+    device.configure = tracer.wrap(device.configure, "configure")
+    device.fetch = tracer.wrap(device.fetch, "fetch")
+    values, acquire_time = timed(device.acquire, samples, ACQ_TIMEOUT, setup_commands(device, s))
+    config_time = tracer.stats[("span", "configure")]["total"]
+    fetch_time = tracer.stats[("span", "fetch")]["total"]
+    acq_time = acquire_time - config_time - fetch_time
+
+    download_time = io.io_time
+    data, decode_time = timed(decode_readings, values, s["elements"])
+    parse_time = fetch_time - download_time + decode_time
+    total = config_time + acq_time + fetch_time + decode_time
+    result = {
+        "samples": len(data),
+        "config_time": config_time,
+        "acquisition_time": acq_time,
+        "download_time": download_time,
+        "parse_time": parse_time,
+        "bytes": io.bytes,
+        "total_time": total,
+        "instrument_rate": len(data) / acq_time if acq_time else None,
+        "effective_rate": len(data) / total if total else None,
+    }
+    if "timestamp" in data.dtype.names and len(data) > 1:
+        result["reading_period"] = float(np.median(np.diff(data["timestamp"])))
+    return result
+
+
+def bench_block(inst, s, samples=SAMPLES):
+    """Buffer entero: configuración, llenado hasta SRQ, descarga y decodificación"""
+    io = TimedIO(inst)
+    device = Keithley6514(VisaTransport(io), s["elements"], s["format"])
+    return _bench_acquire(device, io, s, samples)
+
+
+def bench_serial(ser, s, samples=SERIAL_SAMPLES):
+    """Igual que bench_block pero por RS-232, con sondeo de *STB? en lugar de SRQ"""
+    io = TimedIO(ser)
+    transport = SerialTransport(io)
+    transport.clear()
+    return _bench_acquire(Keithley6514(transport, s["elements"], s["format"]), io, s, samples)
+
+
+def bench_stream(inst, s, seconds=STREAM_SECONDS, buffer_size=STREAM_BUFFER):
+    """Doble buffer durante 'seconds': lecturas por segundo, huecos y tiempo de descarga"""
+    io = TimedIO(inst)
+    device = Keithley6514(VisaTransport(io), s["elements"], s["format"])
+    streamer = device.streamer(buffer_size, ACQ_TIMEOUT)
+    config = (setup_commands(device, s) + streamer.commands() + ["TRIG:SOUR IMM", "ARM:SOUR IMM"]
+              + format_commands(s["format"]))
+    _, config_time = timed(device.configure, config)
+
+    samples = 0
+    blocks = streamer.blocks()
+    t0 = time.perf_counter()
+    try:
+        for block in blocks:
+            samples += len(block)
+            if time.perf_counter() - t0 >= seconds:
+                break
+    finally:
+        blocks.close()
+    elapsed = time.perf_counter() - t0
+
+    missing = sum(g["missing"] or 0 for g in streamer.gaps)
+    return {
+        "samples": samples,
+        "config_time": config_time,
+        "duration": elapsed,
+        "blocks": streamer.blocks_read,
+        "download_time": io.io_time,
+        "download_per_block": io.io_time / streamer.blocks_read if streamer.blocks_read else None,
+        "bytes": io.bytes,
+        "gaps": len(streamer.gaps),
+        "missing": missing,
+        "effective_rate": samples / elapsed if elapsed else None,
+    }
+
+
+def bench_trigger(inst, s, triggers=TRIGGERS):
+    """Una lectura por trigger de bus (GET): latencia desde assert_trigger hasta tener el valor"""
+    device = Keithley6514(VisaTransport(inst), s["elements"], s["format"])
+    t0 = time.perf_counter()
+    device.start_triggered("BUS", 1, setup_commands(device, s))
+    config_time = time.perf_counter() - t0
+
+    srq_latency = []
+    latency = []
+    t_start = time.perf_counter()
+    try:
+        for i in range(triggers):
+            latency.append(device.read_triggered(ACQ_TIMEOUT)[2])
+            srq_latency.append(device.srq_latency)
+    finally:
+        device.stop_triggered()
+    elapsed = time.perf_counter() - t_start
+
+    return {
+        "samples": len(latency),
+        "config_time": config_time,
+        "duration": elapsed,
+        "effective_rate": len(latency) / elapsed if elapsed else None,
+        "srq_latency_ms": percentiles(srq_latency),
+        "latency_ms": percentiles(latency),
+    }
+
+
+def git_revision():
+    """Commit actual del repositorio, para saber qué versión se ha medido"""
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), timeout=5)
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run(modes=MODES, cases=CASES):
+    """Ejecuta todos los modos y casos y devuelve el informe completo"""
+    report = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "host": platform.node(),
+        "python": platform.python_version(),
+        "simulate": simulate,
+        "results": [],
+    }
+
+    gpib_modes = [m for m in modes if m != "serial"]
+    if gpib_modes:
+        rm = SimulatedResourceManager() if simulate else pyvisa.ResourceManager()
+        inst = rm.open_resource(GPIB_ADDRESS)
+        inst.timeout = 10000
+        inst.read_termination = '\n'
+        report["idn"] = inst.query("*IDN?").strip()
+        bench = {"block": bench_block, "stream": bench_stream, "trigger": bench_trigger}
+        try:
+            for mode in gpib_modes:
+                for case in cases:
+                    report["results"].append(_run_case(mode, case, bench[mode], inst))
+        finally:
+            inst.close()
+
+    if "serial" in modes:
+        sim = SerialSimulator(baudrate=BAUDRATE) if simulate else None
+        port = sim.port if simulate else SERIAL_PORT
+        try:
+            with serial.Serial(port=port, baudrate=BAUDRATE, parity=serial.PARITY_EVEN,
+                               bytesize=serial.EIGHTBITS, stopbits=serial.STOPBITS_ONE, timeout=2) as ser:
+                for case in cases:
+                    result = _run_case("serial", case, bench_serial, ser)
+                    result["baudrate"] = BAUDRATE
+                    report["results"].append(result)
+        finally:
+            if sim is not None:
+                sim.close()
+
+    return report
+
+
+def _run_case(mode, case, bench, inst):
+    s = dict(BASE_SETTINGS)
+    s.update({k: v for k, v in case.items() if k != "name"})
+    print(f"[{mode}] {case['name']}...")
+    result = {"mode": mode, "case": case["name"], "settings": s}
+    try:
+        result.update(bench(inst, s))
+    except Exception as e:
+        # Un caso fallido no invalida el resto de la tanda
+        result["error"] = f"{type(e).__name__}: {e}"
+    return result
+
+
+def summary(report):
+    """Tabla corta por pantalla; el detalle completo va al JSON"""
+    for r in report["results"]:
+        if "error" in r:
+            print(f"{r['mode']:8} {r['case']:10} ERROR {r['error']}")
+            continue
+        line = f"{r['mode']:8} {r['case']:10} {r['effective_rate']:10.1f} lect/s"
+        if "instrument_rate" in r:
+            line += f"  instrumento {r['instrument_rate']:9.1f} lect/s  descarga {r['download_time']:.3f} s"
+            line += f"  parseo {r['parse_time']:.4f} s"
+        if "gaps" in r:
+            line += f"  huecos {r['gaps']}"
+        if "latency_ms" in r:
+            line += f"  latencia p50 {r['latency_ms']['p50']:.2f} ms  p99 {r['latency_ms']['p99']:.2f} ms"
+        print(line)
+
+
+if __name__ == "__main__":
+    report = run()
+    summary(report)
+    with open(RESULTS_FILE, "a") as f:
+        f.write(json.dumps(report) + "\n")
+    print("Resultados añadidos a", RESULTS_FILE)
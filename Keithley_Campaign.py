@@ -0,0 +1,172 @@
+import hashlib
+import json
+import os
+import time
+from Keithley_Data import decode_readings
+from Keithley_Storage import save
+from Keithley_Session import Session
+
+# Capturas de la campaña: perfil (claves de Keithley6514.measure_commands),
+# lecturas por captura y repeticiones; "name" es opcional y con "group": False
+# la captura se hace en su sitio de la lista, sin agruparla con otras
+CAMPAIGN = [
+    {"measure": "current", "measure_range": "200E-6", "nplc": 0.01, "samples": 2500, "repetitions": 3},
+    {"measure": "charge", "measure_range": "200E-9", "nplc": 0.01, "samples": 2500, "repetitions": 2},
+    {"measure": "current", "measure_range": "2E-6", "nplc": 0.1, "samples": 500, "repetitions": 2},
+    {"measure": "current", "measure_range": "200E-6", "nplc": 0.01, "samples": 2500, "repetitions": 2,
+     "name": "current_final", "group": False},
+]
+
+GPIB_ADDRESS = "GPIB0::14::INSTR"
+
+# Con simulate = True se usa el 6514 simulado (Keithley_Sim) en lugar del instrumento real
+simulate = False
+
+# Un fichero por captura en OUTPUT_DIR y el registro de la campaña (una línea JSON por captura)
+OUTPUT_DIR = "campaign"
+LOG_FILE = "campaign.jsonl"
+
+# Claves de una captura que no forman parte del perfil de medida
+CAPTURE_KEYS = ("samples", "repetitions", "name", "group")
+
+
+def spec_profile(spec):
+    return {k: v for k, v in spec.items() if k not in CAPTURE_KEYS}
+
+
+def spec_name(spec):
+    """Nombre de las capturas de spec: el suyo o uno sacado del perfil y el tamaño
+
+    No depende de la posición en la lista, así añadir o mover capturas no
+    cambia los ids de las que ya están en el registro.
+    """
+    if spec.get("name"):
+        return spec["name"]
+    profile = spec_profile(spec)
+    digest = hashlib.sha1(json.dumps([profile, spec["samples"]], sort_keys=True).encode()).hexdigest()[:8]
+    return f"{profile['measure']}_{digest}"
+
+
+def plan(specs):
+    """Lista de capturas a hacer, agrupadas para reconfigurar lo menos posible
+
+    Las capturas con el mismo perfil y tamaño se hacen seguidas, en el orden
+    en que aparece cada grupo por primera vez. Una captura con "group": False
+    se hace en su sitio: no se agrupa y las de antes y después no se agrupan
+    por encima de ella. Cada captura tiene un id estable
+    ("<nombre>_<repetición>") que se usa para reanudar; si dos capturas sin
+    nombre tienen el mismo perfil, la numeración de repeticiones sigue.
+    """
+    captures = []
+    groups = {}
+    reps = {}
+    for spec in specs:
+        profile = spec_profile(spec)
+        name = spec_name(spec)
+        batch = []
+        for _ in range(spec.get("repetitions", 1)):
+            rep = reps.get(name, 0)
+            reps[name] = rep + 1
+            batch.append({"id": f"{name}_{rep:03d}", "profile": profile,
+                          "samples": spec["samples"], "repetition": rep})
+
+        if spec.get("group", True):
+            key = (json.dumps(profile, sort_keys=True), spec["samples"])
+            groups.setdefault(key, []).extend(batch)
+        else:
+            # Las agrupadas hasta aquí van antes y se empieza a agrupar de nuevo después
+            captures += [c for group in groups.values() for c in group] + batch
+            groups = {}
+    captures += [c for group in groups.values() for c in group]
+    ids = [c["id"] for c in captures]
+    if len(set(ids)) != len(ids):
+        raise Exception("Error hay capturas con el mismo nombre en la campaña")
+    return captures
+
+
+class Campaign:
+    """Serie de capturas en buffer con armado solapado y registro reanudable
+
+    Nada más descargar una captura se arma la siguiente, y la conversión y
+    el guardado de la anterior se hacen mientras el 6514 llena el buffer. Cada
+    captura terminada se añade al registro JSONL con sus tiempos; al volver a
+    lanzar la campaña se saltan las que ya están en el registro y en disco.
+    """
+
+    def __init__(self, session, specs, output_dir=OUTPUT_DIR, log_path=LOG_FILE, timeout=60.0):
+        self.session = session
+        self.captures = plan(specs)
+        self.output_dir = output_dir
+        self.log_path = log_path
+        self.timeout = timeout
+
+    def completed(self):
+        """ids de las capturas ya hechas según el registro (y con su fichero en disco)"""
+        done = set()
+        if not os.path.exists(self.log_path):
+            return done
+        with open(self.log_path) as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue   # línea a medias si se cortó al escribir
+                if os.path.exists(record["file"]):
+                    done.add(record["id"])
+        return done
+
+    def _arm(self, capture):
+        t0 = time.perf_counter()
+        self.session.arm(capture["samples"], capture["profile"])
+        capture["armed_at"] = time.perf_counter()
+        capture["arm"] = capture["armed_at"] - t0
+
+    def _store(self, capture, values, log):
+        t0 = time.perf_counter()
+        elements = self.session.keithley.elements
+        data = decode_readings(values, elements)
+        path = os.path.join(self.output_dir, capture["id"] + ".npy")
+        metadata = dict(capture["profile"], id=capture["id"], samples=capture["samples"],
+                        repetition=capture["repetition"], elements=elements, resource=self.session.resource)
+        save(path, data, metadata)
+        store = time.perf_counter() - t0
+
+        record = {"id": capture["id"], "file": path, **capture["profile"], "samples": capture["samples"],
+                  "repetition": capture["repetition"], "finished": time.time(), "arm": capture["arm"],
+                  "collect": capture["collect"], "store": store, "meas_status": capture["meas_status"]}
+        log.write(json.dumps(record) + "\n")
+        log.flush()
+        return record
+
+    def run(self):
+        """Hace las capturas pendientes y devuelve los registros de esta ejecución"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        done = self.completed()
+        pending = [c for c in self.captures if c["id"] not in done]
+        if done:
+            print(f"Reanudando: {len(done)} capturas ya hechas, quedan {len(pending)}")
+
+        records = []
+        with open(self.log_path, "a") as log:
+            if pending:
+                self._arm(pending[0])
+            for i, capture in enumerate(pending):
+                values = self.session.collect(self.timeout)
+                capture["collect"] = time.perf_counter() - capture["armed_at"]
+                capture["meas_status"] = self.session.keithley.meas_status
+
+                # El 6514 empieza la siguiente mientras aquí se convierte y guarda esta
+                if i + 1 < len(pending):
+                    self._arm(pending[i + 1])
+                records.append(self._store(capture, values, log))
+        return records
+
+
+if __name__ == "__main__":
+    with Session(GPIB_ADDRESS, simulate) as session:
+        campaign = Campaign(session, CAMPAIGN)
+        t0 = time.perf_counter()
+        for record in campaign.run():
+            print(f"{record['id']}: armado {1000 * record['arm']:.1f} ms, captura {record['collect']:.2f} s, "
+                  f"guardado {1000 * record['store']:.1f} ms")
+        print(f"Campaña en {time.perf_counter() - t0:.1f} s")
@@ -0,0 +1,157 @@
+import json
+import time
+import numpy as np
+
+# Formato del fichero de captura:
+#   [0:8]    magic b"K6514CAP"
+#   [8:12]   versión (uint32)
+#   [12:16]  tamaño de registro en bytes (uint32)
+#   [16:24]  número de registros confirmados (uint64), se actualiza en cada commit
+#   [24:28]  longitud del JSON (uint32), seguido del JSON con dtype y metadatos
+#   [HEADER_SIZE:]  registros de tamaño fijo, uno por lectura
+MAGIC = b"K6514CAP"
+VERSION = 1
+HEADER_SIZE = 4096
+COUNT_OFFSET = 16
+
+# Registro por lectura: lectura, timestamp y palabra de estado
+RECORD_DTYPE = np.dtype([("reading", "<f8"), ("timestamp", "<f8"), ("status", "<u4")])
+
+# El fichero crece de GROW_ROWS en GROW_ROWS registros para no redimensionar en cada bloque
+GROW_ROWS = 1 << 20
+
+# Cada cuánto se confirma el número de registros en la cabecera
+COMMIT_INTERVAL = 1.0  # segundos
+
+# Registros por trozo al recorrer una captura con CaptureReader.blocks()
+BLOCK_ROWS = 1 << 20
+
+
+def _read_header(f):
+    """Lee la cabecera y devuelve (dtype, metadatos, registros confirmados)"""
+    f.seek(0)
+    header = f.read(HEADER_SIZE)
+    if header[:8] != MAGIC:
+        raise ValueError("No es un fichero de captura del Keithley 6514")
+    count = int(np.frombuffer(header, "<u8", 1, COUNT_OFFSET)[0])
+    length = int(np.frombuffer(header, "<u4", 1, 24)[0])
+    info = json.loads(header[28:28 + length].decode())
+    dtype = np.dtype([tuple(field) for field in info["dtype"]])
+    return dtype, info["metadata"], count
+
+
+class CaptureWriter:
+    """Fichero de captura de solo-añadir respaldado por un memmap que crece
+
+    Los registros tienen el dtype indicado (RECORD_DTYPE por defecto), que se
+    guarda en la cabecera; de cada bloque se copian los campos de ese dtype.
+    """
+
+    def __init__(self, path, dtype=RECORD_DTYPE, metadata=None, commit_interval=COMMIT_INTERVAL):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        if self.dtype.names is None:
+            raise ValueError("El fichero de captura necesita un dtype con campos: %s" % self.dtype)
+        self.count = 0
+        self.capacity = 0
+        self.records = None
+        self.commit_interval = commit_interval
+        self.last_commit = time.perf_counter()
+
+        info = json.dumps({"dtype": self.dtype.descr, "metadata": metadata or {}}).encode()
+        if 28 + len(info) > HEADER_SIZE:
+            raise ValueError("Metadatos demasiado largos para la cabecera")
+
+        header = bytearray(HEADER_SIZE)
+        header[0:8] = MAGIC
+        header[8:12] = np.uint32(VERSION).tobytes()
+        header[12:16] = np.uint32(self.dtype.itemsize).tobytes()
+        header[24:28] = np.uint32(len(info)).tobytes()
+        header[28:28 + len(info)] = info
+
+        self.file = open(path, "w+b")
+        self.file.write(header)
+        self.file.flush()
+        self._grow(GROW_ROWS)
+
+    def _grow(self, rows):
+        """Amplía el fichero y vuelve a mapear la zona de registros"""
+        # Se suelta el mapa antes de redimensionar (en Windows no se puede con el mapa abierto)
+        if self.records is not None:
+            self.records.flush()
+            self.records = None
+        self.capacity += rows
+        self.file.truncate(HEADER_SIZE + self.capacity * self.dtype.itemsize)
+        self.records = np.memmap(self.file, dtype=self.dtype, mode="r+", offset=HEADER_SIZE, shape=(self.capacity,))
+
+    def append(self, block):
+        """Añade un bloque (array estructurado o filas lectura, timestamp, estado)"""
+        n = len(block)
+        if self.count + n > self.capacity:
+            self._grow(max(GROW_ROWS, n))
+
+        out = self.records[self.count:self.count + n]
+        if block.dtype.names:
+            for name in self.dtype.names:
+                out[name] = block[name]
+        else:
+            for i, name in enumerate(self.dtype.names):
+                out[name] = block[:, i]
+        self.count += n
+
+        if time.perf_counter() - self.last_commit >= self.commit_interval:
+            self.commit()
+
+    write = append
+
+    def commit(self):
+        """Vuelca los registros a disco y después publica el nuevo número en la cabecera"""
+        self.records.flush()
+        self.file.seek(COUNT_OFFSET)
+        self.file.write(np.uint64(self.count).tobytes())
+        self.file.flush()
+        self.last_commit = time.perf_counter()
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.commit()
+        self.records = None
+        self.file.truncate(HEADER_SIZE + self.count * self.dtype.itemsize)
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class CaptureReader:
+    """Lectura de un fichero de captura, también mientras se sigue escribiendo"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.dtype, self.metadata, _ = _read_header(f)
+        self.count = 0
+        self.data = np.empty(0, dtype=self.dtype)
+        self.refresh()
+
+    def refresh(self):
+        """Vuelve a leer el número confirmado y devuelve los registros nuevos"""
+        with open(self.path, "rb") as f:
+            count = _read_header(f)[2]
+        old = self.count
+        if count > self.count:
+            self.count = count
+            self.data = np.memmap(self.path, dtype=self.dtype, mode="r", offset=HEADER_SIZE, shape=(count,))
+        return self.data[old:]
+
+    def blocks(self, rows=BLOCK_ROWS):
+        """Recorre los registros confirmados por trozos (vistas del memmap, sin cargarlo entero)"""
+        for start in range(0, self.count, rows):
+            yield self.data[start:start + rows]
+
+    def __len__(self):
+        return self.count
@@ -0,0 +1,158 @@
+# Longitud máxima de cada mensaje de programa enviado al 6514
+MAX_MESSAGE_LEN = 200
+
+# Tope de errores a vaciar de la cola SYST:ERR? (evita bucles si no responde bien)
+MAX_ERRORS = 32
+
+# Comandos que devuelven el instrumento a un estado desconocido para la caché
+RESET_COMMANDS = ("*RST", "SYST:PRES", "CONF")
+
+# Ajustes automáticos y el ajuste manual que controlan (sufijos de la cabecera):
+# con <F>:RANG:AUTO ON el 6514 cambia el rango por su cuenta, así que el valor
+# de <F>:RANG en caché deja de valer; y fijar <F>:RANG desactiva el autorango
+AUTO_SETTINGS = [(":RANG:AUTO", ":RANG")]
+
+
+class InstrumentError(Exception):
+    """Error reportado por la cola SYST:ERR? del instrumento"""
+
+
+def join_commands(commands, max_len=MAX_MESSAGE_LEN):
+    """Agrupa comandos SCPI en pocos mensajes separados por ';'"""
+    messages = []
+    current = ""
+    for cmd in commands:
+        cmd = cmd.strip()
+        # Con ':' delante cada comando vuelve a la raíz, si no se interpretaría
+        # relativo a la ruta del comando anterior del mismo mensaje
+        if not cmd.startswith(("*", ":")):
+            cmd = ":" + cmd
+
+        if current and len(current) + 1 + len(cmd) > max_len:
+            messages.append(current)
+            current = ""
+        current = current + ";" + cmd if current else cmd
+
+    if current:
+        messages.append(current)
+    return messages
+
+
+def read_errors(query):
+    """Vacía la cola SYST:ERR? y devuelve la lista de errores"""
+    errors = []
+    while len(errors) < MAX_ERRORS:
+        err = query("SYST:ERR?").strip()
+        if int(err.split(',')[0]) == 0:
+            break
+        errors.append(err)
+    return errors
+
+
+def configure(write, query, commands):
+    """Envía la configuración en bloque y comprueba *OPC? y SYST:ERR? una sola vez"""
+    for msg in join_commands(commands):
+        write(msg)
+
+    # *OPC? no responde hasta que se han ejecutado todos los comandos anteriores
+    if query("*OPC?").strip() != "1":
+        raise InstrumentError("El instrumento no ha confirmado *OPC?")
+
+    errors = read_errors(query)
+    if errors:
+        raise InstrumentError("Errores de configuración: " + "; ".join(errors))
+
+
+def command_key(cmd):
+    """(cabecera, valor) normalizados de un comando de ajuste; valor None si es una acción
+
+    La cabecera va en mayúsculas, sin ':' inicial ni el 'SENS:' opcional; los
+    valores numéricos se comparan como número y el resto sin comillas.
+    """
+    parts = cmd.strip().split(None, 1)
+    header = parts[0].upper().lstrip(":")
+    for prefix in ("SENSE:", "SENS:"):
+        if header.startswith(prefix):
+            header = header[len(prefix):]
+    if len(parts) == 1 or header.endswith("?"):
+        return header, None
+    value = parts[1].strip().strip('"\'').upper()
+    try:
+        value = float(value)
+    except ValueError:
+        pass
+    return header, value
+
+
+class Configurator:
+    """Configuración con caché del último estado aplicado a un instrumento
+
+    Recuerda el valor de cada ajuste enviado; con diff=True solo se envían
+    los que cambian, así pasar de un perfil a otro son unos pocos comandos y
+    sin *RST. Las acciones (INIT, *CLS, comandos con ';'...) se envían siempre
+    y las de RESET_COMMANDS vacían la caché. Si la configuración falla la
+    caché también se vacía, porque no se sabe qué parte se llegó a aplicar.
+    """
+
+    def __init__(self, write, query):
+        self.write = write
+        self.query = query
+        self.state = {}
+        self.sent = 0
+        self.skipped = 0
+
+    def clear(self):
+        """Olvida el estado (tras un device clear, un reset externo...)"""
+        self.state = {}
+
+    @staticmethod
+    def _track(state, cmd):
+        """Aplica cmd sobre 'state'; devuelve False si no cambia nada"""
+        if ";" in cmd:
+            return True
+        header, value = command_key(cmd)
+        if value is None:
+            if header.startswith(RESET_COMMANDS):
+                state.clear()
+            return True
+        if state.get(header) == value:
+            return False
+        state[header] = value
+        Configurator._side_effects(state, header, value)
+        return True
+
+    @staticmethod
+    def _side_effects(state, header, value):
+        """Actualiza en 'state' los ajustes que el instrumento cambia por su cuenta al recibir header"""
+        for auto, manual in AUTO_SETTINGS:
+            if header.endswith(auto):
+                if value in ("ON", 1.0):
+                    state.pop(header[:-len(auto)] + manual, None)
+            elif header.endswith(manual):
+                state[header[:-len(manual)] + auto] = "OFF"
+
+    def diff(self, commands):
+        """Comandos de 'commands' que cambian algo respecto a la caché"""
+        state = dict(self.state)
+        return [cmd for cmd in commands if self._track(state, cmd)]
+
+    def apply(self, commands, diff=True):
+        """Envía la configuración (solo lo que cambia si diff) y actualiza la caché
+
+        Devuelve los comandos enviados; si no hay ninguno no se toca el bus.
+        """
+        commands = list(commands)
+        send = self.diff(commands) if diff else commands
+        self.skipped += len(commands) - len(send)
+        if not send:
+            return send
+        try:
+            configure(self.write, self.query, send)
+        except Exception:
+            self.clear()
+            raise
+
+        for cmd in send:
+            self._track(self.state, cmd)
+        self.sent += len(send)
+        return send
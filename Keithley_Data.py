@@ -0,0 +1,248 @@
+import re
+import numpy as np
+
+# Formatos de transferencia del buffer (TRAC:DATA?)
+# FORM:BORD SWAP hace que el 6514 envíe primero el byte menos significativo
+# (little endian), que es el orden nativo del PC y evita tener que girar los bytes.
+DATA_FORMATS = {
+    "ascii": ("FORM:DATA ASC", None),
+    "sreal": ("FORM:DATA SRE", "<f4"),    # IEEE754 32 bits, 4 bytes por valor
+    "dreal": ("FORM:DATA DRE", "<f8"),    # IEEE754 64 bits, 8 bytes por valor
+}
+
+# Ancho de un campo ASCII del 6514 ('+1.234567E-06') y unidades que puede llevar
+# pegadas al final (FORM:ELEM ...,UNIT), p. ej. 'NADC', 'SECS'
+FIXED_FIELD = 13
+UNIT_SUFFIX = re.compile(rb"[A-Za-z#]+(?=,|\s*$)")
+
+# Columna de salida de cada elemento de FORM:ELEM, en el orden en que los envía el 6514
+ELEMENT_FIELDS = {"READ": "reading", "TIME": "timestamp", "STAT": "status"}
+
+# Bits de la palabra de estado (elemento STAT) que se decodifican en columnas booleanas
+STATUS_BITS = {
+    "overflow": 0,      # lectura fuera de rango (OFLO)
+    "filter": 1,        # filtro digital activo
+    "math": 2,          # cálculo mX+b activo
+    "null": 3,          # REL/null activo
+    "limits": 4,        # test de límites activo
+    "limit1_fail": 5,   # fallo del límite 1
+    "limit2_fail": 6,   # fallo del límite 2
+}
+
+
+class TransferError(ValueError):
+    """Respuesta de datos corrupta o cortada en la transferencia (cabecera, campos)"""
+
+
+def format_commands(fmt):
+    """Devuelve los comandos SCPI que seleccionan el formato de datos"""
+    if fmt not in DATA_FORMATS:
+        raise Exception("Error invalid data format: " + str(fmt))
+    cmd, dtype = DATA_FORMATS[fmt]
+    if dtype is None:
+        return [cmd]
+    return [cmd, "FORM:BORD SWAP"]
+
+
+def _parse_fixed(data):
+    """Campos de ancho fijo '+D.DDDDDDE+DD' (13 caracteres) convertidos con aritmética de numpy
+
+    Es el formato en que el 6514 envía las lecturas; devuelve None si data
+    no sigue exactamente ese formato para usar el camino general.
+    """
+    width = FIXED_FIELD + 1
+    if len(data) % width != FIXED_FIELD:
+        return None
+    a = np.frombuffer(data + b",", dtype=np.uint8).reshape(-1, width)
+    if not (np.all(a[:, 2] == 46) and np.all(a[:, 9] == 69) and np.all(a[:, FIXED_FIELD] == 44)):
+        return None
+    signs = a[:, [0, 10]]
+    digits = a[:, [1, 3, 4, 5, 6, 7, 8, 11, 12]].astype(np.int64) - 48
+    if np.any((signs != 43) & (signs != 45)) or np.any((digits < 0) | (digits > 9)):
+        return None
+
+    mantissa = digits[:, :7] @ (10 ** np.arange(6, -1, -1, dtype=np.int64))
+    power = np.where(signs[:, 1] == 45, -1, 1) * (digits[:, 7] * 10 + digits[:, 8]) - 6
+    # Entero exacto por/entre potencia de 10 exacta (hasta 1e22): mismo redondeo que float()
+    scale = 10.0 ** np.minimum(np.abs(power), 22)
+    values = np.where(power >= 0, mantissa * scale, mantissa / scale)
+    values = np.where(signs[:, 0] == 45, -values, values)
+
+    # Los campos con exponentes más allá (p. ej. el overflow 9.9E37) los convierte numpy como texto
+    big = np.abs(power) > 22
+    if big.any():
+        values[big] = np.ascontiguousarray(a[big, :FIXED_FIELD]).view("S%d" % FIXED_FIELD).ravel().astype(float)
+    return values
+
+
+def parse_fields(data):
+    """Convierte campos ASCII separados por comas (bytes) en un array
+
+    Convierte sin crear un objeto por campo: el formato fijo del 6514 con
+    numpy y, si no, np.fromstring tras quitar las unidades pegadas a los
+    valores (FORM:ELEM ...,UNIT).
+    """
+    data = data.strip()
+    if not data:
+        return np.empty(0)
+    values = _parse_fixed(data)
+    if values is not None:
+        return values
+    data = UNIT_SUFFIX.sub(b"", data)
+    try:
+        values = np.fromstring(data.decode("ascii"), sep=",")
+    except ValueError:
+        values = None
+    if values is None or len(values) != data.count(b",") + 1:
+        raise TransferError("Respuesta ASCII con campos no numéricos: %r" % data[:60])
+    return values
+
+
+class AsciiParser:
+    """Conversión incremental de una respuesta ASCII (TRAC:DATA?, FETC?) a un array preasignado
+
+    feed() admite los bytes en trozos según llegan: se convierten todos los
+    campos completos y el último, que puede venir cortado, se guarda para el
+    trozo siguiente. Con count se reserva el array de una vez; sin count crece.
+    """
+
+    def __init__(self, count=None, term=b"\n"):
+        self.fixed = count is not None
+        self.data = np.empty(count if self.fixed else 1024)
+        self.count = 0
+        self.term = term
+        self.rest = b""
+        self.done = False
+        self.truncated = None
+
+    def _append(self, values):
+        n = self.count + len(values)
+        if n > len(self.data):
+            if self.fixed:
+                raise TransferError("Respuesta ASCII con más valores de los esperados (%d > %d)" % (n, len(self.data)))
+            self.data = np.resize(self.data, max(n, 2 * len(self.data)))
+        self.data[self.count:n] = values
+        self.count = n
+
+    def feed(self, chunk):
+        """Añade un trozo de la respuesta; devuelve True cuando llega el terminador"""
+        data = self.rest + chunk
+        end = data.find(self.term)
+        if end >= 0:
+            complete, self.rest = data[:end], b""
+            self.done = True
+        else:
+            cut = data.rfind(b",")
+            if cut < 0:
+                self.rest = data
+                return False
+            complete, self.rest = data[:cut], data[cut + 1:]
+        self._append(parse_fields(complete))
+        return self.done
+
+    def finish(self):
+        """Cierra una respuesta sin terminador (timeout); el último campo, quizá cortado, se descarta"""
+        if self.rest.strip():
+            self.truncated = self.rest
+        self.rest = b""
+        self.done = True
+        return self.values()
+
+    def values(self):
+        return self.data[:self.count]
+
+
+def read_ascii(read_chunk, count=None, term=b"\n"):
+    """Lee y convierte una respuesta ASCII trozo a trozo; read_chunk() devuelve b"" en timeout
+
+    Si la respuesta se corta, el TimeoutError lleva en .values lo convertido
+    hasta el último campo completo.
+    """
+    parser = AsciiParser(count, term)
+    while not parser.done:
+        chunk = read_chunk()
+        if not chunk:
+            values = parser.finish()
+            error = TimeoutError("Timeout en la respuesta ASCII (%d valores recibidos)" % len(values))
+            error.values = values
+            raise error
+        parser.feed(chunk)
+    return parser.values()
+
+
+def read_block(read_bytes, read_term, count, fmt):
+    """Lee un bloque binario IEEE-488.2 (#0 o #n<len>) y lo convierte en array"""
+    dtype = np.dtype(DATA_FORMATS[fmt][1])
+
+    header = read_bytes(2)
+    if header[:1] != b"#" or not header[1:2].isdigit():
+        raise TransferError("Cabecera de bloque inesperada: %r" % header)
+
+    # El 6514 usa la cabecera indefinida #0, la longitud sale del número de valores
+    ndigits = int(header[1:2])
+    if ndigits:
+        length = int(read_bytes(ndigits))
+    else:
+        length = count * dtype.itemsize
+
+    payload = read_bytes(length)
+
+    # Consumimos el terminador para dejar limpio el canal
+    read_term()
+
+    return np.frombuffer(payload, dtype=dtype).astype(float)
+
+
+def read_exact(ser, n):
+    """Lee exactamente n bytes del puerto serie sin esperar al timeout final"""
+    data = bytearray()
+    while len(data) < n:
+        chunk = ser.read(n - len(data))
+        if not chunk:
+            raise TimeoutError("Timeout leyendo del puerto serie (%d de %d bytes)" % (len(data), n))
+        data += chunk
+    return bytes(data)
+
+
+def read_line(ser, term=b"\n"):
+    """Lee del puerto serie hasta el terminador aunque tarde más que el timeout"""
+    data = bytearray()
+    while not data.endswith(term):
+        chunk = ser.read_until(term)
+        if not chunk:
+            raise TimeoutError("Timeout leyendo del puerto serie (%d bytes sin terminador)" % len(data))
+        data += chunk
+    return bytes(data)
+
+
+def parse_elements(elements):
+    """Lista de elementos de FORM:ELEM en el orden en que llegan en cada lectura"""
+    selected = {e.strip().upper()[:4] for e in elements.split(',')}
+    # UNIT no es un valor aparte (en ASCII va pegado a la lectura)
+    return [e for e in ELEMENT_FIELDS if e in selected]
+
+
+def decode_readings(values, elements="READ,TIME,STAT"):
+    """Convierte los valores intercalados en un array estructurado, una fila por lectura"""
+    names = parse_elements(elements)
+    values = np.asarray(values, dtype=float).ravel()
+    n = len(names)
+    if n == 0:
+        raise Exception("Error FORM:ELEM sin elementos conocidos: %r" % elements)
+    if len(values) % n:
+        raise Exception("Error %d valores no son lecturas completas de %d elementos (%s)" % (len(values), n, elements))
+    rows = values.reshape(-1, n)
+
+    dtype = [(ELEMENT_FIELDS[e], "u4" if e == "STAT" else "f8") for e in names]
+    if "STAT" in names:
+        dtype += [(name, "?") for name in STATUS_BITS]
+
+    data = np.empty(len(rows), dtype=dtype)
+    for i, e in enumerate(names):
+        data[ELEMENT_FIELDS[e]] = rows[:, i]
+
+    if "STAT" in names:
+        status = data["status"]
+        for name, bit in STATUS_BITS.items():
+            data[name] = (status >> bit) & 1
+    return data
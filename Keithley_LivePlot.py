@@ -0,0 +1,147 @@
+import time
+import numpy as np
+import matplotlib.pyplot as plt
+
+# Máximo de intervalos min/max que se dibujan; el historial se va comprimiendo
+# para no pasar de aquí aunque la adquisición dure horas
+MAX_BINS = 2000
+
+# Fotogramas por segundo como máximo
+FPS = 20
+
+# Margen al ampliar los ejes, para no redibujar el fondo en cada bloque
+AXIS_MARGIN = 0.1
+
+
+class EnvelopeHistory:
+    """Historial decimado en intervalos de min/max
+
+    Cada intervalo agrupa 'per_bin' lecturas consecutivas. Cuando hay más de
+    max_bins intervalos se fusionan de dos en dos y per_bin se duplica, así la
+    memoria y el coste de dibujar son fijos y los picos no se pierden.
+    """
+
+    def __init__(self, max_bins=MAX_BINS):
+        self.max_bins = max_bins
+        self.per_bin = 1
+        self.t = np.empty(0)
+        self.lo = np.empty(0)
+        self.hi = np.empty(0)
+        self.pending_t = np.empty(0)
+        self.pending_v = np.empty(0)
+        self.samples = 0
+
+    def add(self, t, v):
+        """Añade lecturas (timestamps y valores)"""
+        t = np.concatenate((self.pending_t, np.asarray(t, dtype=float)))
+        v = np.concatenate((self.pending_v, np.asarray(v, dtype=float)))
+        self.samples += len(t) - len(self.pending_t)
+
+        full = len(t) // self.per_bin * self.per_bin
+        if full:
+            vb = v[:full].reshape(-1, self.per_bin)
+            self.t = np.concatenate((self.t, t[:full:self.per_bin]))
+            self.lo = np.concatenate((self.lo, vb.min(axis=1)))
+            self.hi = np.concatenate((self.hi, vb.max(axis=1)))
+        self.pending_t = t[full:]
+        self.pending_v = v[full:]
+
+        while len(self.t) > self.max_bins:
+            self._halve()
+
+    def _halve(self):
+        n = len(self.t) // 2 * 2
+        tail = slice(n, None)
+        self.t = np.concatenate((self.t[:n:2], self.t[tail]))
+        self.lo = np.concatenate((self.lo[:n].reshape(-1, 2).min(axis=1), self.lo[tail]))
+        self.hi = np.concatenate((self.hi[:n].reshape(-1, 2).max(axis=1), self.hi[tail]))
+        self.per_bin *= 2
+
+    def xy(self):
+        """Puntos de la línea en zigzag min/max de cada intervalo, más las lecturas sin agrupar"""
+        x = np.concatenate((np.repeat(self.t, 2), self.pending_t))
+        y = np.concatenate((np.column_stack((self.lo, self.hi)).ravel(), self.pending_v))
+        return x, y
+
+
+class LivePlot:
+    """Gráfica en vivo de un lector (con pérdidas) de Keithley_Pipeline
+
+    Se ejecuta en el hilo principal (el de la GUI). El lector con pérdidas
+    nunca frena al hilo de adquisición: si el dibujo se retrasa, el lector
+    se salta datos y lo cuenta en reader.overflows. Solo se redibuja la línea
+    (blitting) salvo cuando hay que ampliar los ejes.
+    """
+
+    def __init__(self, reader, value_column=0, time_column=1, fps=FPS, max_bins=MAX_BINS,
+                 xlabel="Time (s)", ylabel="Current (A)"):
+        self.reader = reader
+        self.value_column = value_column
+        self.time_column = time_column
+        self.interval = 1.0 / fps
+        self.history = EnvelopeHistory(max_bins)
+
+        self.fig, self.ax = plt.subplots()
+        self.ax.set_xlabel(xlabel)
+        self.ax.set_ylabel(ylabel)
+        (self.line,) = self.ax.plot([], [], lw=0.8, animated=True)
+        self.text = self.ax.text(0.01, 0.99, "", transform=self.ax.transAxes, va="top", animated=True)
+        self.background = None
+        self.frames = 0
+        self.full_redraws = 0
+
+    def _limits_ok(self, x, y):
+        x0, x1 = self.ax.get_xlim()
+        y0, y1 = self.ax.get_ylim()
+        return x.min() >= x0 and x.max() <= x1 and y.min() >= y0 and y.max() <= y1
+
+    def _rescale(self, x, y):
+        xr = max(x.max() - x.min(), 1e-9)
+        yr = max(y.max() - y.min(), abs(y.max()) * 1e-3, 1e-15)
+        self.ax.set_xlim(x.min(), x.max() + xr * AXIS_MARGIN * 2)
+        self.ax.set_ylim(y.min() - yr * AXIS_MARGIN, y.max() + yr * AXIS_MARGIN)
+
+    def _redraw_background(self):
+        canvas = self.fig.canvas
+        canvas.draw()
+        self.background = canvas.copy_from_bbox(self.ax.bbox)
+        self.full_redraws += 1
+
+    def update(self):
+        """Lee lo disponible sin esperar y redibuja un fotograma"""
+        block = self.reader.read(timeout=0)
+        if len(block):
+            self.history.add(block[:, self.time_column], block[:, self.value_column])
+
+        x, y = self.history.xy()
+        if len(x) == 0:
+            return
+        self.line.set_data(x, y)
+        self.text.set_text(f"{self.history.samples} lecturas, {self.history.per_bin} por intervalo, "
+                           f"descartadas: {self.reader.overflows}")
+
+        if self.background is None or not self._limits_ok(x, y):
+            self._rescale(x, y)
+            self._redraw_background()
+
+        canvas = self.fig.canvas
+        canvas.restore_region(self.background)
+        self.ax.draw_artist(self.line)
+        self.ax.draw_artist(self.text)
+        canvas.blit(self.ax.bbox)
+        canvas.flush_events()
+        self.frames += 1
+
+    def run(self):
+        """Bucle de dibujo hasta que se cierra la ventana o se acaban los datos"""
+        plt.show(block=False)
+        self.fig.canvas.mpl_connect("resize_event", lambda event: self._redraw_background())
+        while plt.fignum_exists(self.fig.number):
+            t0 = time.perf_counter()
+            self.update()
+            if self.reader.ring.closed and self.reader.pending == 0:
+                break
+            # Se atienden los eventos de la ventana el resto del fotograma
+            remaining = self.interval - (time.perf_counter() - t0)
+            if remaining > 0:
+                self.fig.canvas.start_event_loop(remaining)
@@ -0,0 +1,256 @@
+import threading
+import time
+import numpy as np
+import pyvisa
+from Keithley_Data import format_commands, decode_readings
+from Keithley_Config import join_commands, read_errors, InstrumentError
+from Keithley_Status import SRQ_BIT, POLL_MIN, POLL_MAX
+from Keithley_Storage import save
+from Keithley_6514 import Keithley6514
+from Keithley_Transport import VisaTransport
+from Keithley_Sim import SimulatedResourceManager
+
+# Electrómetros de la maqueta; pueden estar en varias tarjetas (GPIB0, GPIB1...)
+ADDRESSES = ["GPIB0::14::INSTR", "GPIB0::15::INSTR", "GPIB1::14::INSTR"]
+
+# Con simulate = True se usan 6514 simulados (Keithley_Sim) en lugar de los instrumentos reales
+simulate = False
+
+number_of_samples = 2500
+OUTPUT_FILE = "capture_multi.npy"
+
+
+def board_of(address):
+    """Tarjeta GPIB de una dirección: 'GPIB0::14::INSTR' -> 'GPIB0'"""
+    return address.split("::")[0]
+
+
+def field_name(address):
+    """Nombre de columna para una dirección: 'GPIB0::14::INSTR' -> 'GPIB0_14'"""
+    return "_".join(address.split("::")[:2])
+
+
+class MultiSession:
+    """Varios 6514 abiertos desde un único ResourceManager
+
+    Cada tarjeta GPIB es un bus independiente, así que se atiende desde su
+    propio hilo; dentro de un bus el tráfico es secuencial pero se solapa
+    con el trabajo interno de los instrumentos (configuración, medida).
+    """
+
+    def __init__(self, rm, addresses, timeout=5000):
+        self.rm = rm
+        self.instruments = {}
+        self.devices = {}
+        for address in addresses:
+            inst = rm.open_resource(address)
+            inst.timeout = timeout
+            inst.read_termination = '\n'
+            self.instruments[address] = inst
+            # La descarga va por el driver (Keithley6514.fetch), como en el resto de scripts
+            self.devices[address] = Keithley6514(VisaTransport(inst))
+
+        self.boards = {}
+        for address in addresses:
+            self.boards.setdefault(board_of(address), []).append(address)
+
+        # Interfaz de cada tarjeta para el GET de grupo; si no está disponible
+        # se dispara instrumento a instrumento con assert_trigger
+        self.interfaces = {}
+        for board in self.boards:
+            try:
+                self.interfaces[board] = rm.open_resource(board + "::INTFC")
+            except (pyvisa.errors.VisaIOError, ValueError):
+                self.interfaces[board] = None
+
+        self.trigger_times = {}
+        self.timing = {}
+
+    def _per_board(self, fn):
+        """Ejecuta fn(board) en un hilo por tarjeta y relanza el primer error"""
+        errors = []
+
+        def run(board):
+            try:
+                fn(board)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=run, args=(board,), name="keithley-" + board)
+                   for board in self.boards]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        if errors:
+            raise errors[0]
+
+    def configure(self, commands):
+        """Envía la misma configuración a todos y la comprueba al final
+
+        Primero se escribe todo a todos los instrumentos del bus, así cada uno
+        procesa su configuración (el *RST tarda) mientras se envía al siguiente,
+        y solo después se hace *OPC? y SYST:ERR? a cada uno.
+        """
+        messages = join_commands(commands)
+
+        def run(board):
+            for address in self.boards[board]:
+                for msg in messages:
+                    self.instruments[address].write(msg)
+            for address in self.boards[board]:
+                inst = self.instruments[address]
+                if inst.query("*OPC?").strip() != "1":
+                    raise InstrumentError(address + ": el instrumento no ha confirmado *OPC?")
+                errors = read_errors(inst.query)
+                if errors:
+                    raise InstrumentError(address + ": errores de configuración: " + "; ".join(errors))
+
+        t0 = time.perf_counter()
+        self._per_board(run)
+        self.timing["configure"] = time.perf_counter() - t0
+
+    def trigger(self):
+        """Dispara todos los instrumentos armados (ARM:SOUR BUS) con un GET por tarjeta"""
+        self.trigger_times = {}
+        for board, addresses in self.boards.items():
+            intfc = self.interfaces[board]
+            resources = [self.instruments[a] for a in addresses]
+            if intfc is not None:
+                t = time.perf_counter()
+                intfc.group_execute_trigger(*resources)
+                for a in addresses:
+                    self.trigger_times[a] = t
+            else:
+                for a, inst in zip(addresses, resources):
+                    self.trigger_times[a] = time.perf_counter()
+                    inst.assert_trigger()
+
+    def _collect(self, board, count, fmt, timeout):
+        """Descarga cada buffer del bus en cuanto está lleno, el primero que acabe primero"""
+        pending = list(self.boards[board])
+        deadline = time.perf_counter() + timeout
+        delay = POLL_MIN
+        while pending:
+            # El serial poll identifica qué instrumento del bus ha pedido servicio
+            ready = [a for a in pending if self.instruments[a].stb & SRQ_BIT]
+            for address in ready:
+                inst = self.instruments[address]
+                inst.query("STAT:MEAS?")
+                t0 = time.perf_counter()
+                self.values[address] = self.devices[address].fetch(count, "TRAC:DATA?", fmt)
+                self.timing["download"][address] = time.perf_counter() - t0
+                pending.remove(address)
+            if ready:
+                delay = POLL_MIN
+                continue
+            if time.perf_counter() >= deadline:
+                raise TimeoutError("SRQ no recibido en %.1f s de: %s" % (timeout, ", ".join(pending)))
+            time.sleep(min(delay, max(deadline - time.perf_counter(), 0)))
+            delay = min(delay * 2, POLL_MAX)
+
+    def acquire(self, samples, elements="READ,TIME,STAT", fmt="sreal", timeout=60.0):
+        """Llena el buffer de todos a la vez y devuelve {dirección: array estructurado}
+
+        Los timestamps (TRAC:TST:FORM ABS, relativos a la primera lectura) se
+        desplazan con el instante del GET de cada tarjeta, así quedan en una
+        misma escala de tiempo.
+        """
+        config = [
+            "STAT:PRES;*CLS",
+            "STAT:MEAS:ENAB 512",                 # SRQ en BFL
+            "*SRE 1",
+            "ARM:SOUR BUS",                       # esperan al GET en la capa ARM
+            "ARM:COUN 1",
+            "TRIG:SOUR IMM",
+            f"TRIG:COUN {samples}",
+            "TRAC:CLE",
+            f"TRAC:POIN {samples}",
+            "TRAC:TST:FORM ABS",
+            "TRAC:FEED SENS;FEED:CONT NEXT",
+            f"FORM:ELEM {elements}",
+        ]
+        config += format_commands(fmt)
+        self.configure(config)
+
+        for inst in self.instruments.values():
+            inst.write("INIT")
+
+        self.values = {}
+        self.timing["download"] = {}
+        t0 = time.perf_counter()
+        self.trigger()
+        count = samples * len(elements.split(','))
+        self._per_board(lambda board: self._collect(board, count, fmt, timeout))
+        self.timing["acquire"] = time.perf_counter() - t0
+
+        start = min(self.trigger_times.values())
+        data = {}
+        for address in self.instruments:
+            d = decode_readings(self.values[address], elements)
+            if "timestamp" in d.dtype.names:
+                d["timestamp"] += self.trigger_times[address] - start
+            data[address] = d
+        return data
+
+    def close(self):
+        for inst in self.instruments.values():
+            inst.close()
+        for intfc in self.interfaces.values():
+            if intfc is not None:
+                intfc.close()
+
+
+def merge(data):
+    """Une las lecturas en un único array sobre la escala de tiempo del primer instrumento
+
+    Solo se conserva el intervalo común a todos; las lecturas de los demás se
+    interpolan linealmente en los timestamps del primero.
+    """
+    addresses = list(data)
+    reference = data[addresses[0]]["timestamp"]
+    start = max(data[a]["timestamp"][0] for a in addresses)
+    end = min(data[a]["timestamp"][-1] for a in addresses)
+    t = reference[(reference >= start) & (reference <= end)]
+
+    merged = np.empty(len(t), dtype=[("timestamp", "f8")] + [(field_name(a), "f8") for a in addresses])
+    merged["timestamp"] = t
+    for a in addresses:
+        merged[field_name(a)] = np.interp(t, data[a]["timestamp"], data[a]["reading"])
+    return merged
+
+
+if __name__ == "__main__":
+    rm = SimulatedResourceManager(ADDRESSES) if simulate else pyvisa.ResourceManager()
+    session = MultiSession(rm, ADDRESSES)
+
+    print(f"Configurando {len(ADDRESSES)} electrómetros...")
+    session.configure([
+        "*RST",
+        'SENS:FUNC "CURR"',
+        "CONF:CURR",
+        "SYST:ZCH OFF",
+        "SYST:ZCOR OFF",
+        "SYST:AZER OFF",
+        "CURR:RANG:AUTO OFF",
+        "CURR:RANG 200E-6",
+        "CURR:NPLC 0.01",
+        "MED OFF",
+        "AVER OFF",
+        "DISP:DIG 4.5",
+        "DISP:ENAB OFF",
+    ])
+
+    print("Adquiriendo...")
+    try:
+        data = session.acquire(number_of_samples)
+    finally:
+        session.close()
+
+    for address, d in data.items():
+        print(f"{address}: {len(d)} lecturas, descarga {session.timing['download'][address]:.3f} s")
+    print(f"Tiempo total de adquisición: {session.timing['acquire']:.3f} s")
+
+    metadata = {"function": "current", "addresses": ADDRESSES, "samples": number_of_samples,
+                "trigger_times": {a: t - min(session.trigger_times.values()) for a, t in session.trigger_times.items()}}
+    save(OUTPUT_FILE, merge(data), metadata)
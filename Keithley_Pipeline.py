@@ -0,0 +1,212 @@
+import threading
+import time
+import numpy as np
+
+
+class RingBuffer:
+    """Buffer circular preasignado de filas (lecturas x elementos) entre hilos
+
+    Las posiciones son contadores absolutos de filas escritas, la fila i está
+    en data[i % capacity]. Los lectores sin pérdidas frenan al productor
+    (backpressure); los demás se saltan lo que se ha sobrescrito y lo cuentan
+    en su contador de overflows.
+    """
+
+    def __init__(self, capacity, width, dtype=float):
+        self.data = np.empty((capacity, width), dtype=dtype)
+        self.capacity = capacity
+        self.width = width
+        self.written = 0
+        self.closed = False
+        self.readers = []
+        self.producer_waits = 0
+        self.producer_wait_time = 0.0
+        self.cond = threading.Condition()
+
+    def reader(self, lossless=False, name=None):
+        """Crea un lector que empieza en la posición actual de escritura"""
+        with self.cond:
+            reader = Reader(self, lossless, name)
+            reader.position = self.written
+            self.readers.append(reader)
+            return reader
+
+    def remove(self, reader):
+        """Quita un lector para que deje de frenar al productor"""
+        with self.cond:
+            if reader in self.readers:
+                self.readers.remove(reader)
+            self.cond.notify_all()
+
+    def _free(self):
+        """Filas que se pueden escribir sin pisar a ningún lector sin pérdidas"""
+        positions = [r.position for r in self.readers if r.lossless]
+        if not positions:
+            return self.capacity
+        return self.capacity - (self.written - min(positions))
+
+    def write(self, block):
+        """Copia un bloque de filas al buffer circular"""
+        block = np.asarray(block, dtype=self.data.dtype).reshape(-1, self.width)
+
+        # Bloques mayores que el buffer se escriben por trozos
+        for start in range(0, len(block), self.capacity):
+            self._write(block[start:start + self.capacity])
+
+    def _write(self, block):
+        n = len(block)
+        with self.cond:
+            if self._free() < n:
+                self.producer_waits += 1
+                t0 = time.perf_counter()
+                while self._free() < n and not self.closed:
+                    self.cond.wait()
+                self.producer_wait_time += time.perf_counter() - t0
+
+            start = self.written % self.capacity
+            first = min(n, self.capacity - start)
+            self.data[start:start + first] = block[:first]
+            self.data[:n - first] = block[first:]
+            self.written += n
+
+            # Los lectores con pérdidas que se han quedado atrás saltan al dato más antiguo
+            oldest = self.written - self.capacity
+            for r in self.readers:
+                if not r.lossless and r.position < oldest:
+                    r.overflows += oldest - r.position
+                    r.position = oldest
+
+            self.cond.notify_all()
+
+    def close(self):
+        """Marca el final de los datos, los lectores acaban al vaciar lo pendiente"""
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+class Reader:
+    """Cursor de lectura sobre un RingBuffer, iterable bloque a bloque"""
+
+    def __init__(self, ring, lossless=False, name=None):
+        self.ring = ring
+        self.lossless = lossless
+        self.name = name
+        self.position = 0
+        self.rows_read = 0
+        self.overflows = 0
+
+    @property
+    def pending(self):
+        return self.ring.written - self.position
+
+    def read(self, max_rows=None, timeout=None):
+        """Devuelve las filas nuevas (copia); vacío si no llega nada en timeout"""
+        ring = self.ring
+        with ring.cond:
+            ring.cond.wait_for(lambda: ring.written > self.position or ring.closed, timeout)
+
+            n = ring.written - self.position
+            if max_rows is not None:
+                n = min(n, max_rows)
+
+            start = self.position % ring.capacity
+            first = min(n, ring.capacity - start)
+            out = np.concatenate((ring.data[start:start + first], ring.data[:n - first]))
+
+            self.position += n
+            self.rows_read += n
+            ring.cond.notify_all()
+            return out
+
+    def __iter__(self):
+        while True:
+            block = self.read()
+            if len(block):
+                yield block
+            elif self.ring.closed:
+                return
+
+
+class Pipeline:
+    """Productor/consumidor: un hilo de E/S llena el RingBuffer y cada consumidor
+    (escritura a disco, gráfica, estadísticas) lee en su propio hilo"""
+
+    def __init__(self, blocks, width, capacity=100000, stop=None):
+        self.blocks = blocks
+        self.ring = RingBuffer(capacity, width)
+        self.stop_source = stop
+        self.consumers = []
+        self.error = None
+        self.thread = threading.Thread(target=self._produce, name="keithley-io", daemon=True)
+
+    def _produce(self):
+        try:
+            for block in self.blocks:
+                if self.error is not None:
+                    break   # ha fallado un consumidor
+                self.ring.write(block)
+        except Exception as e:
+            self._fail(e)
+        finally:
+            self.ring.close()
+
+    def _fail(self, error):
+        """Anota el primer error y para la adquisición; join() lo vuelve a lanzar"""
+        if self.error is None:
+            self.error = error
+        self.stop()
+        self.ring.close()
+
+    def add_consumer(self, callback, lossless=True, name=None):
+        """Registra callback(block) para cada bloque nuevo, ejecutado en su propio hilo
+
+        Si callback falla (por ejemplo el disco lleno al guardar) se para toda
+        la adquisición y join() lanza el error: no se sigue midiendo con un
+        consumidor sin pérdidas que ya no guarda nada.
+        """
+        reader = self.ring.reader(lossless, name)
+
+        def consume():
+            try:
+                for block in reader:
+                    callback(block)
+            except Exception as e:
+                self._fail(e)
+            finally:
+                self.ring.remove(reader)
+
+        thread = threading.Thread(target=consume, name=name or "keithley-consumer", daemon=True)
+        self.consumers.append((reader, thread))
+        return reader
+
+    def reader(self, lossless=False, name=None):
+        """Lector para consumir con iteración desde el hilo que quiera el usuario"""
+        return self.ring.reader(lossless, name)
+
+    def start(self):
+        for reader, thread in self.consumers:
+            thread.start()
+        self.thread.start()
+
+    def stop(self):
+        """Pide a la fuente que pare; los consumidores vacían lo pendiente"""
+        if self.stop_source is not None:
+            self.stop_source()
+
+    def join(self, timeout=None):
+        self.thread.join(timeout)
+        for reader, thread in self.consumers:
+            thread.join(timeout)
+        if self.error is not None:
+            raise self.error
+
+    def stats(self):
+        """Contadores de filas, esperas del productor y overflows por consumidor"""
+        return {
+            "written": self.ring.written,
+            "producer_waits": self.ring.producer_waits,
+            "producer_wait_time": self.ring.producer_wait_time,
+            "consumers": {r.name: {"rows": r.rows_read, "pending": r.pending, "overflows": r.overflows}
+                          for r, t in self.consumers},
+        }
@@ -0,0 +1,58 @@
+import json
+import time
+from Keithley_6514 import Keithley6514
+from Keithley_Transport import open_transport
+
+# YAML es opcional, solo hace falta para cargar perfiles .yaml/.yml
+try:
+    import yaml
+except ImportError:
+    yaml = None
+
+# Perfiles de medida como datos: claves con el mismo nombre que los parámetros de
+# Keithley6514.measure_commands, más "commands" con SCPI adicional si hace falta
+PROFILES = {
+    "current": {"measure": "current", "measure_range": "200E-6", "nplc": 0.01},
+    "voltage": {"measure": "voltage", "measure_range": "200", "nplc": 0.01},
+    "charge": {"measure": "charge", "measure_range": "200E-9", "nplc": 0.01},
+}
+
+# Para la demo de __main__
+GPIB_ADDRESS = "GPIB0::14::INSTR"
+
+# Con simulate = True se usa el 6514 simulado (Keithley_Sim) en lugar del instrumento real
+simulate = False
+
+
+def load_profiles(path):
+    """Lee perfiles de un .json o .yaml con la misma estructura que PROFILES
+
+    Cada perfil se completa con los valores del perfil de PROFILES de su
+    misma función, así en el fichero basta con indicar lo que cambia.
+    """
+    with open(path) as f:
+        if path.endswith((".yaml", ".yml")):
+            if yaml is None:
+                raise ImportError("Para leer perfiles YAML hace falta instalar pyyaml")
+            loaded = yaml.safe_load(f)
+        else:
+            loaded = json.load(f)
+
+    profiles = dict(PROFILES)
+    for name, profile in loaded.items():
+        measure = profile.get("measure", name)
+        profiles[name] = dict(PROFILES.get(measure, {}), **profile)
+    return profiles
+
+
+if __name__ == "__main__":
+    keithley = Keithley6514(open_transport(GPIB_ADDRESS, simulate))
+
+    # Un único *RST al principio; después cada cambio envía solo lo que difiere
+    keithley.configure(["*RST"])
+    for name in ["current", "charge", "current", "voltage", "current", "current"]:
+        t0 = time.perf_counter()
+        sent = keithley.apply_profile(PROFILES[name])
+        print(f"{name}: {len(sent)} comandos en {(time.perf_counter() - t0) * 1000:.1f} ms {sent}")
+
+    keithley.close()
@@ -0,0 +1,153 @@
+import atexit
+import threading
+import time
+from Keithley_Config import read_errors
+from Keithley_Status import EAV_BIT
+from Keithley_6514 import Keithley6514
+from Keithley_Stream import CHUNK_SIZE
+from Keithley_Transport import open_transport
+
+# Para la demo de __main__
+GPIB_ADDRESS = "GPIB0::14::INSTR"
+
+# Con simulate = True se usa el 6514 simulado (Keithley_Sim) en lugar del instrumento real
+simulate = False
+
+
+class Session:
+    """Conexión de larga duración con un 6514 que se reutiliza entre capturas
+
+    El *RST se hace una sola vez al abrir. La primera captura de cada tamaño
+    configura el buffer; las siguientes solo rearman con FEED:CONT NEXT e
+    INIT, y los cambios de perfil envían solo lo que difiere. Se puede usar
+    como context manager (cierra al salir) o pedir a un SessionPool.
+    """
+
+    def __init__(self, resource, simulate=False, elements="READ,TIME,STAT", fmt="sreal", timeout=5000,
+                 reset=True, **transport_args):
+        self.resource = resource
+        self.keithley = Keithley6514(open_transport(resource, simulate, timeout, **transport_args), elements, fmt)
+        self.samples = None
+        self.captures = 0
+        self.errors = []
+        self.closed = False
+        if reset:
+            self.keithley.configure(["*RST"])
+
+    def check(self):
+        """Comprobación barata: lee el status byte y, si hay errores en cola, los vacía
+
+        Devuelve False si el instrumento ha reportado errores; en ese caso se
+        olvida el estado en caché y la próxima captura vuelve a configurar todo.
+        """
+        stb = self.keithley.transport.read_stb()
+        if stb & EAV_BIT:
+            self.errors = read_errors(self.keithley.query)
+            self.invalidate()
+            return False
+        return True
+
+    def invalidate(self):
+        """La próxima captura configura el buffer y el perfil completos"""
+        self.samples = None
+        self.keithley.configurator.clear()
+
+    def arm(self, samples, profile=None):
+        """Prepara e inicia una captura de 'samples' lecturas sin esperar a que acabe"""
+        if profile is not None:
+            self.keithley.apply_profile(profile)
+        if self.samples != samples:
+            # Primera captura de este tamaño: configuración del buffer completa
+            self.keithley.configure(self.keithley.buffer_commands(samples))
+            self.samples = samples
+        self.keithley.rearm()
+
+    def collect(self, timeout=60.0):
+        """Espera al buffer lleno de la captura armada y devuelve los valores sin decodificar"""
+        values = self.keithley.collect(self.samples, timeout)
+        self.captures += 1
+        return values
+
+    def capture_chunks(self, samples, profile=None, chunk=CHUNK_SIZE, timeout=60.0):
+        """Captura descargada por trozos mientras se llena el buffer (generador de bloques)"""
+        self.arm(samples, profile)
+        yield from self.keithley.collect_chunks(samples, chunk, timeout)
+        self.captures += 1
+
+    def capture(self, samples, profile=None, timeout=60.0):
+        """Una captura de 'samples' lecturas en buffer (arm + collect)"""
+        self.arm(samples, profile)
+        return self.collect(timeout)
+
+    def close(self):
+        if not self.closed:
+            self.keithley.close()
+            self.closed = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SessionPool:
+    """Sesiones abiertas por recurso ('GPIB0::14::INSTR', 'COM9'...)
+
+    get() devuelve la sesión ya abierta si responde a la comprobación; si no
+    responde se cierra y se abre de nuevo. Las sesiones se cierran con
+    close_all(), al salir del with o al terminar el programa.
+    """
+
+    def __init__(self, simulate=False, **session_args):
+        self.simulate = simulate
+        self.session_args = session_args
+        self.sessions = {}
+        self.lock = threading.Lock()
+        atexit.register(self.close_all)
+
+    def get(self, resource, **session_args):
+        with self.lock:
+            session = self.sessions.get(resource)
+            if session is not None and not session.closed:
+                try:
+                    session.check()
+                    return session
+                except Exception:
+                    # Sin respuesta: se descarta la conexión y se abre otra
+                    try:
+                        session.close()
+                    except Exception:
+                        pass
+            args = dict(self.session_args, **session_args)
+            session = self.sessions[resource] = Session(resource, self.simulate, **args)
+            return session
+
+    def close_all(self):
+        with self.lock:
+            for session in self.sessions.values():
+                try:
+                    session.close()
+                except Exception:
+                    pass
+            self.sessions = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close_all()
+
+
+if __name__ == "__main__":
+    from Keithley_Profiles import PROFILES
+
+    with SessionPool(simulate) as pool:
+        for i in range(5):
+            t0 = time.perf_counter()
+            session = pool.get(GPIB_ADDRESS)
+            t1 = time.perf_counter()
+            values = session.capture(2500, PROFILES["current"])
+            t2 = time.perf_counter()
+            print(f"Captura {i + 1}: sesión {1000 * (t1 - t0):.1f} ms, captura {t2 - t1:.2f} s, "
+                  f"{len(values) // 3} lecturas")
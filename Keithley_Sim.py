@@ -0,0 +1,752 @@
+import math
+import os
+import threading
+import time
+import numpy as np
+from pyvisa import constants, errors
+from Keithley_6514 import RANGES
+
+# Frecuencia de red que usa el simulador para convertir NPLC en tiempo
+LINE_FREQ = 50  # Hz
+
+# Tiempo fijo por lectura además de la integración. Con NPLC 0.01 y autozero
+# apagado sale ~0.98 ms por lectura, lo que se ve en CSV_File.csv
+READING_OVERHEAD = 0.00077  # segundos
+DISPLAY_OVERHEAD = 0.0008   # segundos extra por lectura con la pantalla encendida
+
+# Velocidad del bus GPIB simulado y latencia de cada escritura
+GPIB_BYTES_PER_SECOND = 500e3
+GPIB_LATENCY = 0.0002  # segundos
+
+# Unidades de cada función (RANGES viene del driver, la misma tabla que el autorango)
+UNITS = {"CURR": "NADC", "VOLT": "NVDC", "CHAR": "NCOUL"}
+
+# Una lectura por encima de OVERRANGE * rango se marca como overflow
+OVERRANGE = 1.05
+OVERFLOW_VALUE = 9.9e37
+
+# Bits del registro de eventos de medida
+RAV = 32    # Reading Available
+BHF = 256   # Buffer Half Full
+BFL = 512   # Buffer Full
+
+# Velocidades del puerto RS-232 del 6514
+BAUD_RATES = (300, 600, 1200, 2400, 4800, 9600, 19200, 38400, 57600)
+
+# Nodos opcionales de SCPI que se ignoran al normalizar
+OPTIONAL_NODES = {"SEQ", "LAY", "IMM", "EVEN", "DC"}
+
+
+def short_form(keyword):
+    """Forma corta SCPI: 4 letras, o 3 si la cuarta es vocal"""
+    kw = keyword.strip().upper().rstrip("0123456789") or keyword.upper()
+    if len(kw) <= 4:
+        return kw
+    return kw[:3] if kw[3] in "AEIOU" else kw[:4]
+
+
+def split_message(message):
+    """Separa un mensaje de programa por ';' respetando las comillas"""
+    parts, current, quoted = [], "", False
+    for c in message:
+        if c == '"':
+            quoted = not quoted
+        if c == ';' and not quoted:
+            parts.append(current)
+            current = ""
+        else:
+            current += c
+    parts.append(current)
+    return [p.strip() for p in parts if p.strip()]
+
+
+def parse_bool(value):
+    value = value.strip().upper()
+    if value in ("ON", "1"):
+        return True
+    if value in ("OFF", "0"):
+        return False
+    raise ValueError(value)
+
+
+class Simulated6514:
+    """Modelo del Keithley 6514 con el subconjunto SCPI que usan los scripts
+
+    El estado de la adquisición se calcula de forma perezosa a partir del reloj:
+    cada vez que se consulta algo se generan las lecturas que habrían terminado
+    hasta ese instante según NPLC, autozero y pantalla.
+    """
+
+    def __init__(self, seed=0, signal=None):
+        self.seed = seed
+        self.signal = signal or {"CURR": 1e-6, "VOLT": 1.5, "CHAR": 5e-9}
+        self.lock = threading.RLock()
+        self.baud = 9600
+        self.reset()
+
+    # ------------------------------------------------------------------ estado
+
+    def reset(self):
+        """Valores por defecto tras *RST"""
+        self.function = "VOLT"
+        self.range = {f: r[-1] for f, r in RANGES.items()}
+        self.autorange = {f: True for f in RANGES}
+        self.nplc = {f: 5.0 for f in RANGES}
+        self.zcheck = True
+        self.zcorrect = False
+        self.autozero = True
+        self.median = False
+        self.average = False
+        self.display = True
+        self.digits = 6.5
+        self.trig_count = 1
+        self.trig_source = "IMM"
+        self.arm_count = 1
+        self.arm_source = "IMM"
+        self.points = 100
+        self.feed = "SENS"
+        self.feed_control = "NEV"
+        self.tst_format = "ABS"
+        self.data_format = "ASC"
+        self.byte_order = "NORM"
+        self.elements = ["READ", "TIME", "STAT"]
+        self.clear_status()
+        self.errors = []
+        self.clear_buffer()
+        self.state = "IDLE"
+        self.latest = None
+        self.t_zero = None
+
+    def clear_status(self):
+        self.meas_event = 0
+        self.meas_enable = 0
+        self.sre = 0
+
+    def clear_buffer(self):
+        self.buffer = np.zeros((max(self.points, 1), 3))
+        self.stored = 0
+
+    def period(self):
+        """Tiempo por lectura con la configuración actual"""
+        integration = self.nplc[self.function] / LINE_FREQ
+        if self.autozero:
+            integration *= 2
+        return integration + READING_OVERHEAD + (DISPLAY_OVERHEAD if self.display else 0)
+
+    def error(self, code, text):
+        self.errors.append('%d,"%s"' % (code, text))
+
+    # -------------------------------------------------------- modelo de trigger
+
+    def initiate(self, now):
+        if self.state != "IDLE":
+            self.error(-213, "Init ignored")
+            return
+        self.arms_left = math.inf if self.arm_count == math.inf else int(self.arm_count)
+        self.state = "ARMED"
+        if self.arm_source == "IMM":
+            self._start_segment(now)
+
+    def trigger(self, now=None):
+        """GET o *TRG: dispara la capa ARM si está esperando al bus"""
+        with self.lock:
+            now = time.perf_counter() if now is None else now
+            self.update(now)
+            if self.state == "ARMED" and self.arm_source != "IMM":
+                self._start_segment(now)
+
+    def _start_segment(self, now):
+        self.state = "RUN"
+        self.seg_start = now
+        self.seg_period = self.period()
+        self.seg_count = self.trig_count
+        self.seg_done = 0
+        if self.t_zero is None:
+            self.t_zero = now
+
+    def abort(self, now):
+        self.update(now)
+        self.state = "IDLE"
+
+    def update(self, now=None):
+        """Genera las lecturas que habrían terminado hasta 'now'"""
+        now = time.perf_counter() if now is None else now
+        while self.state == "RUN":
+            produced = min(self.seg_count, int((now - self.seg_start) / self.seg_period))
+            if produced > self.seg_done:
+                self._produce(self.seg_done, produced)
+                self.seg_done = produced
+            if self.seg_done < self.seg_count:
+                return
+
+            # Fin del segmento de trigger: otra vuelta de ARM o reposo
+            self.arms_left -= 1
+            end = self.seg_start + self.seg_count * self.seg_period
+            if self.arms_left <= 0:
+                self.state = "IDLE"
+            elif self.arm_source == "IMM":
+                self._start_segment(end)
+            else:
+                self.state = "ARMED"
+
+    def _values(self, times):
+        """Señal simulada: nivel con una oscilación lenta y ruido determinista"""
+        level = self.signal[self.function]
+        noise = np.sin(times * 12.9898e3 + self.seed) * 43758.5453 % 1 - 0.5
+        if self.zcheck:
+            return noise * self.range[self.function] * 1e-4
+        return level * (1 + 0.1 * np.sin(2 * np.pi * times)) + level * 0.01 * noise
+
+    def _produce(self, first, last):
+        # Solo se generan las lecturas que pueden acabar en el buffer y la última
+        n = last - first
+        storing = self.feed != "NONE" and self.feed_control != "NEV"
+        if storing and self.feed_control == "NEXT":
+            keep = min(n, self.points - self.stored)
+            idx = np.append(np.arange(first + 1, first + keep + 1), last)
+        elif storing:
+            keep = min(n, self.points)
+            idx = np.arange(last - keep + 1, last + 1)
+        else:
+            keep = 0
+            idx = np.array([last])
+        t_abs = self.seg_start + idx * self.seg_period
+        timestamps = t_abs - self.t_zero
+        values = self._values(t_abs)
+
+        f = self.function
+        if self.autorange[f]:
+            # Rango mínimo que contiene la lectura
+            peak = np.max(np.abs(values)) if len(values) else 0
+            fitting = [r for r in RANGES[f] if peak <= r * OVERRANGE]
+            self.range[f] = fitting[0] if fitting else RANGES[f][-1]
+
+        status = np.zeros(len(values))
+        over = np.abs(values) > self.range[f] * OVERRANGE
+        values = np.where(over, OVERFLOW_VALUE, values)
+        status[over] = 1
+
+        rows = np.column_stack((values, timestamps, status))
+        self.latest = rows[-1]
+        self.meas_event |= RAV
+        if storing:
+            self._store(rows[:keep], n)
+
+    def _store(self, rows, n):
+        """Guarda las lecturas; en ALW rows son las últimas de n lecturas nuevas"""
+        points = self.points
+        before = self.stored
+        if self.feed_control == "NEXT":
+            self.buffer[self.stored:self.stored + len(rows)] = rows
+            self.stored += len(rows)
+            if self.stored >= points:
+                self.feed_control = "NEV"
+        else:
+            self.stored += n
+            pos = (self.stored - len(rows) + np.arange(len(rows))) % points
+            self.buffer[pos] = rows
+
+        # Eventos al cruzar la mitad y el final del buffer (en ALW en cada vuelta)
+        half = points // 2
+        if (self.stored - half) // points > (before - half) // points:
+            self.meas_event |= BHF
+        if self.stored // points > before // points:
+            self.meas_event |= BFL
+
+    def next_event_time(self):
+        """Instante en que el próximo evento de medida habilitado levantará SRQ"""
+        if self.state != "RUN":
+            return None
+        enable = self.meas_enable
+        candidates = []
+        next_index = self.seg_done + 1
+        if enable & RAV:
+            candidates.append(next_index)
+        if enable & (BHF | BFL) and self.feed != "NONE" and self.feed_control != "NEV":
+            half = self.points // 2
+            for mark in (half, self.points):
+                if enable & (BHF if mark == half else BFL):
+                    # Siguiente lectura del segmento en la que el buffer cruza 'mark'
+                    k = mark - self.stored % self.points
+                    if k <= 0:
+                        k += self.points
+                    candidates.append(self.seg_done + k)
+        candidates = [c for c in candidates if c <= self.seg_count]
+        if not candidates:
+            return self.seg_start + self.seg_count * self.seg_period
+        return self.seg_start + min(candidates) * self.seg_period
+
+    # ------------------------------------------------------------------ estado
+
+    def status_byte(self):
+        """Status byte: MSB (bit 0), EAV (bit 2) y RQS (bit 6) según *SRE"""
+        with self.lock:
+            self.update()
+            stb = 0
+            if self.meas_event & self.meas_enable:
+                stb |= 1
+            if self.errors:
+                stb |= 4
+            if stb & self.sre:
+                stb |= 64
+            return stb
+
+    # ------------------------------------------------------------- respuestas
+
+    def _format_rows(self, rows):
+        """Formatea lecturas según FORM:DATA, FORM:BORD y FORM:ELEM"""
+        columns = [i for i, e in enumerate(["READ", "TIME", "STAT"]) if e in self.elements]
+        values = np.asarray(rows, dtype=float).reshape(-1, 3)[:, columns]
+        if self.data_format == "ASC":
+            unit = UNITS[self.function] if "UNIT" in self.elements else ""
+            fields = []
+            for row in values:
+                for j, v in enumerate(row):
+                    fields.append("%+.6E" % v + (unit if j == 0 and columns[0] == 0 else ""))
+            return ",".join(fields).encode()
+        dtype = "f4" if self.data_format == "SRE" else "f8"
+        dtype = ("<" if self.byte_order == "SWAP" else ">") + dtype
+        return b"#0" + values.astype(dtype).tobytes()
+
+    def _buffer_rows(self, args):
+        count = min(self.stored, self.points)
+        if args:
+            first, last = [int(float(a)) for a in args.split(',')]
+        else:
+            first, last = 1, count
+        if first < 1 or last > count or first > last:
+            self.error(-222, "Data out of range")
+            return np.zeros((0, 3))
+        return self.buffer[first - 1:last]
+
+    # --------------------------------------------------------------- comandos
+
+    def process(self, message, now=None):
+        """Ejecuta un mensaje de programa y devuelve la respuesta (bytes) o None"""
+        with self.lock:
+            now = time.perf_counter() if now is None else now
+            self.update(now)
+            responses = []
+            prefix = []
+            for cmd in split_message(message):
+                if cmd.startswith("*"):
+                    header, _, args = cmd.partition(" ")
+                    nodes = [header.upper()]
+                else:
+                    header, _, args = cmd.partition(" ")
+                    nodes = [n for n in header.split(":") if n]
+                    if not cmd.startswith(":"):
+                        nodes = prefix + nodes
+                    prefix = nodes[:-1]
+                query = nodes[-1].endswith("?")
+                nodes[-1] = nodes[-1].rstrip("?")
+                try:
+                    response = self._execute(nodes, query, args.strip(), now)
+                except (ValueError, KeyError, IndexError):
+                    self.error(-224, "Illegal parameter value")
+                    response = None
+                if response is not None:
+                    responses.append(response)
+            if not responses:
+                return None
+            return b";".join(responses) + b"\n"
+
+    def _execute(self, nodes, query, args, now):
+        if nodes[0].startswith("*"):
+            key = nodes[0]
+        else:
+            nodes = [short_form(n) for n in nodes]
+            if nodes[0] == "SENS" and len(nodes) > 1:
+                nodes = nodes[1:]
+            nodes = [n for n in nodes if n not in OPTIONAL_NODES] or nodes
+            if nodes[0] == "SYST" and nodes[-1] == "NEXT":
+                nodes = nodes[:-1]
+            if nodes == ["FORM", "DATA"]:
+                nodes = ["FORM"]
+            key = ":".join(nodes)
+
+        # Comandos comunes IEEE-488.2
+        if key == "*RST":
+            self.reset()
+        elif key == "*CLS":
+            self.meas_event = 0
+            self.errors = []
+        elif key == "*IDN":
+            return b"KEITHLEY INSTRUMENTS INC.,MODEL 6514,SIM0001,A13 (simulado)"
+        elif key == "*OPC":
+            return b"1" if query else None
+        elif key == "*WAI":
+            pass
+        elif key == "*STB":
+            return b"%d" % self.status_byte()
+        elif key == "*SRE":
+            if query:
+                return b"%d" % self.sre
+            self.sre = int(args) & ~64
+        elif key == "*TRG":
+            self.trigger(now)
+
+        # Estado y sistema
+        elif key == "STAT:PRES":
+            self.meas_enable = 0
+        elif key == "STAT:MEAS":
+            event, self.meas_event = self.meas_event, 0
+            return b"%d" % event
+        elif key == "STAT:MEAS:ENAB":
+            if query:
+                return b"%d" % self.meas_enable
+            self.meas_enable = int(args)
+        elif key == "SYST:ERR":
+            return (self.errors.pop(0) if self.errors else '0,"No error"').encode()
+        elif key in ("SYST:ZCH", "SYST:ZCOR", "SYST:AZER"):
+            attr = {"SYST:ZCH": "zcheck", "SYST:ZCOR": "zcorrect", "SYST:AZER": "autozero"}[key]
+            if query:
+                return b"1" if getattr(self, attr) else b"0"
+            setattr(self, attr, parse_bool(args))
+        elif key == "SYST:COMM:SER:BAUD":
+            if query:
+                return b"%d" % self.baud
+            if int(args) not in BAUD_RATES:
+                self.error(-222, "Data out of range")
+                return None
+            self.baud = int(args)
+        elif key in ("SYST:LOC", "SYST:REM", "SYST:PRES"):
+            pass
+
+        # Función, rango y velocidad
+        elif key == "CONF" or key.startswith("CONF:"):
+            if len(nodes) > 1:
+                self.function = nodes[1]
+            self.trig_count = 1
+            self.arm_count = 1
+            self.trig_source = "IMM"
+            self.arm_source = "IMM"
+        elif key == "FUNC":
+            if query:
+                return b'"%s"' % self.function.encode()
+            function = short_form(args.strip('"\''))
+            RANGES[function]
+            self.function = function
+        elif len(nodes) >= 2 and nodes[0] in RANGES:
+            return self._function_setting(nodes, query, args)
+        elif key in ("MED", "AVER"):
+            if query:
+                return b"1" if getattr(self, "median" if key == "MED" else "average") else b"0"
+            setattr(self, "median" if key == "MED" else "average", parse_bool(args))
+        elif key == "DISP:DIG":
+            self.digits = float(args)
+        elif key == "DISP:ENAB":
+            if query:
+                return b"1" if self.display else b"0"
+            self.display = parse_bool(args)
+
+        # Trigger
+        elif key in ("TRIG:COUN", "ARM:COUN"):
+            attr = "trig_count" if key == "TRIG:COUN" else "arm_count"
+            if query:
+                count = getattr(self, attr)
+                return b"9.9E37" if count == math.inf else b"%d" % count
+            setattr(self, attr, math.inf if args.upper().startswith("INF") else int(float(args)))
+        elif key in ("TRIG:SOUR", "ARM:SOUR"):
+            attr = "trig_source" if key == "TRIG:SOUR" else "arm_source"
+            if query:
+                return getattr(self, attr).encode()
+            setattr(self, attr, short_form(args))
+        elif key == "INIT":
+            self.initiate(now)
+        elif key == "ABOR":
+            self.abort(now)
+        elif key == "FETC":
+            if self.latest is None:
+                self.error(-230, "Data corrupt or stale")
+                return b""
+            return self._format_rows(self.latest)
+        elif key == "READ":
+            return self._read(now)
+
+        # Buffer
+        elif key == "TRAC:CLE":
+            self.clear_buffer()
+            self.t_zero = None
+        elif key == "TRAC:POIN":
+            if query:
+                return b"%d" % self.points
+            self.points = int(float(args))
+            self.clear_buffer()
+        elif key == "TRAC:POIN:ACT":
+            return b"%d" % min(self.stored, self.points)
+        elif key == "TRAC:FEED":
+            self.feed = short_form(args)
+        elif key == "TRAC:FEED:CONT":
+            if query:
+                return self.feed_control.encode()
+            self.feed_control = short_form(args)
+            if self.feed_control != "NEV" and self.stored >= self.points:
+                self.clear_buffer()
+        elif key == "TRAC:TST:FORM":
+            self.tst_format = short_form(args)
+        elif key == "TRAC:DATA":
+            return self._format_rows(self._buffer_rows(args))
+
+        # Formato de datos
+        elif key == "FORM":
+            if query:
+                return self.data_format.encode()
+            fmt = short_form(args.split(',')[0])
+            if fmt == "REAL":
+                fmt = "SRE" if args.replace(" ", "").upper().endswith(",32") else "DRE"
+            if fmt not in ("ASC", "SRE", "DRE"):
+                raise ValueError(args)
+            self.data_format = fmt
+        elif key == "FORM:BORD":
+            self.byte_order = short_form(args)
+        elif key == "FORM:ELEM":
+            if query:
+                return ",".join(self.elements).encode()
+            self.elements = [short_form(e) for e in args.split(',')]
+        else:
+            self.error(-113, "Undefined header")
+        return None
+
+    def _function_setting(self, nodes, query, args):
+        f, setting = nodes[0], ":".join(nodes[1:])
+        if setting == "RANG":
+            if query:
+                return b"%g" % self.range[f]
+            value = float(args)
+            self.range[f] = next((r for r in RANGES[f] if r >= value), RANGES[f][-1])
+            self.autorange[f] = False
+        elif setting == "RANG:AUTO":
+            if query:
+                return b"1" if self.autorange[f] else b"0"
+            self.autorange[f] = parse_bool(args)
+        elif setting == "NPLC":
+            if query:
+                return b"%g" % self.nplc[f]
+            self.nplc[f] = min(max(float(args), 0.01), 10.0)
+        else:
+            self.error(-113, "Undefined header")
+        return None
+
+    def _read(self, now):
+        """READ? = INIT + esperar a que acabe la medida + FETC?"""
+        if self.state == "IDLE":
+            self.initiate(now)
+        if self.state == "RUN" and self.seg_count != math.inf:
+            time.sleep(max(self.seg_start + self.seg_count * self.seg_period - time.perf_counter(), 0))
+            self.update()
+        return self._format_rows(self.latest) if self.latest is not None else b""
+
+
+class SimulatedResource:
+    """Recurso con la interfaz de pyvisa (MessageBasedResource) sobre el simulador"""
+
+    def __init__(self, resource_name, instrument, timeout=2000, bytes_per_second=GPIB_BYTES_PER_SECOND,
+                 latency=GPIB_LATENCY):
+        self.resource_name = resource_name
+        self.instrument = instrument
+        self.timeout = timeout
+        self.bytes_per_second = bytes_per_second
+        self.latency = latency
+        self.read_termination = None
+        self.write_termination = "\n"
+        self.output = []
+        self.events = set()
+
+    def _transfer(self, nbytes):
+        time.sleep(self.latency + nbytes / self.bytes_per_second)
+
+    def _timeout_error(self):
+        time.sleep((self.timeout or 0) / 1000)
+        raise errors.VisaIOError(constants.StatusCode.error_timeout)
+
+    def write(self, message, termination=None, encoding=None):
+        self._transfer(len(message) + 1)
+        response = self.instrument.process(message)
+        if response is not None:
+            self.output.append(response)
+        return len(message) + 1
+
+    def read_raw(self, size=None):
+        """Lee lo que queda del mensaje de respuesta actual (hasta EOI)"""
+        if not self.output:
+            self._timeout_error()
+        data = self.output.pop(0)
+        self._transfer(len(data))
+        return data
+
+    def read(self, termination=None, encoding=None):
+        data = self.read_raw().decode()
+        if self.read_termination and data.endswith(self.read_termination):
+            data = data[:-len(self.read_termination)]
+        return data
+
+    def read_bytes(self, count, chunk_size=None, break_on_termchar=False):
+        if not self.output or len(self.output[0]) < count:
+            self._timeout_error()
+        data, self.output[0] = self.output[0][:count], self.output[0][count:]
+        if not self.output[0]:
+            self.output.pop(0)
+        self._transfer(len(data))
+        return data
+
+    def query(self, message, delay=None):
+        self.write(message)
+        return self.read()
+
+    @property
+    def stb(self):
+        return self.read_stb()
+
+    def read_stb(self):
+        self._transfer(1)
+        return self.instrument.status_byte()
+
+    def assert_trigger(self):
+        self._transfer(1)
+        self.instrument.trigger()
+
+    def clear(self):
+        """Device clear: vacía la salida pendiente y aborta"""
+        self.output = []
+        with self.instrument.lock:
+            self.instrument.abort(time.perf_counter())
+
+    def enable_event(self, event_type, mechanism, context=None):
+        self.events.add(event_type)
+
+    def disable_event(self, event_type, mechanism):
+        self.events.discard(event_type)
+
+    def discard_events(self, event_type, mechanism):
+        pass
+
+    def wait_on_event(self, in_event_type, timeout, capture_timeout=False):
+        """Espera al SRQ calculando cuándo ocurrirá el próximo evento"""
+        deadline = time.perf_counter() + timeout / 1000
+        while True:
+            if self.instrument.status_byte() & 64:
+                return
+            with self.instrument.lock:
+                when = self.instrument.next_event_time()
+            now = time.perf_counter()
+            if now >= deadline:
+                raise errors.VisaIOError(constants.StatusCode.error_timeout)
+            time.sleep(max(min(deadline, when if when is not None else deadline) - now, 0) + 1e-4)
+
+    def close(self):
+        pass
+
+
+class SimulatedInterface:
+    """Interfaz de la tarjeta (GPIBn::INTFC), solo para el GET de grupo"""
+
+    def __init__(self, resource_name):
+        self.resource_name = resource_name
+
+    def group_execute_trigger(self, *resources):
+        # Un único GET llega a la vez a todos los instrumentos direccionados
+        time.sleep(GPIB_LATENCY)
+        now = time.perf_counter()
+        for resource in resources:
+            resource.instrument.trigger(now)
+        return len(resources) + 1, constants.StatusCode.success
+
+    def close(self):
+        pass
+
+
+class SimulatedResourceManager:
+    """Sustituto de pyvisa.ResourceManager que abre instrumentos simulados"""
+
+    def __init__(self, resources=("GPIB0::14::INSTR",), **kwargs):
+        self.visalib = None
+        self.instruments = {name: Simulated6514(seed=i, **kwargs) for i, name in enumerate(resources)}
+
+    def list_resources(self, query="?*::INSTR"):
+        return tuple(self.instruments)
+
+    def open_resource(self, resource_name, **kwargs):
+        if resource_name.endswith("::INTFC"):
+            return SimulatedInterface(resource_name)
+        if resource_name not in self.instruments:
+            self.instruments[resource_name] = Simulated6514(seed=len(self.instruments))
+        resource = SimulatedResource(resource_name, self.instruments[resource_name])
+        for key, value in kwargs.items():
+            setattr(resource, key, value)
+        return resource
+
+    def close(self):
+        pass
+
+
+class SerialSimulator:
+    """6514 simulado detrás de un pseudo-terminal, se abre con pyserial en self.port"""
+
+    def __init__(self, instrument=None, baudrate=9600, bits_per_char=11):
+        import tty
+        self.instrument = instrument or Simulated6514()
+        self.instrument.baud = baudrate
+        self.bits_per_char = bits_per_char  # 8 datos + paridad + inicio + parada
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)
+        self.port = os.ttyname(self.slave)
+        self.running = True
+        self.thread = threading.Thread(target=self._serve, name="keithley-sim-serial", daemon=True)
+        self.thread.start()
+
+    def _char_time(self):
+        return self.bits_per_char / self.instrument.baud
+
+    def _link_ok(self):
+        """El puerto del PC está a la misma velocidad que el instrumento"""
+        import termios
+        try:
+            speed = termios.tcgetattr(self.slave)[5]
+        except termios.error:
+            return False  # puerto ya cerrado
+        return speed == getattr(termios, "B%d" % self.instrument.baud)
+
+    def _garble(self, data):
+        # Con velocidades distintas cada lado recibe basura (sin terminadores válidos)
+        return bytes(b ^ 0x5A for b in data)
+
+    def _serve(self):
+        pending = b""
+        while self.running:
+            try:
+                data = os.read(self.master, 4096)
+            except OSError:
+                return
+            if not data or not self.running:
+                return
+            time.sleep(len(data) * self._char_time())
+            pending += data if self._link_ok() else self._garble(data)
+            while True:
+                cut = min([i for i in (pending.find(b"\r"), pending.find(b"\n")) if i >= 0], default=-1)
+                if cut < 0:
+                    break
+                line, pending = pending[:cut], pending[cut + 1:]
+                if line.strip():
+                    response = self.instrument.process(line.decode(errors="replace"))
+                    if response is not None:
+                        self._send(response)
+
+    def _send(self, data):
+        # Se envía por trozos al ritmo de los baudios configurados
+        for i in range(0, len(data), 64):
+            chunk = data[i:i + 64]
+            time.sleep(len(chunk) * self._char_time())
+            os.write(self.master, chunk if self._link_ok() else self._garble(chunk))
+
+    def close(self):
+        self.running = False
+        os.close(self.slave)
+        os.close(self.master)
+        self.thread.join(1)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
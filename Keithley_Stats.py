@@ -0,0 +1,231 @@
+import queue
+import time
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Cada cuánto se emite un resumen (segundos de tiempo del instrumento)
+SUMMARY_INTERVAL = 1.0
+
+# Ventana de la mediana móvil en lecturas (como MED:RANK del 6514, ventana = 2 * rank + 1)
+MEDIAN_WINDOW = 5
+
+# Resúmenes guardados en StreamStats.summaries si nadie los recoge; se descartan los más antiguos
+MAX_SUMMARIES = 3600
+
+
+class RunningStats:
+    """Media, varianza, mínimo y máximo acumulados bloque a bloque
+
+    Cada bloque se reduce con numpy y se combina con lo acumulado con la
+    fórmula de Chan/Welford, así no se guardan las lecturas y no se pierde
+    precisión aunque se sumen millones de valores.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def add(self, values):
+        values = np.asarray(values, dtype=float)
+        n = len(values)
+        if n == 0:
+            return
+        mean = float(values.mean())
+        m2 = float(((values - mean) ** 2).sum())
+
+        total = self.count + n
+        delta = mean - self.mean
+        self.mean += delta * n / total
+        self.m2 += m2 + delta ** 2 * self.count * n / total
+        self.count = total
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    @property
+    def std(self):
+        return self.variance ** 0.5
+
+    def summary(self):
+        return {"count": self.count, "mean": self.mean, "std": self.std, "min": self.min, "max": self.max}
+
+
+class MovingMedian:
+    """Mediana móvil causal sobre 'window' lecturas, continua entre bloques
+
+    Guarda las últimas window - 1 lecturas del bloque anterior; la salida
+    empieza cuando la ventana está llena y cada valor corresponde a la
+    última lectura de su ventana.
+    """
+
+    def __init__(self, window=MEDIAN_WINDOW):
+        self.window = window
+        self.tail = np.empty(0)
+
+    def filter(self, values):
+        """Devuelve la mediana de cada ventana que acaba en una lectura del bloque"""
+        v = np.concatenate((self.tail, np.asarray(values, dtype=float)))
+        self.tail = v[len(v) - (self.window - 1):] if self.window > 1 else v[:0]
+        if len(v) < self.window:
+            return v[:0]
+        return np.median(sliding_window_view(v, self.window), axis=1)
+
+
+class ThresholdDetector:
+    """Cruces de un umbral con histéresis, sin perder el estado entre bloques
+
+    Se considera por encima al superar level + hysteresis / 2 y por debajo
+    al bajar de level - hysteresis / 2; entre ambos se mantiene el estado
+    anterior, así el ruido alrededor del umbral no genera eventos.
+    """
+
+    def __init__(self, level, hysteresis=0.0, name=None):
+        self.level = level
+        self.hysteresis = hysteresis
+        self.name = name or f"{level:g}"
+        self.above = None
+        self.events = []
+
+    def check(self, values, timestamps):
+        """Revisa un bloque y devuelve los cruces nuevos"""
+        values = np.asarray(values, dtype=float)
+        if len(values) == 0:
+            return []
+        upper = self.level + self.hysteresis / 2
+        lower = self.level - self.hysteresis / 2
+
+        # +1 por encima, -1 por debajo, 0 en la banda de histéresis (se arrastra el último)
+        mark = np.where(values > upper, 1, np.where(values < lower, -1, 0))
+        start = 0 if self.above is None else (1 if self.above else -1)
+        mark = np.concatenate(([start], mark))
+        last = np.maximum.accumulate(np.where(mark != 0, np.arange(len(mark)), 0))
+        state = mark[last]
+
+        new = []
+        for i in np.nonzero((state[1:] != state[:-1]) & (state[:-1] != 0))[0]:
+            new.append({"threshold": self.name, "time": float(timestamps[i]), "value": float(values[i]),
+                        "direction": "up" if state[i + 1] > 0 else "down"})
+        if state[-1] != 0:
+            self.above = bool(state[-1] > 0)
+
+        self.events += new
+        return new
+
+
+class StreamStats:
+    """Etapa de procesado en línea para Keithley_Pipeline (o un bucle de bloques)
+
+    Recibe bloques de filas (lecturas x elementos) y mantiene estadísticas
+    globales, mediana móvil, mínimo/máximo y cruces de umbral. Cada 'interval'
+    segundos emite un resumen al flujo de baja frecuencia: on_summary(summary)
+    si se da, o si no la cola self.summaries (acotada a MAX_SUMMARIES, se
+    descartan los más antiguos). El resumen lleva la mediana de las lecturas
+    del intervalo ("median") y el último valor de la mediana móvil
+    ("filtered"). Los umbrales se aplican a la lectura filtrada por la
+    mediana, así el 6514 puede seguir con MED y AVER desactivados a máxima
+    velocidad.
+
+        stats = StreamStats(streamer.elements, thresholds=[1e-6])
+        pipeline.add_consumer(stats.add, lossless=True, name="estadisticas")
+    """
+
+    def __init__(self, elements="READ,TIME,STAT", interval=SUMMARY_INTERVAL, median_window=MEDIAN_WINDOW,
+                 thresholds=(), hysteresis=0.0, on_summary=None):
+        elements = elements.split(',') if isinstance(elements, str) else list(elements)
+        self.value_column = elements.index("READ")
+        self.time_column = elements.index("TIME") if "TIME" in elements else None
+        self.interval = interval
+        self.median = MovingMedian(median_window)
+        self.detectors = [ThresholdDetector(level, hysteresis) for level in thresholds]
+        self.total = RunningStats()
+        self.on_summary = on_summary
+        self.summaries = queue.Queue(MAX_SUMMARIES) if on_summary is None else None
+        self.dropped_summaries = 0
+        self._reset_window(None)
+
+    def _reset_window(self, start):
+        self.window = RunningStats()
+        self.window_start = start
+        self.window_events = []
+        self.window_values = []
+        self.window_filtered = None
+
+    def add(self, block):
+        """Procesa un bloque; emite los resúmenes de los intervalos que cierra"""
+        block = np.asarray(block, dtype=float)
+        if len(block) == 0:
+            return
+        values = block[:, self.value_column]
+        if self.time_column is not None:
+            t = block[:, self.time_column]
+        else:
+            t = np.full(len(values), time.perf_counter())
+
+        self.total.add(values)
+        filtered = self.median.filter(values)
+        ft = t[len(t) - len(filtered):]
+        for detector in self.detectors:
+            self.window_events += detector.check(filtered, ft)
+
+        if self.window_start is None:
+            self.window_start = float(t[0])
+        # Se reparte el bloque entre los intervalos que abarca
+        start = 0
+        while True:
+            end = self.window_start + self.interval
+            stop = int(np.searchsorted(t, end))
+            self.window.add(values[start:stop])
+            self.window_values.append(values[start:stop])
+            inside = (ft >= self.window_start) & (ft < end)
+            if inside.any():
+                self.window_filtered = float(filtered[inside][-1])
+            if stop == len(t):
+                break
+
+            leftover = self._emit(end)
+            # Tras un hueco largo el siguiente intervalo empieza donde vuelven los datos
+            self._reset_window(end + self.interval * float(np.floor((t[stop] - end) / self.interval)))
+            self.window_events = leftover
+            start = stop
+
+    def _emit(self, end):
+        """Emite el resumen del intervalo actual; devuelve los eventos posteriores a 'end'"""
+        leftover = [e for e in self.window_events if e["time"] >= end]
+        if self.window.count:
+            summary = {"start": self.window_start, "end": end, **self.window.summary(),
+                       "median": float(np.median(np.concatenate(self.window_values))),
+                       "filtered": self.window_filtered,
+                       "events": [e for e in self.window_events if e["time"] < end]}
+            if self.on_summary is not None:
+                self.on_summary(summary)
+            else:
+                self._put(summary)
+        return leftover
+
+    def _put(self, summary):
+        while True:
+            try:
+                self.summaries.put_nowait(summary)
+                return
+            except queue.Full:
+                try:
+                    self.summaries.get_nowait()
+                    self.dropped_summaries += 1
+                except queue.Empty:
+                    pass
+
+    def flush(self):
+        """Emite el intervalo a medias (al acabar la adquisición)"""
+        if self.window_start is not None:
+            self._emit(self.window_start + self.interval)
+            self._reset_window(None)
+
+    @property
+    def events(self):
+        return sorted((e for d in self.detectors for e in d.events), key=lambda e: e["time"])
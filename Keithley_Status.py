@@ -0,0 +1,101 @@
+import time
+import pyvisa
+from pyvisa import constants
+
+# Bit 6 del status byte (RQS/MSS): el instrumento pide servicio
+SRQ_BIT = 64
+
+# Bit 2 del status byte (EAV): hay errores en la cola SYST:ERR?
+EAV_BIT = 4
+
+# Sondeo de respaldo: se empieza rápido y se va espaciando hasta POLL_MAX
+POLL_MIN = 0.001  # segundos
+POLL_MAX = 0.2    # segundos
+
+# Evento VISA de petición de servicio, encolado para no perder uno que llegue entre esperas
+SRQ_EVENT = constants.EventType.service_request
+SRQ_MECHANISM = constants.EventMechanism.queue
+
+
+def poll_for_srq(read_stb, timeout=None, poll_min=POLL_MIN, poll_max=POLL_MAX):
+    """Sondea el status byte con espera creciente hasta que aparece SRQ (timeout None = sin límite)"""
+    deadline = None if timeout is None else time.perf_counter() + timeout
+    delay = poll_min
+    while True:
+        stb = read_stb()
+        if stb & SRQ_BIT:
+            return stb
+        if deadline is None:
+            time.sleep(delay)
+        else:
+            if time.perf_counter() >= deadline:
+                raise TimeoutError("SRQ no recibido en %.1f s" % timeout)
+            time.sleep(min(delay, max(deadline - time.perf_counter(), 0)))
+        delay = min(delay * 2, poll_max)
+
+
+def enable_srq_event(inst):
+    """Habilita la cola de eventos de SRQ; devuelve False si la interfaz no tiene eventos
+
+    Se hace una vez por sesión (VisaTransport) y no en cada espera: habilitar,
+    deshabilitar y vaciar la cola son llamadas a VISA en cada trigger.
+    """
+    try:
+        inst.enable_event(SRQ_EVENT, SRQ_MECHANISM)
+    except (pyvisa.errors.VisaIOError, NotImplementedError, AttributeError):
+        return False
+    return True
+
+
+def disable_srq_event(inst):
+    try:
+        inst.disable_event(SRQ_EVENT, SRQ_MECHANISM)
+        inst.discard_events(SRQ_EVENT, SRQ_MECHANISM)
+    except (pyvisa.errors.VisaIOError, NotImplementedError, AttributeError):
+        pass
+
+
+def wait_for_srq(inst, timeout=None, enabled=None):
+    """Espera el SRQ con eventos VISA, o sondeando con backoff si no hay eventos
+
+    enabled es lo que devolvió enable_srq_event() si el evento ya está
+    habilitado para toda la sesión; sin indicarlo se habilita solo durante
+    esta espera. timeout None = sin límite.
+    """
+    if enabled is None:
+        if not enable_srq_event(inst):
+            return poll_for_srq(lambda: inst.stb, timeout)
+        try:
+            return _wait_on_srq_event(inst, timeout)
+        finally:
+            disable_srq_event(inst)
+    if not enabled:
+        return poll_for_srq(lambda: inst.stb, timeout)
+    return _wait_on_srq_event(inst, timeout)
+
+
+def _wait_on_srq_event(inst, timeout):
+    deadline = None if timeout is None else time.perf_counter() + timeout
+    while True:
+        # Si el SRQ ya estaba activo antes de habilitar el evento no llegaría nunca.
+        # El serial poll además borra el RQS y confirma que la petición es de este
+        # instrumento y no de otro del mismo bus. Con el evento habilitado toda la
+        # sesión puede quedar en la cola uno ya atendido aquí: solo despierta una
+        # vez de más y se vuelve a comprobar.
+        stb = inst.stb
+        if stb & SRQ_BIT:
+            return stb
+
+        if deadline is None:
+            wait = constants.VI_TMO_INFINITE
+        else:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                raise TimeoutError("SRQ no recibido en %.1f s" % timeout)
+            wait = max(int(remaining * 1000), 1)
+        try:
+            inst.wait_on_event(SRQ_EVENT, wait)
+        except pyvisa.errors.VisaIOError as e:
+            if e.error_code == constants.StatusCode.error_timeout:
+                raise TimeoutError("SRQ no recibido en %.1f s" % timeout)
+            raise
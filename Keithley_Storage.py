@@ -0,0 +1,183 @@
+import json
+import os
+import numpy as np
+from Keithley_Capture import CaptureWriter, CaptureReader
+
+# HDF5 y Parquet son opcionales, solo hacen falta si se usa ese formato
+try:
+    import h5py
+except ImportError:
+    h5py = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Tamaño reservado para la cabecera del .npy, así se puede reescribir al cerrar
+NPY_HEADER_SIZE = 4096
+NPY_MAGIC = b"\x93NUMPY\x02\x00"
+
+
+def _npy_header(dtype, rows):
+    """Cabecera .npy (versión 2.0) de tamaño fijo NPY_HEADER_SIZE"""
+    header = "{'descr': %r, 'fortran_order': False, 'shape': (%d,), }" % (np.lib.format.dtype_to_descr(dtype), rows)
+    size = NPY_HEADER_SIZE - len(NPY_MAGIC) - 4
+    if len(header) + 1 > size:
+        raise ValueError("Cabecera .npy demasiado larga para este dtype")
+    header = header.ljust(size - 1) + "\n"
+    return NPY_MAGIC + np.uint32(size).tobytes() + header.encode("latin1")
+
+
+class NpyWriter:
+    """Escribe bloques en un .npy que crece; los metadatos van a un .json al lado"""
+
+    def __init__(self, path, dtype, metadata=None):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.rows = 0
+        self.file = open(path, "wb")
+        self.file.write(_npy_header(self.dtype, 0))
+        with open(path + ".json", "w") as f:
+            json.dump(metadata or {}, f, indent=2)
+
+    def write(self, block):
+        block = np.ascontiguousarray(block, dtype=self.dtype)
+        self.file.write(block.tobytes())
+        self.rows += len(block)
+
+    def close(self):
+        # Se reescribe la cabecera con el número real de filas
+        self.file.seek(0)
+        self.file.write(_npy_header(self.dtype, self.rows))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Hdf5Writer:
+    """Escribe bloques en un dataset HDF5 troceado y redimensionable"""
+
+    def __init__(self, path, dtype, metadata=None, dataset="data", chunk_rows=8192):
+        if h5py is None:
+            raise ImportError("Para guardar en HDF5 hace falta instalar h5py")
+        self.file = h5py.File(path, "w")
+        self.dset = self.file.create_dataset(dataset, shape=(0,), maxshape=(None,), dtype=np.dtype(dtype),
+                                             chunks=(chunk_rows,))
+        for key, value in (metadata or {}).items():
+            self.dset.attrs[key] = value if isinstance(value, (int, float, str)) else json.dumps(value)
+
+    def write(self, block):
+        n = self.dset.shape[0]
+        self.dset.resize((n + len(block),))
+        self.dset[n:] = block
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ParquetWriter:
+    """Escribe cada bloque como un row group de Parquet, metadatos en el esquema"""
+
+    def __init__(self, path, dtype, metadata=None):
+        if pq is None:
+            raise ImportError("Para guardar en Parquet hace falta instalar pyarrow")
+        self.dtype = np.dtype(dtype)
+        schema = pa.schema([(name, pa.from_numpy_dtype(self.dtype[name])) for name in self.dtype.names])
+        schema = schema.with_metadata({"keithley": json.dumps(metadata or {})})
+        self.writer = pq.ParquetWriter(path, schema)
+
+    def write(self, block):
+        self.writer.write_table(pa.table({name: block[name] for name in self.dtype.names}))
+
+    def close(self):
+        self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# Formato de salida según la extensión del fichero
+BACKENDS = {
+    ".npy": NpyWriter,
+    ".h5": Hdf5Writer,
+    ".hdf5": Hdf5Writer,
+    ".parquet": ParquetWriter,
+    ".cap": CaptureWriter,    # captura de solo-añadir para adquisiciones sin fin
+}
+
+
+def open_writer(path, dtype, metadata=None):
+    """Abre el escritor por bloques que corresponde a la extensión de path"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in BACKENDS:
+        raise Exception("Error formato de fichero no soportado: " + ext)
+    return BACKENDS[ext](path, dtype, metadata)
+
+
+def save(path, data, metadata=None):
+    """Guarda un array estructurado completo de una vez"""
+    with open_writer(path, data.dtype, metadata) as writer:
+        writer.write(data)
+
+
+def load(path):
+    """Carga un fichero guardado con este módulo, devuelve (datos, metadatos)"""
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy":
+        data = np.load(path, mmap_mode="r")
+        metadata = {}
+        if os.path.exists(path + ".json"):
+            with open(path + ".json") as f:
+                metadata = json.load(f)
+        return data, metadata
+
+    if ext == ".cap":
+        reader = CaptureReader(path)
+        return reader.data, reader.metadata
+
+    if ext in (".h5", ".hdf5"):
+        if h5py is None:
+            raise ImportError("Para leer HDF5 hace falta instalar h5py")
+        with h5py.File(path, "r") as f:
+            return f["data"][:], dict(f["data"].attrs)
+
+    if ext == ".parquet":
+        if pq is None:
+            raise ImportError("Para leer Parquet hace falta instalar pyarrow")
+        table = pq.read_table(path)
+        data = np.empty(table.num_rows, dtype=[(c, table[c].type.to_pandas_dtype()) for c in table.column_names])
+        for c in table.column_names:
+            data[c] = table[c].to_numpy()
+        metadata = json.loads(table.schema.metadata.get(b"keithley", b"{}"))
+        return data, metadata
+
+    raise Exception("Error formato de fichero no soportado: " + ext)
+
+
+def export_csv(path, columns, headers):
+    """Exporta columnas a CSV (solo para compartir, no en el camino rápido)"""
+    np.savetxt(path, np.column_stack(columns), delimiter=',', header=','.join(headers), comments='', fmt='%.10g')
+
+
+def export_csv_blocks(path, blocks, headers):
+    """Como export_csv pero con las columnas por trozos, para capturas que no caben en memoria"""
+    with open(path, 'w') as f:
+        f.write(','.join(headers) + '\n')
+        for columns in blocks:
+            np.savetxt(f, np.column_stack(columns), delimiter=',', fmt='%.10g')
@@ -0,0 +1,250 @@
+import time
+import numpy as np
+from Keithley_Status import POLL_MIN, POLL_MAX
+
+# Bits del registro de eventos de medida (STAT:MEAS)
+BHF = 256   # Buffer Half Full
+BFL = 512   # Buffer Full
+
+# Un salto de timestamp mayor que (1 + GAP_TOLERANCE) periodos se considera hueco
+GAP_TOLERANCE = 0.5
+
+# Lecturas mínimas por trozo en la descarga por trozos de un buffer que se está llenando
+CHUNK_SIZE = 500
+
+
+class GapDetector:
+    """Detecta huecos en la secuencia de timestamps entre bloques consecutivos"""
+
+    def __init__(self, period=None, tolerance=GAP_TOLERANCE):
+        self.period = period
+        self.tolerance = tolerance
+        self.last = None
+        self.samples = 0
+        self.gaps = []
+
+    def check(self, timestamps):
+        """Revisa un bloque de timestamps y devuelve los huecos nuevos"""
+        timestamps = np.asarray(timestamps, dtype=float)
+        if len(timestamps) == 0:
+            return []
+
+        if self.period is None and len(timestamps) > 1:
+            self.period = float(np.median(np.diff(timestamps)))
+
+        if self.last is None:
+            t = timestamps
+            offset = self.samples
+        else:
+            t = np.concatenate(([self.last], timestamps))
+            offset = self.samples - 1
+
+        new = []
+        if self.period:
+            d = np.diff(t)
+            # Saltos demasiado largos = lecturas perdidas; saltos hacia atrás = el
+            # instrumento ha sobrescrito datos antes de que los descargáramos
+            for i in np.nonzero((d > self.period * (1 + self.tolerance)) | (d <= 0))[0]:
+                missing = int(round(d[i] / self.period)) - 1 if d[i] > 0 else None
+                new.append({"index": int(offset + i + 1), "start": float(t[i]),
+                            "end": float(t[i + 1]), "missing": missing})
+
+        self.gaps += new
+        self.last = float(timestamps[-1])
+        self.samples += len(timestamps)
+        return new
+
+
+class Streamer:
+    """Adquisición continua con doble buffer sobre el buffer circular del 6514
+
+    El buffer se usa en modo FEED:CONT ALW partido en dos mitades. Con SRQ en
+    BHF y BFL se descarga una mitad mientras el instrumento sigue llenando la
+    otra, así el llenado y la descarga se solapan y no se para la medida.
+
+    device es un Keithley_6514.Keithley6514 (o cualquier objeto con write,
+    query, wait_for_srq y fetch), así funciona igual por GPIB y por RS-232.
+    """
+
+    def __init__(self, device, buffer_size=2500, elements="READ,TIME,STAT", fmt="sreal", timeout=60.0):
+        self.device = device
+        self.buffer_size = buffer_size - buffer_size % 2
+        self.elements = elements.split(',')
+        self.fmt = fmt
+        self.timeout = timeout
+        self.detector = GapDetector()
+        self.blocks_read = 0
+        self.running = False
+        half = self.buffer_size // 2
+        self.windows = {BHF: (1, half), BFL: (half + 1, self.buffer_size)}
+        self.time_column = self.elements.index("TIME") if "TIME" in self.elements else None
+        self.reset()
+
+    @property
+    def gaps(self):
+        return self.detector.gaps
+
+    def commands(self):
+        """Comandos de buffer y estado necesarios para el modo continuo"""
+        return [
+            "TRAC:CLE",
+            f"TRAC:POIN {self.buffer_size}",
+            "TRAC:TST:FORM ABS",              # timestamps desde el inicio, continuos entre vueltas
+            "TRAC:FEED SENS;FEED:CONT ALW",   # buffer circular
+        ] + self.rearm_commands()
+
+    def rearm_commands(self):
+        """Parte de commands() que se puede repetir tras un device clear sin borrar el buffer"""
+        return [
+            "TRIG:COUN INF",
+            f"FORM:ELEM {','.join(self.elements)}",
+            f"STAT:MEAS:ENAB {BHF | BFL}",
+            "*SRE 1",
+        ]
+
+    # Máquina de estados del doble buffer, sin E/S: blocks() la usa con el driver
+    # síncrono y Keithley_Async con el asíncrono. Tras cada SRQ se pasa STAT:MEAS?
+    # a on_status(), next_window() dice qué mitad descargar y accept() la convierte.
+
+    def reset(self):
+        """Vuelve al estado inicial (se espera primero la mitad baja)"""
+        self.expected = BHF
+        self.pending = 0
+
+    def on_status(self, meas_status):
+        """Anota las mitades listas según el valor leído de STAT:MEAS?"""
+        self.pending |= meas_status & (BHF | BFL)
+
+    def next_window(self):
+        """Ventana (first, last) de la próxima mitad a descargar, None si hay que esperar al SRQ"""
+        if not self.pending:
+            return None
+        if not self.pending & self.expected:
+            # Se ha perdido una mitad entera; el detector de huecos lo reportará
+            self.expected = BFL if self.expected == BHF else BHF
+        self.pending &= ~self.expected
+        return self.windows[self.expected]
+
+    def fetch_args(self, window):
+        """Argumentos de fetch() para descargar la ventana (número de valores, comando, formato)"""
+        first, last = window
+        return (last - first + 1) * len(self.elements), f"TRAC:DATA? {first},{last}", self.fmt
+
+    def accept(self, values):
+        """Bloque (lecturas x elementos) de la descarga de next_window(), en orden y sin repetidos"""
+        block = np.asarray(values).reshape(-1, len(self.elements))
+        self.blocks_read += 1
+        if self.time_column is not None:
+            block = self._in_order(block, self.time_column)
+            self.detector.check(block[:, self.time_column])
+        self.expected = BFL if self.expected == BHF else BHF
+        return block
+
+    def _in_order(self, block, time_column):
+        """Ordena el bloque y quita lo ya entregado si el instrumento nos ha adelantado"""
+        t = block[:, time_column]
+        if np.any(np.diff(t) <= 0):
+            block = block[np.argsort(t, kind="stable")]
+        if self.detector.last is not None:
+            block = block[block[:, time_column] > self.detector.last]
+        return block
+
+    def drain(self):
+        """Lo que quedó en el buffer sin descargar tras un corte, con el instrumento parado
+
+        Se leen las dos mitades empezando por la que tocaba (sin pasar de
+        TRAC:POIN:ACT? en la primera vuelta) y se quita lo ya entregado, así
+        que hace falta TIME en los elementos; sin él no se recupera nada.
+        Deja la máquina de estados esperando el próximo SRQ: blocks(resume=True)
+        sigue desde aquí sin TRAC:CLE.
+        """
+        n = len(self.elements)
+        self.pending = 0
+        if self.time_column is None:
+            return np.empty((0, n))
+
+        stored = int(self.device.query("TRAC:POIN:ACT?"))
+        other = BFL if self.expected == BHF else BHF
+        parts = []
+        for first, last in (self.windows[self.expected], self.windows[other]):
+            last = min(last, stored)
+            if first <= last:
+                parts.append(np.asarray(self.device.fetch(*self.fetch_args((first, last)))).reshape(-1, n))
+        if not parts:
+            return np.empty((0, n))
+
+        block = self._in_order(np.concatenate(parts), self.time_column)
+        self.detector.check(block[:, self.time_column])
+        return block
+
+    def blocks(self, resume=False):
+        """Generador de bloques de medio buffer, en orden y sin pausas de medida
+
+        Con resume=True se sigue con el estado actual (tras drain()) en lugar
+        de empezar por la mitad baja.
+        """
+        if not resume:
+            self.reset()
+        self.device.write("INIT")
+        self.running = True
+        try:
+            while self.running:
+                window = self.next_window()
+                if window is None:
+                    self.device.wait_for_srq(self.timeout)
+                    # Leer STAT:MEAS? borra el registro y libera la línea SRQ
+                    self.on_status(int(self.device.query("STAT:MEAS?")))
+                    continue
+
+                block = self.accept(self.device.fetch(*self.fetch_args(window)))
+                if len(block):
+                    yield block
+        finally:
+            # El ABOR lo envía siempre el hilo que hace la E/S, también al cerrar el generador
+            self.running = False
+            self.device.write("ABOR")
+
+    def stop(self):
+        """Pide parar la adquisición al acabar el bloque en curso"""
+        self.running = False
+
+
+def fetch_chunks(device, samples, elements="READ,TIME,STAT", chunk=CHUNK_SIZE, timeout=60.0):
+    """Descarga un buffer FEED:CONT NEXT por ventanas TRAC:DATA? a,b mientras se llena
+
+    Se consulta TRAC:POIN:ACT? y en cuanto hay 'chunk' lecturas nuevas (o
+    las que faltan para acabar) se descargan y se entregan como array
+    (lecturas x elementos). Cada descarga es pequeña, así no hay que subir
+    el timeout de la E/S aunque el buffer sea grande, y se puede procesar y
+    guardar mientras el instrumento sigue midiendo. timeout es el tiempo
+    máximo sin que el buffer avance. device es un Keithley6514 ya iniciado.
+    """
+    n = len(elements.split(',')) if isinstance(elements, str) else len(elements)
+    done = 0
+    seen = 0
+    t_start = time.perf_counter()
+    last_progress = t_start
+    delay = POLL_MIN
+    while done < samples:
+        stored = min(int(device.query("TRAC:POIN:ACT?")), samples)
+        now = time.perf_counter()
+        if stored > seen:
+            # El buffer avanza aunque aún no haya un trozo entero que descargar
+            seen = stored
+            last_progress = now
+        needed = min(chunk, samples - done)
+        if stored - done >= needed:
+            values = device.fetch((stored - done) * n, f"TRAC:DATA? {done + 1},{stored}")
+            yield values.reshape(-1, n)
+            done = stored
+            delay = POLL_MIN
+            continue
+
+        if now - last_progress > timeout:
+            raise Exception("Error el buffer no avanza en %.1f s (%d de %d lecturas)" % (timeout, stored, samples))
+        if stored:
+            # Espera estimada con el ritmo de llenado medido hasta ahora
+            delay = (needed - (stored - done)) * (now - t_start) / stored
+        else:
+            delay = min(delay * 2, POLL_MAX)
+        time.sleep(min(max(delay, POLL_MIN), POLL_MAX * 5))
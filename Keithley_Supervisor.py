@@ -0,0 +1,173 @@
+import time
+import numpy as np
+import pyvisa
+import serial
+from Keithley_Data import TransferError
+
+# Fallos de la capa de transporte que se consideran transitorios (bus, timeout,
+# respuesta corrupta) y se recuperan; los demás errores paran la adquisición
+TRANSIENT_ERRORS = (TimeoutError, TransferError, pyvisa.errors.VisaIOError, serial.SerialException)
+
+# Intentos de recuperación seguidos antes de dar la adquisición por perdida
+MAX_RETRIES = 5
+
+# Espera antes de cada intento, se dobla en cada fallo hasta RETRY_MAX
+RETRY_DELAY = 0.5  # segundos
+RETRY_MAX = 30.0   # segundos
+
+
+class Supervisor:
+    """Adquisición continua vigilada para capturas largas sin nadie delante
+
+    Envuelve el Streamer de Keithley_Stream: si falla la E/S (timeout, error
+    del bus, datos corruptos) hace device clear, descarga lo que quedaba en
+    el buffer desde la última mitad entregada, vuelve a armar el modo
+    continuo (Streamer.rearm_commands(), sin *RST ni TRAC:CLE) y sigue con
+    el mismo Streamer, con un número acotado de intentos seguidos y espera
+    creciente entre ellos. config (con el *RST) solo se envía al empezar y
+    si el instrumento ha perdido la configuración (un apagado). Cada corte
+    queda registrado en self.gaps con las lecturas que faltan entre la
+    última entregada y la primera tras reanudar; ahí también se añaden los
+    huecos por desbordamiento del buffer que detecta el Streamer.
+
+    Los timestamps entregados son continuos: si al reanudar el instrumento
+    ha vuelto a empezar su reloj (configuración perdida y reenviada), se
+    enlazan con el tiempo del PC transcurrido durante el corte.
+    """
+
+    def __init__(self, keithley, config, buffer_size=2500, timeout=60.0, max_retries=MAX_RETRIES,
+                 retry_delay=RETRY_DELAY, on_fault=None):
+        self.keithley = keithley
+        self.config = list(config)
+        self.buffer_size = buffer_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.on_fault = on_fault
+        self.elements = keithley.elements.split(',')
+        self.time_column = self.elements.index("TIME") if "TIME" in self.elements else None
+
+        self.streamer = None
+        self.base = 0            # lecturas entregadas antes del Streamer actual
+        self.seen = 0            # huecos del Streamer actual ya anotados
+        self.running = False
+        self.committed = 0       # lecturas entregadas en total
+        self.offset = 0.0        # desplazamiento de los timestamps del instrumento
+        self.last_t = None
+        self.last_pc = None
+        self.period = None
+        self.pending_gap = None
+        self.gaps = []
+        self.faults = 0
+
+    def _new_streamer(self):
+        self.streamer = self.keithley.streamer(self.buffer_size, self.timeout)
+        self.base = self.committed
+        self.seen = 0
+
+    def recover(self, error):
+        """Device clear y rearme, con reintentos
+
+        Devuelve las lecturas que quedaban en el buffer sin descargar, o None
+        si el instrumento había perdido la configuración y se ha enviado
+        config entera con un Streamer nuevo.
+        """
+        delay = self.retry_delay
+        for attempt in range(1, self.max_retries + 1):
+            time.sleep(delay)
+            try:
+                self.keithley.transport.clear()
+                if self.keithley.query("TRAC:FEED:CONT?").strip() != "ALW":
+                    # Configuración perdida: se empieza de cero
+                    self.keithley.configurator.clear()
+                    self.keithley.configure(self.config)
+                    self._new_streamer()
+                    return None
+                # El clear para la medida pero el buffer se conserva: primero lo
+                # pendiente, luego *CLS (eventos y errores del corte) y rearme
+                leftover = self.streamer.drain()
+                self.keithley.configure(["*CLS"] + self.streamer.rearm_commands())
+                return leftover
+            except TRANSIENT_ERRORS as e:
+                error = e
+                delay = min(delay * 2, RETRY_MAX)
+        raise Exception("Error no se recupera el 6514 tras %d intentos: %r" % (self.max_retries, error))
+
+    def _commit(self, block):
+        """Aplica el desplazamiento de tiempo, cierra el corte pendiente y anota los huecos"""
+        block = np.array(block, dtype=float)
+        if self.time_column is not None:
+            t = block[:, self.time_column]
+            if self.pending_gap is not None and self.last_t is not None and t[0] + self.offset <= self.last_t:
+                # El reloj del instrumento ha vuelto a empezar: se continúa con el tiempo del PC
+                self.offset = self.last_t + (time.perf_counter() - self.last_pc) - t[0]
+            t += self.offset
+
+            fault_index = None
+            if self.pending_gap is not None:
+                gap = self.pending_gap
+                gap["end"] = float(t[0])
+                if self.period:
+                    gap["missing"] = max(int(round((gap["end"] - gap["start"]) / self.period)) - 1, 0)
+                self.gaps.append(gap)
+                fault_index = gap["index"]
+                self.pending_gap = None
+
+            for gap in self.streamer.detector.gaps[self.seen:]:
+                if self.base + gap["index"] == fault_index:
+                    continue   # el mismo corte, ya anotado
+                self.gaps.append(dict(gap, index=self.base + gap["index"], start=gap["start"] + self.offset,
+                                      end=gap["end"] + self.offset, reason="overrun"))
+            self.seen = len(self.streamer.detector.gaps)
+            self.period = self.streamer.detector.period or self.period
+            self.last_t = float(t[-1])
+        elif self.pending_gap is not None:
+            self.gaps.append(self.pending_gap)
+            self.pending_gap = None
+
+        self.last_pc = time.perf_counter()
+        self.committed += len(block)
+        return block
+
+    def blocks(self):
+        """Generador de bloques como Streamer.blocks(), que sobrevive a fallos transitorios"""
+        self.running = True
+        self.keithley.configure(self.config)
+        self._new_streamer()
+        resume = False
+        retries = 0
+        while self.running:
+            stream = self.streamer.blocks(resume)
+            try:
+                for block in stream:
+                    block = self._commit(block)
+                    retries = 0
+                    if len(block):
+                        yield block
+                return
+            except TRANSIENT_ERRORS as e:
+                error = e
+                retries += 1
+                self.faults += 1
+                if self.on_fault is not None:
+                    self.on_fault(e, retries)
+                if retries > self.max_retries:
+                    raise Exception("Error la adquisición ha fallado %d veces seguidas: %r" % (retries, e))
+                leftover = self.recover(e)
+            finally:
+                stream.close()
+
+            resume = leftover is not None
+            if resume and len(leftover):
+                leftover = self._commit(leftover)
+                yield leftover
+            if self.pending_gap is None:
+                start = self.last_t if self.last_t is not None else 0.0
+                self.pending_gap = {"index": self.committed, "start": start, "end": None,
+                                    "missing": None, "reason": "fault", "error": repr(error)}
+
+    def stop(self):
+        """Pide parar al acabar el bloque en curso"""
+        self.running = False
+        if self.streamer is not None:
+            self.streamer.stop()
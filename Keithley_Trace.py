@@ -0,0 +1,216 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+import numpy as np
+
+# Intervalos del histograma de latencias: logarítmicos de 1 µs a 100 s, 10 por década
+HIST_EDGES = np.logspace(-6, 2, 81)
+
+# Máximo de eventos guardados para la traza; los siguientes solo cuentan en el histograma
+MAX_EVENTS = 1000000
+
+# Longitud máxima del nombre de comando usado como clave del histograma
+MAX_KEY_LEN = 60
+
+# Métodos del driver que se registran como tramos (incluyen la E/S que hacen dentro)
+DRIVER_SPANS = ("configure", "fetch", "acquire", "read_triggered")
+
+
+def trace_key(message):
+    """Cabeceras del mensaje sin argumentos: ':TRAC:DATA? 1,1250' -> 'TRAC:DATA?'"""
+    headers = [part.strip().split(None, 1)[0].lstrip(":") for part in message.split(";") if part.strip()]
+    key = ";".join(headers)
+    return key if len(key) <= MAX_KEY_LEN else key[:MAX_KEY_LEN - 3] + "..."
+
+
+def is_timeout(error):
+    # pyvisa avisa con VisaIOError (VI_ERROR_TMO), pyserial y el simulador con TimeoutError
+    return isinstance(error, TimeoutError) or "timeout" in str(error).lower() or "TMO" in str(error)
+
+
+class Tracer:
+    """Registro de tiempos de cada transacción y tramo: histograma y traza
+
+    Por cada clave (operación y comando) acumula número de llamadas, tiempo
+    total y máximo, bytes, timeouts e histograma de latencias; además guarda
+    los eventos para exportarlos como traza de Chrome (chrome://tracing o
+    https://ui.perfetto.dev). Se puede usar desde varios hilos.
+    """
+
+    def __init__(self, max_events=MAX_EVENTS):
+        self.max_events = max_events
+        self.t0 = time.perf_counter()
+        self.stats = {}
+        self.events = []
+        self.dropped = 0
+        self.lock = threading.Lock()
+
+    def record(self, category, name, start, duration, nbytes=0, error=None):
+        """Anota una transacción o tramo ya medido (start en perf_counter)"""
+        timeout = error is not None and is_timeout(error)
+        with self.lock:
+            key = (category, name)
+            s = self.stats.get(key)
+            if s is None:
+                s = self.stats[key] = {"count": 0, "total": 0.0, "max": 0.0, "bytes": 0, "timeouts": 0,
+                                       "errors": 0, "hist": np.zeros(len(HIST_EDGES) + 1, dtype=np.int64)}
+            s["count"] += 1
+            s["total"] += duration
+            s["max"] = max(s["max"], duration)
+            s["bytes"] += nbytes
+            s["timeouts"] += timeout
+            s["errors"] += error is not None and not timeout
+            s["hist"][np.searchsorted(HIST_EDGES, duration)] += 1
+
+            if len(self.events) < self.max_events:
+                self.events.append((category, name, start, duration, nbytes,
+                                    None if error is None else repr(error), threading.get_ident()))
+            else:
+                self.dropped += 1
+
+    @contextmanager
+    def span(self, name, category="span"):
+        """Tramo de código de usuario: with tracer.span("parse"): ..."""
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self.record(category, name, start, time.perf_counter() - start, error=error)
+
+    def wrap(self, fn, name, category="span"):
+        """Devuelve fn registrada como tramo"""
+        @wraps(fn)
+        def traced(*args, **kwargs):
+            with self.span(name, category):
+                return fn(*args, **kwargs)
+        return traced
+
+    # ------------------------------------------------------------ resultados
+
+    @staticmethod
+    def _percentile(hist, count, q):
+        # Borde superior del intervalo del histograma donde cae el percentil
+        i = int(np.searchsorted(np.cumsum(hist), q * count))
+        return float(HIST_EDGES[min(i, len(HIST_EDGES) - 1)])
+
+    def summary(self):
+        """Estadísticas por (categoría, comando), ordenadas por tiempo total"""
+        with self.lock:
+            items = [(k, dict(s)) for k, s in self.stats.items()]
+        out = []
+        for (category, name), s in sorted(items, key=lambda item: -item[1]["total"]):
+            out.append({"category": category, "name": name, "count": s["count"], "total": s["total"],
+                        "mean": s["total"] / s["count"], "p50": self._percentile(s["hist"], s["count"], 0.5),
+                        "p95": self._percentile(s["hist"], s["count"], 0.95), "max": s["max"],
+                        "bytes": s["bytes"], "timeouts": s["timeouts"], "errors": s["errors"]})
+        return out
+
+    def print_summary(self, top=20):
+        print(f"{'categoría':<10} {'comando':<28} {'n':>7} {'total s':>9} {'media ms':>9} "
+              f"{'p50 ms':>8} {'p95 ms':>8} {'máx ms':>8} {'bytes':>10} {'t/o':>4}")
+        for s in self.summary()[:top]:
+            print(f"{s['category']:<10} {s['name'][:28]:<28} {s['count']:>7} {s['total']:>9.3f} "
+                  f"{s['mean'] * 1000:>9.3f} {s['p50'] * 1000:>8.3f} {s['p95'] * 1000:>8.3f} "
+                  f"{s['max'] * 1000:>8.3f} {s['bytes']:>10} {s['timeouts']:>4}")
+        if self.dropped:
+            print(f"Eventos no guardados en la traza (MAX_EVENTS): {self.dropped}")
+
+    def write_chrome_trace(self, path):
+        """Guarda los eventos en formato Chrome trace (JSON, tiempos en µs)"""
+        with self.lock:
+            events = list(self.events)
+        pid = os.getpid()
+        trace = []
+        for category, name, start, duration, nbytes, error, tid in events:
+            args = {"bytes": nbytes}
+            if error is not None:
+                args["error"] = error
+            trace.append({"name": name, "cat": category, "ph": "X", "pid": pid, "tid": tid,
+                          "ts": (start - self.t0) * 1e6, "dur": duration * 1e6, "args": args})
+        with open(path, "w") as f:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, f)
+
+
+class TracingTransport:
+    """Transporte de Keithley_Transport instrumentado: mide cada write/query/lectura/SRQ
+
+    Tiene la misma interfaz que el transporte que envuelve; el resto de
+    atributos (inst, ser, negotiate_baud...) se pasan tal cual.
+    """
+
+    def __init__(self, transport, tracer):
+        self.transport = transport
+        self.tracer = tracer
+
+    def __getattr__(self, name):
+        return getattr(self.transport, name)
+
+    def _timed(self, category, name, fn, *args, nbytes=None):
+        start = time.perf_counter()
+        try:
+            result = fn(*args)
+        except Exception as e:
+            # Sin respuesta no se puede calcular el tamaño con nbytes(result)
+            size = 0 if callable(nbytes) else (nbytes or 0)
+            self.tracer.record(category, name, start, time.perf_counter() - start, size, e)
+            raise
+        size = nbytes(result) if callable(nbytes) else (nbytes or 0)
+        self.tracer.record(category, name, start, time.perf_counter() - start, size)
+        return result
+
+    def write(self, cmd):
+        self._timed("write", trace_key(cmd), self.transport.write, cmd, nbytes=len(cmd) + 1)
+
+    def query(self, cmd):
+        return self._timed("query", trace_key(cmd), self.transport.query, cmd,
+                           nbytes=lambda response: len(cmd) + 1 + len(response) + 1)
+
+    def read_line(self):
+        return self._timed("read", "read_line", self.transport.read_line, nbytes=len)
+
+    def read_bytes(self, n):
+        return self._timed("read", "read_bytes", self.transport.read_bytes, n, nbytes=len)
+
+    def read_ascii(self, count=None):
+        return self._timed("read", "read_ascii", self.transport.read_ascii, count)
+
+    def read_stb(self):
+        return self._timed("stb", "read_stb", self.transport.read_stb)
+
+    def assert_trigger(self):
+        self._timed("trigger", "assert_trigger", self.transport.assert_trigger)
+
+    def wait_for_srq(self, timeout=None):
+        return self._timed("srq", "wait_for_srq", self.transport.wait_for_srq, timeout)
+
+    def clear(self):
+        self._timed("clear", "clear", self.transport.clear)
+
+    def close(self):
+        self.transport.close()
+
+
+def trace(keithley, tracer=None, spans=DRIVER_SPANS):
+    """Activa el registro en un Keithley_6514.Keithley6514 ya abierto y devuelve el Tracer
+
+    Se envuelve el transporte (también el que usa el configurador) y los
+    métodos del driver de 'spans', así en la traza la descarga queda dentro
+    de 'fetch' y la diferencia es el tiempo de conversión de los datos. Si
+    ya estaba activado devuelve el Tracer existente.
+    """
+    if isinstance(keithley.transport, TracingTransport):
+        return keithley.transport.tracer
+    tracer = tracer or Tracer()
+    keithley.transport = TracingTransport(keithley.transport, tracer)
+    keithley.configurator.write = keithley.transport.write
+    keithley.configurator.query = keithley.transport.query
+    for name in spans:
+        setattr(keithley, name, tracer.wrap(getattr(keithley, name), name))
+    return tracer
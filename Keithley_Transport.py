@@ -0,0 +1,265 @@
+import time
+import pyvisa
+import serial
+from Keithley_Data import read_exact, read_line, read_ascii, AsciiParser
+from Keithley_Config import read_errors
+from Keithley_Status import wait_for_srq, poll_for_srq, enable_srq_event, disable_srq_event
+from Keithley_Sim import SimulatedResourceManager, SerialSimulator
+
+# Parámetros por defecto del puerto RS-232 del 6514 (los de SerialTest2)
+SERIAL_SETTINGS = {"baudrate": 9600, "parity": serial.PARITY_EVEN, "bytesize": serial.EIGHTBITS,
+                   "stopbits": serial.STOPBITS_ONE, "timeout": 2}
+
+# Velocidades RS-232 que admite el 6514, de mayor a menor
+BAUD_RATES = [57600, 38400, 19200, 9600, 4800, 2400, 1200, 600, 300]
+
+# Pausa tras SYST:COMM:SER:BAUD para que el 6514 cambie de velocidad
+BAUD_SETTLE = 0.1  # segundos
+
+# Consultas *IDN? por mensaje al medir la velocidad real (respuesta de ~600 bytes)
+THROUGHPUT_QUERIES = 10
+
+# Fracción mínima de la velocidad teórica para dar por bueno el enlace
+MIN_EFFICIENCY = 0.5
+
+# ResourceManager abiertos, uno real y uno simulado; cargar la librería VISA
+# cuesta bastante más que abrir un recurso, así que se reutilizan
+_resource_managers = {}
+
+
+class VisaTransport:
+    """Transporte sobre un recurso pyvisa (GPIB, USB-GPIB, o el simulador)
+
+    Interfaz común de los transportes: write, query, read_line, read_bytes,
+    read_ascii, read_stb, assert_trigger, wait_for_srq, clear y close. read_line
+    y read_bytes devuelven bytes, read_ascii un array con la respuesta ASCII convertida.
+    """
+
+    def __init__(self, inst):
+        self.inst = inst
+        self.srq_events = None   # evento de SRQ habilitado (se decide en la primera espera)
+
+    def write(self, cmd):
+        self.inst.write(cmd)
+
+    def query(self, cmd):
+        return self.inst.query(cmd).strip()
+
+    def read_line(self):
+        # read_raw lee hasta el final del mensaje (EOI o terminador)
+        return self.inst.read_raw()
+
+    def read_bytes(self, n):
+        return self.inst.read_bytes(n)
+
+    def read_ascii(self, count=None):
+        # read_raw acaba con EOI, la respuesta llega completa
+        parser = AsciiParser(count)
+        parser.feed(self.inst.read_raw().rstrip(b"\r\n") + b"\n")
+        return parser.values()
+
+    def read_stb(self):
+        return self.inst.stb
+
+    def assert_trigger(self):
+        """GET (Group Execute Trigger) al instrumento"""
+        self.inst.assert_trigger()
+
+    def wait_for_srq(self, timeout=None):
+        """SRQ por evento VISA (con sondeo de respaldo); el evento queda habilitado hasta close()"""
+        if self.srq_events is None:
+            self.srq_events = enable_srq_event(self.inst)
+        return wait_for_srq(self.inst, timeout, self.srq_events)
+
+    def clear(self):
+        """Device clear (SDC): vacía la salida del instrumento y aborta lo pendiente"""
+        self.inst.clear()
+
+    def close(self):
+        if self.srq_events:
+            disable_srq_event(self.inst)
+        self.inst.close()
+
+
+class SerialTransport:
+    """Transporte sobre pyserial; los comandos acaban en CR y las respuestas en LF
+
+    Las lecturas se paran en el terminador o al completar el número de bytes
+    pedido, nunca esperan a que venza el timeout.
+    """
+
+    def __init__(self, ser, simulator=None):
+        self.ser = ser
+        self.simulator = simulator
+
+    def write(self, cmd):
+        self.ser.write((cmd + '\r').encode())
+
+    def query(self, cmd):
+        self.write(cmd)
+        return self.read_line().decode().strip()
+
+    def read_line(self):
+        return read_line(self.ser)
+
+    def read_bytes(self, n):
+        return read_exact(self.ser, n)
+
+    def read_ascii(self, count=None):
+        """Convierte la respuesta a medida que llega, sin esperar al terminador"""
+        return read_ascii(lambda: self.ser.read(max(self.ser.in_waiting, 1)), count)
+
+    def read_stb(self):
+        try:
+            return int(self.query("*STB?"))
+        except ValueError:
+            # Respuesta vacía o corrupta: sin bits, se vuelve a sondear
+            return 0
+
+    def assert_trigger(self):
+        """Sin GET por RS-232: *TRG es el trigger de bus equivalente"""
+        self.write("*TRG")
+
+    def wait_for_srq(self, timeout=None):
+        """Por RS-232 no hay línea SRQ: se sondea *STB? con espera creciente"""
+        return poll_for_srq(self.read_stb, timeout)
+
+    def clear(self):
+        """Sin DCL por RS-232: se descarta lo pendiente en ambos sentidos"""
+        self.ser.reset_output_buffer()
+        self.ser.reset_input_buffer()
+
+    def close(self):
+        self.ser.close()
+        if self.simulator is not None:
+            self.simulator.close()
+
+    # ------------------------------------------------------------ velocidad
+
+    def char_bits(self):
+        """Bits por carácter en la línea: inicio + datos + paridad + parada"""
+        parity = 0 if self.ser.parity == serial.PARITY_NONE else 1
+        return 1 + self.ser.bytesize + parity + self.ser.stopbits
+
+    def identify(self):
+        """Comprueba el enlace con un *IDN? y devuelve la respuesta"""
+        # El CR previo cierra cualquier resto de basura en la entrada del 6514
+        self.ser.write(b'\r')
+        self.ser.reset_input_buffer()
+        idn = self.query("*IDN?")
+        if "6514" not in idn:
+            raise ValueError("Respuesta *IDN? inesperada: %r" % idn)
+        return idn
+
+    def measure_throughput(self, queries=THROUGHPUT_QUERIES):
+        """Bytes por segundo reales recibidos en una respuesta larga"""
+        t0 = time.perf_counter()
+        self.write(";".join(["*IDN?"] * queries))
+        data = self.read_line()
+        return len(data) / (time.perf_counter() - t0)
+
+    def _set_port_baud(self, baud):
+        # pyserial reconfigura el puerto abierto al cambiar baudrate; se evita
+        # reconfigurar a la misma velocidad (algunos drivers lo rechazan)
+        if self.ser.baudrate != baud:
+            self.ser.baudrate = baud
+
+    def _switch(self, baud, port_baud=None):
+        """Envía SYST:COMM:SER:BAUD (a port_baud, por defecto la actual) y ajusta el puerto"""
+        if port_baud is not None:
+            self._set_port_baud(port_baud)
+        self.write(f"SYST:COMM:SER:BAUD {baud}")
+        self.ser.flush()   # el comando tiene que salir entero a la velocidad antigua
+        time.sleep(BAUD_SETTLE)
+        self._set_port_baud(baud)
+        self.ser.reset_input_buffer()
+
+    def find_baud(self, rates=BAUD_RATES):
+        """Busca la velocidad a la que está el 6514 (la guarda al apagarse)"""
+        for baud in [self.ser.baudrate] + [r for r in rates if r != self.ser.baudrate]:
+            self._set_port_baud(baud)
+            try:
+                self.identify()
+            except (TimeoutError, ValueError):
+                continue
+            # Lo recibido a otra velocidad ha dejado errores en la cola
+            read_errors(self.query)
+            return baud
+        raise Exception("Error no responde el 6514 por RS-232 a ninguna velocidad")
+
+    def negotiate_baud(self, rates=BAUD_RATES, min_efficiency=MIN_EFFICIENCY):
+        """Sube el 6514 y el puerto a la mayor velocidad que funcione
+
+        Cada velocidad se verifica con *IDN? y midiendo los bytes/s reales; si
+        falla o rinde menos de min_efficiency de lo teórico se vuelve a la
+        velocidad de partida antes de probar la siguiente. Devuelve un resumen.
+        """
+        original = self.find_baud(rates)
+        result = {"original": original, "tried": []}
+        for baud in rates:
+            if baud <= original:
+                break
+            self._switch(baud)
+            try:
+                self.identify()
+                bps = self.measure_throughput()
+                efficiency = bps * self.char_bits() / baud
+                result["tried"].append({"baudrate": baud, "bytes_per_second": bps, "efficiency": efficiency})
+                if efficiency >= min_efficiency:
+                    read_errors(self.query)
+                    result.update(baudrate=baud, bytes_per_second=bps, efficiency=efficiency)
+                    return result
+            except (TimeoutError, ValueError) as e:
+                result["tried"].append({"baudrate": baud, "error": str(e)})
+            self._fall_back(original, baud)
+
+        bps = self.measure_throughput()
+        result.update(baudrate=original, bytes_per_second=bps, efficiency=bps * self.char_bits() / original)
+        return result
+
+    def _fall_back(self, original, failed):
+        """Vuelve a la velocidad original tanto si el 6514 llegó a cambiar como si no"""
+        for port_baud in (failed, original):
+            self._switch(original, port_baud)
+            try:
+                self.identify()
+            except (TimeoutError, ValueError):
+                continue
+            read_errors(self.query)
+            return
+        raise Exception("Error no se recupera el enlace RS-232 a %d baudios" % original)
+
+
+def resource_manager(simulate=False):
+    """ResourceManager de pyvisa (o el simulado) compartido por todo el proceso"""
+    if simulate not in _resource_managers:
+        _resource_managers[simulate] = SimulatedResourceManager() if simulate else pyvisa.ResourceManager()
+    return _resource_managers[simulate]
+
+
+def open_transport(resource, simulate=False, timeout=5000, negotiate=False, **serial_settings):
+    """Abre el transporte adecuado: recurso VISA ('GPIB0::14::INSTR') o puerto serie ('COM9')
+
+    Con simulate=True se abre el 6514 simulado de Keithley_Sim por el mismo camino.
+    timeout va en milisegundos como en pyvisa; para el puerto serie manda el de
+    serial_settings si se indica. Con negotiate=True el puerto serie se sube a
+    la mayor velocidad que pase la comprobación (resumen en transport.link).
+    """
+    if "::" in resource:
+        inst = resource_manager(simulate).open_resource(resource)
+        inst.timeout = timeout
+        inst.read_termination = '\n'
+        return VisaTransport(inst)
+
+    settings = dict(SERIAL_SETTINGS, **serial_settings)
+    simulator = None
+    if simulate:
+        simulator = SerialSimulator(baudrate=settings["baudrate"])
+        resource = simulator.port
+    ser = serial.Serial(port=resource, **settings)
+    ser.reset_input_buffer()
+    ser.reset_output_buffer()
+    transport = SerialTransport(ser, simulator)
+    if negotiate:
+        transport.link = transport.negotiate_baud()
+    return transport
@@ -1,7 +1,8 @@
-import serial
-import time
 from serial.serialutil import PARITY_EVEN, STOPBITS_ONE, EIGHTBITS
-import csv
+from Keithley_Data import decode_readings
+from Keithley_6514 import Keithley6514
+from Keithley_Transport import open_transport
+from Keithley_Storage import save, export_csv
 
 # Cambia el nombre del puerto según tu sistema
 port = 'COM9'            # Ejemplo: COM3 en Windows, /dev/ttyUSB0 en Linux
@@ -10,100 +11,87 @@ TIMEOUT = 2              # En segundos
 parity=PARITY_EVEN
 bytesize=EIGHTBITS
 stopbits=STOPBITS_ONE
+
+# Con fast_baud = True se sube el 6514 y el puerto a la mayor velocidad que pase la
+# comprobación (*IDN? y bytes/s reales), volviendo a 'baudrate' si falla. Cuidado:
+# el 6514 guarda la velocidad al apagarse y SerialTest.py, fijo a 9600, deja de conectar.
+fast_baud = False
+
+# Con simulate = True se abre un 6514 simulado detrás de un pseudo-terminal (solo Linux/macOS)
+simulate = False
 # with serial.Serial(port=port, baudrate=baudrate, parity=parity ,bytesize=bytesize, stopbits=stopbits, timeout=TIMEOUT) as ser:
 
-verbose = False
+# Formato de transferencia del buffer: "sreal" (binario 32 bits), "dreal" (binario 64 bits) o "ascii"
+data_format = "sreal"
+
+# Elementos guardados por lectura: lectura, timestamp y estado
+elements = "READ,TIME,STAT"
+number_of_samples = 1970
+
+# Tiempo máximo de espera al SRQ: el buffer entero puede tardar más de un minuto en llenarse
+SRQ_TIMEOUT = 600        # En segundos
 
-def send_cmd(ser, cmd, wait=0.1):
-    """Envía comando SCPI"""
-    ser.write((cmd + '\r').encode())
-    time.sleep(wait)
-
-def query_cmd(ser, cmd, wait=0.1):
-    """Envía comando SCPI y devuelve respuesta"""
-    send_cmd(ser, cmd, wait)
-    return ser.readline().decode().strip()
-
-def wait_for_srq(ser):
-    """Espera a que bit 6 del status byte esté activo (SRQ)"""
-    while True:
-        send_cmd(ser, "*STB?")
-        try:
-            stb = int(ser.readline().decode().strip())
-            if stb & 64:
-                return
-        except ValueError:
-            continue
-        time.sleep(0.2)
+# Fichero de salida en binario por columnas (.npy, .h5 o .parquet) y exportación opcional a CSV
+OUTPUT_FILE = "capture.npy"
+export_to_csv = True
+
+verbose = False
 
 def main():
-    with serial.Serial(port=port, baudrate=baudrate, parity=parity ,bytesize=bytesize, stopbits=stopbits, timeout=TIMEOUT) as ser:
-        
-        # Limpieza inicial
-        ser.reset_input_buffer()
-        ser.reset_output_buffer()
-
-        print("Inicializando Keithley 6514...")
-
-        # Reseteo general y configuración
-        send_cmd(ser, "*RST")                            # Reset completo
-        send_cmd(ser, "STAT:PRES;*CLS")                  # Limpiar sistema de estado
-        send_cmd(ser, "STAT:MEAS:ENAB 512")              # Habilitar BFL (bit 9 del ESR)
-        send_cmd(ser, "*SRE 1")                          # Habilitar SRQ por STB bit 0
-        send_cmd(ser, "CURR:NPLC 0.1")
-        send_cmd(ser, "DISP:DIG 4.5")
-
-        # Configuración del buffer
-        send_cmd(ser, "TRIG:COUN 1970")                    # Número de medidas
-        send_cmd(ser, "TRAC:POIN 1970")                    # Tamaño del buffer
-        send_cmd(ser, "TRAC:FEED SENS;FEED:CONT NEXT")   # Fuente = medidas sin procesar
-
-        # Iniciar adquisición
-        send_cmd(ser, "INIT")
-
-        print("Esperando a que se llene el buffer (SRQ)...")
-        wait_for_srq(ser)
-        print("SRQ recibido, leyendo estado...")
-
-        # Leer estado del subsistema de medidas
-        meas_status = query_cmd(ser, "STAT:MEAS?")
-        print("STAT:MEAS? =", meas_status)
-
-        # Leer datos del buffer
-        print("Leyendo TRAC:DATA...")
-        send_cmd(ser, "TRAC:DATA?")
-        # reading_data = ser.readline().decode().strip()
-        reading_data = ser.readall().decode().strip()
-
-        try:
-            values = [float(x) for x in reading_data.split(',')]
-            
-            if verbose:
-                print("Mediciones:")
-                for i, v in enumerate(values, 1):
-                    print(f"{i}: {v:.3e} A")
-                
-        except ValueError:
-            print("Error al procesar los datos:", reading_data)
-
-        # Si quieres repetir, reactiva el modo NEXT
-        print("\nPara repetir, reactiva el buffer con: FEED:CONT NEXT")
-        send_cmd(ser, "FEED:CONT NEXT")
-
-        return values
+    transport = open_transport(port, simulate, negotiate=fast_baud, baudrate=baudrate, parity=parity,
+                               bytesize=bytesize, stopbits=stopbits, timeout=TIMEOUT)
+    keithley = Keithley6514(transport, elements, data_format)
+
+    # Velocidad real del enlace, la que se guarda con la captura
+    link_baudrate = baudrate
+    if fast_baud:
+        link = transport.link
+        link_baudrate = link["baudrate"]
+        print(f"Enlace RS-232: {link['baudrate']} baudios, {link['bytes_per_second']:.0f} bytes/s medidos")
+
+    print("Inicializando Keithley 6514...")
+
+    # Reseteo general y configuración; la del buffer (BFL, SRQ, TRIG:COUN,
+    # TRAC:POIN, formato) la añade acquire() en el mismo bloque
+    setup = []
+    setup.append("*RST")                            # Reset completo
+    setup.append("CURR:NPLC 0.1")
+    setup.append("DISP:DIG 4.5")
+
+    # A 9600 baudios el binario reduce a menos de la mitad la descarga.
+    # Por RS-232 no hay línea SRQ: el transporte sondea *STB? con espera creciente
+    print("Esperando a que se llene el buffer (SRQ)...")
+    try:
+        values = keithley.acquire(number_of_samples, SRQ_TIMEOUT, setup)
+        print("STAT:MEAS? =", keithley.meas_status)
+
+        if verbose:
+            print("Mediciones:")
+            for i, v in enumerate(values, 1):
+                print(f"{i}: {v:.3e} A")
+
+    except ValueError as e:
+        print("Error al procesar los datos:", e)
+        values = []
+
+    # Si quieres repetir, reactiva el modo NEXT
+    print("\nPara repetir, reactiva el buffer con: FEED:CONT NEXT")
+    keithley.write("FEED:CONT NEXT")
+    keithley.close()
+
+    return values, link_baudrate
 
 if __name__ == "__main__":
-    values = main()
-    read, timestamp, status = values[0::3], values[1::3], values[2::3]
-    
-    with open('CSV_File.csv', mode='w', newline='') as file:
-        writer = csv.writer(file)
-        
-        # Escribir encabezados (opcional)
-        writer.writerow(['Time (s)', 'Current (A)'])
-        
-        # Escribir filas combinando las dos listas
-        for timestamp_val, current_val in zip(timestamp, read):
-            writer.writerow([timestamp_val, current_val])
+    values, link_baudrate = main()
+    data = decode_readings(values, elements)
+    read, timestamp = data["reading"], data["timestamp"]
+
+    # Guardamos todas las columnas de golpe, con la configuración en la cabecera
+    metadata = {"function": "current", "nplc": 0.1, "port": port, "baudrate": link_baudrate,
+                "samples": number_of_samples, "elements": elements}
+    save(OUTPUT_FILE, data, metadata)
+
+    if export_to_csv:
+        export_csv('CSV_File.csv', [timestamp, read], ['Time (s)', 'Current (A)'])
     
    
@@ -0,0 +1,28 @@
+import sys
+import os
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from Keithley_6514 import Keithley6514
+from Keithley_Transport import open_transport
+from Keithley_Trace import trace, is_timeout
+
+
+def test_timeout_en_query_trazada():
+    # *WAI no tiene respuesta: la query acaba en timeout y debe llegar el error original
+    keithley = Keithley6514(open_transport("GPIB0::14::INSTR", simulate=True, timeout=200))
+    tracer = trace(keithley)
+    try:
+        with pytest.raises(Exception) as info:
+            keithley.query("*WAI")
+        assert is_timeout(info.value)
+        assert not isinstance(info.value, TypeError)
+
+        s = tracer.stats[("query", "*WAI")]
+        assert s["count"] == 1
+        assert s["timeouts"] == 1
+        assert s["bytes"] == 0
+        assert s["hist"].sum() == 1
+    finally:
+        keithley.close()